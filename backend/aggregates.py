@@ -0,0 +1,267 @@
+"""
+Precomputed statistics for the cached boat list.
+
+AggregateStore is built once per dataset and then patched with the boats a
+delta sync added or removed, instead of being recomputed from scratch. It
+keeps one Summary for the whole inventory plus one per builder, model,
+country and condition, so the unfiltered view and single-field selections
+are answered without touching individual boats. Any other filter
+combination is reduced over the columnar store and memoised.
+"""
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from bisect import bisect_right
+
+from metrics import CACHE_LOOKUPS
+
+# filter name -> boat field, grouped so single-field selections are O(values)
+GROUP_FIELDS = {
+    "builders": "Builder",
+    "models": "Model",
+    "countries": "Country",
+    "conditions": "Condition",
+}
+
+# histogram name in the stats payload -> boat field
+HISTOGRAMS = {
+    "brands": "Builder",
+    "countries": "Country",
+    "conditions": "Condition",
+    "vat_classes": "VATClass",
+}
+
+# Lower bucket edges (EUR and metres); the last bucket is open-ended
+PRICE_BUCKETS = [0, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000]
+LENGTH_BUCKETS = [0, 8, 10, 12, 15, 20, 25, 30, 40, 60]
+
+FILTERED_CACHE_SIZE = 128
+
+
+def _numeric(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _distribution(edges, counts):
+    buckets = []
+    for i, low in enumerate(edges):
+        high = edges[i + 1] if i + 1 < len(edges) else None
+        buckets.append({"from": low, "to": high, "count": counts[i]})
+    return buckets
+
+
+class Summary:
+    """Mergeable, updatable statistics over a set of boats."""
+
+    def __init__(self):
+        self.count = 0
+        # value -> multiplicity, so min/max survive removals
+        self.prices = Counter()
+        self.price_sum = 0
+        self.years = Counter()
+        self.year_sum = 0
+        # PricePerMeter (normalize.py): sum and count for the average
+        self.ppm_sum = 0
+        self.ppm_count = 0
+        self.histograms = {name: Counter() for name in HISTOGRAMS}
+        self.price_buckets = [0] * len(PRICE_BUCKETS)
+        self.length_buckets = [0] * len(LENGTH_BUCKETS)
+        self._stats = None
+
+    @classmethod
+    def from_boats(cls, boats):
+        summary = cls()
+        for boat in boats:
+            summary.add(boat)
+        return summary
+
+    def add(self, boat, sign=1):
+        self._stats = None
+        self.count += sign
+
+        # Prices in EUR (normalize.py), like the buckets
+        price = boat.get("PriceEUR")
+        if price and _numeric(price):
+            self.prices[price] += sign
+            if self.prices[price] <= 0:
+                del self.prices[price]
+            self.price_sum += sign * price
+            self.price_buckets[bisect_right(PRICE_BUCKETS, price) - 1] += sign
+
+        year = boat.get("YearBuilt")
+        if isinstance(year, int) and year > 1900:
+            self.years[year] += sign
+            if self.years[year] <= 0:
+                del self.years[year]
+            self.year_sum += sign * year
+
+        length = boat.get("Length")
+        if length and _numeric(length) and length > 0:
+            self.length_buckets[bisect_right(LENGTH_BUCKETS, length) - 1] += sign
+
+        ppm = boat.get("PricePerMeter")
+        if ppm is not None:
+            self.ppm_sum += sign * ppm
+            self.ppm_count += sign
+
+        for name, field in HISTOGRAMS.items():
+            value = boat.get(field) or "Unknown"
+            histogram = self.histograms[name]
+            histogram[value] += sign
+            if histogram[value] <= 0:
+                del histogram[value]
+
+    def remove(self, boat):
+        self.add(boat, sign=-1)
+
+    def merge(self, other):
+        self._stats = None
+        self.count += other.count
+        self.prices.update(other.prices)
+        self.price_sum += other.price_sum
+        self.years.update(other.years)
+        self.year_sum += other.year_sum
+        self.ppm_sum += other.ppm_sum
+        self.ppm_count += other.ppm_count
+        for name in HISTOGRAMS:
+            self.histograms[name].update(other.histograms[name])
+        self.price_buckets = [a + b for a, b in zip(self.price_buckets, other.price_buckets)]
+        self.length_buckets = [a + b for a, b in zip(self.length_buckets, other.length_buckets)]
+        return self
+
+    def copy(self):
+        return Summary().merge(self)
+
+    def stats(self):
+        if self._stats is None:
+            price_count = sum(self.prices.values())
+            year_count = sum(self.years.values())
+            avg_year = self.year_sum / year_count if year_count else 0
+            self._stats = {
+                "avg_price": self.price_sum / price_count if price_count else 0,
+                "max_price": max(self.prices) if self.prices else 0,
+                "min_price": min(self.prices) if self.prices else 0,
+                "avg_year": int(avg_year),
+                "max_year": max(self.years) if self.years else 0,
+                "min_year": min(self.years) if self.years else 0,
+                "avg_price_per_meter": self.ppm_sum / self.ppm_count if self.ppm_count else 0,
+                "total_boats": self.count,
+                **{name: dict(histogram) for name, histogram in self.histograms.items()},
+                "price_distribution": _distribution(PRICE_BUCKETS, self.price_buckets),
+                "length_distribution": _distribution(LENGTH_BUCKETS, self.length_buckets),
+            }
+        return self._stats
+
+
+class AggregateStore:
+    def __init__(self, boats=()):
+        self.total = Summary()
+        # filter name -> {value: Summary}
+        self.groups = {name: defaultdict(Summary) for name in GROUP_FIELDS}
+        for boat in boats:
+            self._add(boat)
+        self.total.stats()
+        self._filtered = OrderedDict()
+        self._filtered_lock = threading.Lock()
+
+    def _add(self, boat, sign=1):
+        self.total.add(boat, sign)
+        for name, field in GROUP_FIELDS.items():
+            value = boat.get(field)
+            if value:
+                group = self.groups[name][value]
+                group.add(boat, sign)
+                if group.count <= 0:
+                    del self.groups[name][value]
+
+    def apply(self, added=(), removed=()):
+        """
+        Returns a new store with the given boats added and removed (a changed
+        boat is its old version removed plus its new version added). Only the
+        summaries the delta touches are copied; this store is left intact for
+        readers still holding it.
+        """
+        store = AggregateStore.__new__(AggregateStore)
+        store.total = self.total.copy()
+        store.groups = {name: defaultdict(Summary, groups) for name, groups in self.groups.items()}
+        store._filtered = OrderedDict()
+        store._filtered_lock = threading.Lock()
+
+        copied = set()
+        for boat in removed:
+            store._touch(boat, copied)
+            store._add(boat, sign=-1)
+        for boat in added:
+            store._touch(boat, copied)
+            store._add(boat)
+        store.total.stats()
+        return store
+
+    def _touch(self, boat, copied):
+        # Copy-on-write for the group summaries shared with the previous store
+        for name, field in GROUP_FIELDS.items():
+            value = boat.get(field)
+            key = (name, value)
+            if value and key not in copied and value in self.groups[name]:
+                self.groups[name][value] = self.groups[name][value].copy()
+            copied.add(key)
+
+    def stats(self, filters=None, index=None, columns=None):
+        """
+        Stats for the boats matching `filters`. The unfiltered view is
+        precomputed; a selection on a single categorical field merges that
+        field's group summaries; anything else is reduced over the columnar
+        store (or the index matches without one) and memoised for this dataset.
+        """
+        active = index.active_filters(filters) if (filters and index) else []
+        if not active:
+            return self.total.stats()
+
+        if len(active) == 1 and active[0] in GROUP_FIELDS:
+            name = active[0]
+            groups = self.groups[name]
+            selected = set(filters[name])
+            if len(selected) == 1:
+                group = groups.get(next(iter(selected)))
+                return group.stats() if group else Summary().stats()
+            merged = Summary()
+            for value in selected:
+                if value in groups:
+                    merged.merge(groups[value])
+            return merged.stats()
+
+        key = _filter_key(filters, active)
+        with self._filtered_lock:
+            if key in self._filtered:
+                self._filtered.move_to_end(key)
+                CACHE_LOOKUPS.inc(cache="filtered_stats", result="hit")
+                return self._filtered[key]
+        CACHE_LOOKUPS.inc(cache="filtered_stats", result="miss")
+
+        if columns is not None:
+            if "q" in active:
+                mask = columns.mask_from_positions(index.select(filters))
+            else:
+                mask = columns.mask(filters)
+            result = columns.stats(mask)
+        else:
+            boats = index.boats
+            result = Summary.from_boats(boats[pos] for pos in index.select(filters)).stats()
+
+        with self._filtered_lock:
+            self._filtered[key] = result
+            if len(self._filtered) > FILTERED_CACHE_SIZE:
+                self._filtered.popitem(last=False)
+        return result
+
+
+def _filter_key(filters, active):
+    key = []
+    for name in sorted(active):
+        if isinstance(filters.get(name), (list, tuple, set)):
+            # Categorical, grouped or not (the derived vatClasses, countryCodes, ...)
+            key.append((name, tuple(sorted(filters[name]))))
+        elif name == "q":
+            key.append((name, filters[name].strip().lower()))
+        else:
+            key.append((name, filters.get(f"{name}From"), filters.get(f"{name}To")))
+    return tuple(key)
@@ -0,0 +1,139 @@
+"""
+Sync leader election between uvicorn worker processes (uvicorn --workers N).
+
+Every worker tries to take an exclusive lock on a file next to the snapshot.
+The one that gets it is the leader: it warms up from the cache and runs the
+syncs on its SyncScheduler's timetable (scheduler.py), and each finished
+sync replaces the snapshot file. The others are followers and never call
+upstream: they load the snapshot like a cold start does (load_cache) and
+reload it whenever the leader swaps in a new one. Followers keep retrying
+the lock, so one of them takes over if the leader exits.
+
+A sync requested on a follower is handed to the leader's scheduler through a
+request file, so upstream load stays that of one process however many
+workers run. Each worker still holds its own decoded dataset and indexes.
+Without fcntl (Windows) every process leads, as before.
+"""
+import logging
+import os
+import threading
+
+from scheduler import SyncScheduler
+from service import CACHE_PATH, load_cache, sync_state
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_PATH = f"{CACHE_PATH}.lock"
+REQUEST_PATH = f"{CACHE_PATH}.sync-request"
+WATCH_INTERVAL = float(os.environ.get("CLUSTER_WATCH_INTERVAL", 1.0))  # seconds
+
+
+class Cluster:
+    def __init__(self, snapshot_path=CACHE_PATH, lock_path=LOCK_PATH, request_path=REQUEST_PATH, scheduler=None):
+        self.snapshot_path = snapshot_path
+        self.lock_path = lock_path
+        self.request_path = request_path
+        self.scheduler = scheduler or SyncScheduler()
+        self.role = None
+        self._lock_file = None
+        self._snapshot_stat = None
+        self._stop = threading.Event()
+
+    @property
+    def is_leader(self):
+        return self.role == "leader"
+
+    def _try_lead(self):
+        if fcntl is None:
+            return True
+        lock_file = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held (and released by the OS if we die) for the life of the process
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        return True
+
+    def start(self):
+        """Elects this process leader or follower and starts the watcher thread."""
+        if self._try_lead():
+            self.role = "leader"
+            logger.info(f"Worker {os.getpid()} is the sync leader")
+            self.scheduler.start(initial=True)
+        else:
+            self.role = "follower"
+            logger.info(f"Worker {os.getpid()} follows the snapshot at {self.snapshot_path}")
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.scheduler.stop()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _run(self):
+        while True:
+            try:
+                if self.is_leader:
+                    self._serve_sync_request()
+                elif self._try_lead():
+                    self.role = "leader"
+                    logger.info(f"Worker {os.getpid()} took over as sync leader")
+                    self.scheduler.start(initial=not sync_state.boats)
+                else:
+                    self._reload_if_changed()
+            except Exception as e:
+                logger.error(f"Cluster watcher failed: {e}")
+            if self._stop.wait(WATCH_INTERVAL):
+                return
+
+    def request_sync(self, full=False, source="manual"):
+        """
+        Asks the scheduler here on the leader for a sync, or forwards the
+        request to the leader from a follower. Returns the scheduler's answer
+        ("started", "running", "pending", "debounced") or "forwarded".
+        """
+        if self.is_leader:
+            return self.scheduler.request(full=full, source=source)
+        tmp_path = f"{self.request_path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            f.write("full" if full else "incremental")
+        os.replace(tmp_path, self.request_path)
+        return "forwarded"
+
+    def _serve_sync_request(self):
+        try:
+            with open(self.request_path) as f:
+                full = f.read().strip() == "full"
+            os.remove(self.request_path)
+        except FileNotFoundError:
+            return
+        self.scheduler.request(full=full, source="follower")
+
+    def _reload_if_changed(self):
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            return
+        previous, self._snapshot_stat = self._snapshot_stat, stat
+        if previous is not None and (stat.st_ino, stat.st_size) == (previous.st_ino, previous.st_size):
+            if stat.st_mtime != previous.st_mtime:
+                # The leader synced and found nothing new
+                sync_state.confirm(stat.st_mtime)
+            return
+        # Snapshots are replaced by rename, so a new inode means a new dataset
+        logger.info("Snapshot changed, reloading")
+        load_cache()
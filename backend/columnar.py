@@ -0,0 +1,174 @@
+"""
+Columnar, NumPy-backed view of the cached boat list.
+
+Numeric fields live in float64 arrays (NaN where the listing has no usable
+value) and categorical fields are dictionary-encoded into int32 codes, so
+filters become boolean masks and stats/histograms become array reductions
+instead of per-boat dict lookups. The original dicts stay in `boats` and are
+only touched to serialise results.
+
+Stats follow the same rules as aggregates.Summary and return the same payload.
+"""
+import numpy as np
+
+from aggregates import HISTOGRAMS, PRICE_BUCKETS, LENGTH_BUCKETS, _distribution
+from query import CATEGORICAL_FIELDS, NUMERIC_FIELDS
+
+# Code 0 is reserved for a missing/empty value
+MISSING = 0
+
+
+def _float_column(boats, field, valid):
+    values = np.full(len(boats), np.nan)
+    for i, boat in enumerate(boats):
+        value = boat.get(field)
+        if valid(value):
+            values[i] = value
+    return values
+
+
+def _scalar(value):
+    value = value.item()
+    return int(value) if value.is_integer() else value
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ColumnarStore:
+    def __init__(self, boats):
+        self.boats = boats
+        self.size = len(boats)
+
+        # Same validity rules as Summary: non-zero EUR prices, int years after 1900, positive lengths
+        self.price = _float_column(boats, "PriceEUR", lambda v: _is_number(v) and v != 0)
+        self.year = _float_column(boats, "YearBuilt", lambda v: isinstance(v, int) and not isinstance(v, bool) and v > 1900)
+        self.length = _float_column(boats, "Length", lambda v: _is_number(v) and v > 0)
+        self.price_per_meter = _float_column(boats, "PricePerMeter", _is_number)
+
+        # Range filters treat missing values as 0, like the dashboard
+        self.range_columns = {}
+        for name, field in NUMERIC_FIELDS.items():
+            self.range_columns[name] = _float_column(boats, field, _is_number)
+            np.nan_to_num(self.range_columns[name], copy=False, nan=0.0)
+
+        # boat field -> (codes, categories, value -> code)
+        self.categorical = {}
+        for field in set(CATEGORICAL_FIELDS.values()) | set(HISTOGRAMS.values()):
+            categories = [None]
+            lookup = {}
+            codes = np.zeros(len(boats), dtype=np.int32)
+            for i, boat in enumerate(boats):
+                value = boat.get(field)
+                if not value:
+                    continue
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(categories)
+                    categories.append(value)
+                codes[i] = code
+            self.categorical[field] = (codes, categories, lookup)
+
+    def to_sections(self):
+        """Arrays and category lists for persisting in a snapshot."""
+        # "price_eur": snapshots whose "price" section held SellPrice rebuild their columns
+        arrays = {"price_eur": self.price, "year": self.year, "length": self.length,
+                  "price_per_meter": self.price_per_meter}
+        for name, column in self.range_columns.items():
+            arrays[f"range.{name}"] = column
+        categories = {}
+        for field, (codes, values, _) in self.categorical.items():
+            arrays[f"codes.{field}"] = codes
+            categories[field] = values
+        return arrays, categories
+
+    @classmethod
+    def from_sections(cls, boats, size, arrays, categories):
+        """
+        Rebuilds a store over existing (e.g. memory-mapped) arrays without
+        touching the boats. Raises KeyError when a section is missing (written
+        before that column existed).
+        """
+        fields = set(CATEGORICAL_FIELDS.values()) | set(HISTOGRAMS.values())
+        missing = fields - set(categories)
+        if missing:
+            raise KeyError(f"No codes for {sorted(missing)}")
+        store = cls.__new__(cls)
+        store.boats = boats
+        store.size = size
+        store.price = arrays["price_eur"]
+        store.year = arrays["year"]
+        store.length = arrays["length"]
+        store.price_per_meter = arrays["price_per_meter"]
+        store.range_columns = {name: arrays[f"range.{name}"] for name in NUMERIC_FIELDS}
+        store.categorical = {}
+        for field, values in categories.items():
+            lookup = {value: code for code, value in enumerate(values) if code != MISSING}
+            store.categorical[field] = (arrays[f"codes.{field}"], values, lookup)
+        return store
+
+    def mask(self, filters):
+        """Boolean mask of the boats matching the dashboard filters (search `q` excluded)."""
+        mask = np.ones(self.size, dtype=bool)
+        for name, field in CATEGORICAL_FIELDS.items():
+            selected = filters.get(name)
+            if not selected:
+                continue
+            codes, _, lookup = self.categorical[field]
+            wanted = [lookup[v] for v in selected if v in lookup]
+            mask &= np.isin(codes, wanted)
+        for name in NUMERIC_FIELDS:
+            low, high = filters.get(f"{name}From"), filters.get(f"{name}To")
+            column = self.range_columns[name]
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+        return mask
+
+    def mask_from_positions(self, positions):
+        mask = np.zeros(self.size, dtype=bool)
+        if positions:
+            mask[np.fromiter(positions, dtype=np.int64, count=len(positions))] = True
+        return mask
+
+    def _histogram(self, field, mask):
+        codes, categories, _ = self.categorical[field]
+        counts = np.bincount(codes[mask], minlength=len(categories))
+        histogram = {}
+        for code in np.flatnonzero(counts):
+            key = categories[code] if code != MISSING else "Unknown"
+            histogram[key] = histogram.get(key, 0) + int(counts[code])
+        return histogram
+
+    @staticmethod
+    def _buckets(edges, values):
+        values = values[~np.isnan(values)]
+        index = np.searchsorted(edges, values, side="right") - 1
+        return np.bincount(index, minlength=len(edges)).tolist()
+
+    def stats(self, mask=None):
+        if mask is None:
+            mask = np.ones(self.size, dtype=bool)
+
+        prices = self.price[mask]
+        prices = prices[~np.isnan(prices)]
+        years = self.year[mask]
+        years = years[~np.isnan(years)]
+        ppm = self.price_per_meter[mask]
+        ppm = ppm[~np.isnan(ppm)]
+
+        return {
+            "avg_price": float(prices.mean()) if prices.size else 0,
+            "max_price": _scalar(prices.max()) if prices.size else 0,
+            "min_price": _scalar(prices.min()) if prices.size else 0,
+            "avg_year": int(years.mean()) if years.size else 0,
+            "max_year": int(years.max()) if years.size else 0,
+            "min_year": int(years.min()) if years.size else 0,
+            "avg_price_per_meter": float(ppm.mean()) if ppm.size else 0,
+            "total_boats": int(mask.sum()),
+            **{name: self._histogram(field, mask) for name, field in HISTOGRAMS.items()},
+            "price_distribution": _distribution(PRICE_BUCKETS, self._buckets(PRICE_BUCKETS, self.price[mask])),
+            "length_distribution": _distribution(LENGTH_BUCKETS, self._buckets(LENGTH_BUCKETS, self.length[mask])),
+        }
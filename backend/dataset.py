@@ -0,0 +1,149 @@
+"""
+Immutable, versioned views of the boat inventory.
+
+A Dataset bundles everything derived from one version of the data: the boat
+list, its query index, aggregates, columnar store, comparables index, the
+mapped snapshot it was loaded from (if any) and the response bodies
+serialised from it. It is never modified after construction; a sync builds
+the next Dataset and SyncState publishes it with a single reference
+assignment. A reader takes `sync_state.dataset` once and works on a
+consistent version without locks, whatever the sync thread does meanwhile.
+"""
+import copy
+import threading
+import time
+from bisect import bisect_left
+
+from query import BoatIndex
+from aggregates import AggregateStore
+from columnar import ColumnarStore
+from similar import SimilarityIndex
+from metrics import CACHE_LOOKUPS
+
+
+class Dataset:
+    __slots__ = (
+        "version", "boats", "index", "aggregates", "columns", "similar", "snapshot",
+        "delta", "changeset", "synced_at", "created", "partial", "_bodies", "_bodies_lock",
+    )
+
+    def __init__(self, version, boats, index, aggregates, columns, similar=None, snapshot=None,
+                 delta=None, changeset=None, synced_at=None, created=None, partial=False):
+        self.version = version
+        # Treated as read-only by everyone holding this Dataset
+        self.boats = boats
+        self.index = index
+        self.aggregates = aggregates
+        self.columns = columns
+        self.similar = similar if similar is not None else SimilarityIndex()
+        # Memory-mapped cache, serving reads until its records are decoded
+        self.snapshot = snapshot
+        # Boats that entered/left relative to the previous version (None after a full rebuild)
+        self.delta = delta
+        # Summary of the sync that produced this version
+        self.changeset = changeset
+        # When the data was last confirmed against upstream (None: never)
+        self.synced_at = synced_at
+        self.created = created or time.time()
+        # Only part of the catalogue: a cold-start sync is still streaming pages in
+        self.partial = partial
+        self._bodies = {}
+        self._bodies_lock = threading.Lock()
+
+    @classmethod
+    def empty(cls):
+        return cls(0, [], BoatIndex([]), AggregateStore(), ColumnarStore([]))
+
+    @classmethod
+    def build(cls, version, boats, previous=None, delta=None, changeset=None, synced_at=None, partial=False):
+        """
+        Derives a new version from `boats`. With a `delta` against `previous`
+        the aggregates and the comparables index are patched instead of rebuilt.
+        """
+        if delta is not None and previous is not None:
+            aggregates = previous.aggregates.apply(delta["added"], delta["removed"])
+            similar = previous.similar.apply(delta["added"], delta["removed"])
+        else:
+            aggregates = AggregateStore(boats)
+            similar = SimilarityIndex(boats)
+            delta = None
+        return cls(
+            version, boats, BoatIndex(boats), aggregates, ColumnarStore(boats), similar,
+            delta=delta, changeset=changeset, synced_at=synced_at, partial=partial,
+        )
+
+    @classmethod
+    def from_snapshot(cls, version, snapshot, previous=None, synced_at=None):
+        """A version that serves a mapped snapshot before its records are decoded."""
+        columns = snapshot.columns()
+        if columns is None:
+            columns = previous.columns if previous is not None else ColumnarStore([])
+        return cls(
+            version, [], BoatIndex([]), AggregateStore(), columns, snapshot=snapshot,
+            changeset=snapshot.changeset or (previous.changeset if previous is not None else None),
+            synced_at=synced_at, created=snapshot.created,
+        )
+
+    def confirmed(self, synced_at, changeset=None):
+        """
+        This version, re-confirmed against upstream at `synced_at` (same data,
+        same bodies), optionally with the changeset of the sync that did so.
+        """
+        dataset = copy.copy(self)
+        dataset.synced_at = synced_at
+        if changeset is not None:
+            dataset.changeset = changeset
+        return dataset
+
+    def republished(self, version):
+        """
+        This version's data again under a new version number, with no bodies
+        built yet. It has no delta: its predecessor is not this version's.
+        """
+        dataset = copy.copy(self)
+        dataset.version = version
+        dataset.delta = None
+        dataset._bodies = {}
+        dataset._bodies_lock = threading.Lock()
+        return dataset
+
+    @property
+    def count(self):
+        if self.boats or self.snapshot is None:
+            return len(self.boats)
+        return self.snapshot.count
+
+    def find(self, boat_id):
+        """The decoded boat with this BoatID, or None."""
+        ids = self.index.search.ids
+        key = str(boat_id)
+        i = bisect_left(ids, (key,))
+        if i < len(ids) and ids[i][0] == key:
+            return self.boats[ids[i][1]]
+        return None
+
+    def raw_boats_json(self):
+        """The snapshot's record bytes while only the snapshot is loaded, else None."""
+        if self.snapshot is not None and not self.boats:
+            return self.snapshot.boats_json()
+        return None
+
+    def body(self, key, build):
+        """
+        Response body derived from this version, built once by the first
+        reader that asks for it. The body lives and dies with the Dataset, so
+        a new version never serves a stale one.
+        """
+        body = self._bodies.get(key)
+        if body is not None:
+            CACHE_LOOKUPS.inc(cache="responses", result="hit")
+            return body
+        with self._bodies_lock:
+            # Another reader may have built it while we waited
+            body = self._bodies.get(key)
+            if body is None:
+                CACHE_LOOKUPS.inc(cache="responses", result="miss")
+                body = self._bodies[key] = build()
+            else:
+                CACHE_LOOKUPS.inc(cache="responses", result="hit")
+            return body
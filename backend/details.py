@@ -0,0 +1,203 @@
+"""
+Async boat detail fetching for /api/boats/{boat_id}.
+
+Details come from the upstream /boats/{id} endpoint through an
+UpstreamClient (upstream.py), so they get the same retries, backoff and
+circuit breaker as the sync; its blocking calls run on a small thread pool
+sized like its connection pool. Responses are kept in a bounded LRU cache with a TTL,
+concurrent requests for the same boat share a single upstream call, and
+entries are evicted when a sync changes or removes the boat: by the sync's
+delta when it has one, else (full syncs, snapshot loads) by comparing each
+entry's listing row, remembered at fetch time, with the new version's.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DETAIL_CACHE_SIZE = 2048
+DETAIL_TTL = 15 * 60  # seconds
+DETAIL_TIMEOUT = 10
+# A reader is waiting: fewer tries than a sync page
+DETAIL_ATTEMPTS = 2
+MAX_CONNECTIONS = 20
+BATCH_CONCURRENCY = 8
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry expiry; evictions may come from the sync thread."""
+
+    def __init__(self, max_entries=DETAIL_CACHE_SIZE, ttl=DETAIL_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def items(self):
+        """(key, value) of the live entries, oldest first."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (expires, value) in self._entries.items() if expires >= now]
+
+    def evict(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DetailFetcher:
+    def __init__(self, client, listing=None, max_entries=DETAIL_CACHE_SIZE, ttl=DETAIL_TTL):
+        # UpstreamClient with a pool of MAX_CONNECTIONS, usually sharing the sync's breaker
+        self.client = client
+        # boat_id -> the boat's row in the live dataset, or None
+        self.listing = listing
+        self.cache = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._executor = None
+        self._loop = None
+        self._inflight = {}
+        # Bumped on eviction so fetches that started before it don't repopulate stale data
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.errors = 0
+
+    def _bind_loop(self):
+        # In-flight tasks belong to one event loop; start over on a new one
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._inflight = {}
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=MAX_CONNECTIONS, thread_name_prefix="details")
+        return loop
+
+    def _lookup(self, boat_id):
+        # The listing the details go with, to tell later whether a full sync changed the boat
+        row = self.listing(boat_id) if self.listing is not None else None
+        return row, self.client.get_details(boat_id)
+
+    async def _fetch(self, boat_id):
+        generation = self._generation
+        self.upstream_calls += 1
+        try:
+            row, details = await self._bind_loop().run_in_executor(self._executor, self._lookup, boat_id)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error fetching boat details for {boat_id}: {e}")
+            return None
+        if generation == self._generation:
+            self.cache.put(boat_id, (row, details))
+        return details
+
+    async def get(self, boat_id):
+        """Details for one boat, or None if upstream has none (errors are not cached)."""
+        boat_id = str(boat_id)
+        entry = self.cache.get(boat_id)
+        if entry is not _MISSING:
+            self.hits += 1
+            return entry[1]
+
+        self._bind_loop()
+        task = self._inflight.get(boat_id)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch(boat_id))
+            self._inflight[boat_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(boat_id, None))
+        # Shield so one caller disconnecting doesn't cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    async def get_many(self, boat_ids):
+        """{boat_id: details or None} for several boats, fetched concurrently."""
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def fetch_one(boat_id):
+            async with semaphore:
+                return await self.get(boat_id)
+
+        boat_ids = list(dict.fromkeys(str(boat_id) for boat_id in boat_ids))
+        results = await asyncio.gather(*(fetch_one(boat_id) for boat_id in boat_ids))
+        return dict(zip(boat_ids, results))
+
+    def evict(self, boat_ids):
+        self._generation += 1
+        self.cache.evict(str(boat_id) for boat_id in boat_ids)
+
+    def clear(self):
+        self._generation += 1
+        self.cache.clear()
+
+    def on_dataset_change(self, state):
+        """
+        SyncState listener: drop details of boats the last sync touched. Without
+        a delta, keep the entries whose boat is still listed with the same row.
+        """
+        dataset = state.dataset
+        delta = dataset.delta
+        if delta is not None:
+            self.evict({boat["BoatID"] for boat in delta["added"]} | {boat["BoatID"] for boat in delta["removed"]})
+            return
+        if not dataset.boats:
+            # A mapped snapshot still decoding: its records are published (and compared) next
+            return
+        stale = []
+        for boat_id, (row, _) in self.cache.items():
+            current = dataset.find(boat_id)
+            if row is None or current is None or (current is not row and current != row):
+                stale.append(boat_id)
+        if stale:
+            self.evict(stale)
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "upstream_calls": self.upstream_calls,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+        }
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.client.close()
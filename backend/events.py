@@ -0,0 +1,119 @@
+"""
+Server-Sent Events channel for sync progress and dataset changes.
+
+The sync runs on a worker thread; publish() hands each event to the asyncio
+loop, which fans the pre-encoded message out to one bounded queue per
+subscriber. An idle subscriber is a single coroutine parked on its queue,
+so hundreds of open dashboards cost a few KB each and no polling.
+
+Events:
+    status    full /api/status payload, sent once on connect
+    progress  same payload, throttled while a sync runs
+    dataset   new dataset version with a summary of what changed
+"""
+import asyncio
+import threading
+import time
+
+from responses import dumps
+
+QUEUE_SIZE = 32
+HEARTBEAT = 15  # seconds between keep-alive comments
+PROGRESS_INTERVAL = 0.25  # seconds between progress events during a sync
+RETRY_MS = 3000
+MAX_IDS = 500  # larger diffs only carry counts
+
+
+def format_event(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + dumps(data).decode())
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def dataset_event(state):
+    """Version and diff summary for the dataset a SyncState just swapped in."""
+    dataset = state.dataset
+    summary = {
+        "version": dataset.version,
+        "boat_count": dataset.count,
+        "changeset": dataset.changeset,
+    }
+    delta = dataset.delta
+    if delta is not None:
+        added = {boat["BoatID"] for boat in delta["added"]}
+        removed = {boat["BoatID"] for boat in delta["removed"]}
+        ids = {
+            "added": sorted(added - removed),
+            "changed": sorted(added & removed),
+            "removed": sorted(removed - added),
+        }
+        if sum(len(v) for v in ids.values()) <= MAX_IDS:
+            summary["ids"] = ids
+    return summary
+
+
+class EventBroker:
+    def __init__(self):
+        self._subscribers = set()
+        self._loop = None
+        self._last_progress = 0
+        self._progress_lock = threading.Lock()
+
+    def bind(self, loop):
+        """Attaches the broker to the server's event loop (call from startup)."""
+        self._loop = loop
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event, data, event_id=None):
+        """Thread-safe: queues an event for every subscriber."""
+        if self._loop is None or not self._subscribers:
+            return
+        message = format_event(event, data, event_id)
+        try:
+            self._loop.call_soon_threadsafe(self._broadcast, message)
+        except RuntimeError:
+            # Loop already closed (shutdown)
+            pass
+
+    def publish_progress(self, status):
+        # Throttle while a sync runs, but never drop the final "done" update
+        now = time.monotonic()
+        with self._progress_lock:
+            if status["is_loading"] and now - self._last_progress < PROGRESS_INTERVAL:
+                return
+            self._last_progress = now
+        self.publish("progress", status)
+
+    def publish_dataset(self, state):
+        summary = dataset_event(state)
+        self.publish("dataset", summary, event_id=summary["version"])
+
+    def _broadcast(self, message):
+        for queue in self._subscribers:
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than block everyone
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def stream(self, request, initial_status):
+        """Async generator of SSE bytes for one subscriber."""
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.add(queue)
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            yield format_event("status", initial_status, initial_status.get("version"))
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    message = b": keep-alive\n\n"
+                yield message
+        finally:
+            self._subscribers.discard(queue)
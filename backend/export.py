@@ -0,0 +1,219 @@
+"""
+Streaming exports of the cached inventory (GET /api/boats/export).
+
+Rows come from the live Dataset, never from upstream, one boat at a time in
+the order of BoatIndex.scan(), and are encoded EXPORT_BATCH rows at a time.
+Memory stays flat whatever the number of matches, and the first bytes leave
+as soon as the first batch is encoded:
+
+    csv       EXPORT_COLUMNS (or the requested fields) under a header row;
+              lists and objects (image galleries, ...) as JSON
+    ndjson    one JSON object per line, every field unless fields are given
+    parquet   one row group per batch, typed columns  } need pyarrow
+    arrow     Arrow IPC stream, one record batch each }
+
+csv, ndjson and arrow are gzipped on the fly (Content-Encoding: gzip) for
+clients that accept it, with a sync flush after every batch so the client
+never waits for the compressor; parquet compresses its own pages.
+
+While a freshly mapped snapshot is still being decoded the rows are read
+from it one record at a time, selected with the columnar store; the text
+filter `q` has no index yet then and is ignored, as for /api/stats.
+"""
+import csv
+import io
+import json
+import zlib
+
+import numpy as np
+
+from responses import GZIP_LEVEL, dumps
+from metrics import EXPORT_ROWS
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional columnar formats
+    pyarrow = None
+
+EXPORT_BATCH = 1000
+
+EXPORT_COLUMNS = [
+    "BoatID", "Builder", "Model", "Country", "CountryCode", "Condition", "YearBuilt", "Age", "Length",
+    "SellPrice", "SellPriceFormatted", "SellPriceVAT", "VATClass", "PriceEUR", "PricePerMeter", "ImageUrl",
+]
+# Typed columns in parquet/arrow; anything else is a string
+NUMERIC_COLUMNS = {"YearBuilt", "Age", "Length", "SellPrice", "PriceEUR", "PricePerMeter"}
+
+# format -> (media type, file extension, gzipped in transit)
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv", True),
+    "ndjson": ("application/x-ndjson", "ndjson", True),
+    "parquet": ("application/vnd.apache.parquet", "parquet", False),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows", True),
+}
+COLUMNAR_FORMATS = {"parquet", "arrow"}
+
+
+def available_formats():
+    return [name for name in FORMATS if pyarrow is not None or name not in COLUMNAR_FORMATS]
+
+
+def select_rows(dataset, filters, sort=None):
+    """
+    (total, iterator of boats) matching `filters` in `sort` order, or None
+    when the dataset cannot be filtered yet (a snapshot without columns).
+    Raises ValueError for an unknown sort key.
+    """
+    if dataset.raw_boats_json() is None:
+        total, positions = dataset.index.scan(filters, sort)
+        return total, (dataset.boats[pos] for pos in positions)
+
+    columns = dataset.columns
+    if columns.size != dataset.count:
+        return None
+    positions = np.flatnonzero(columns.mask(filters))
+    if sort:
+        name = sort.lstrip("-")
+        if name not in columns.range_columns:
+            raise ValueError(f"Unknown sort key: {sort}")
+        # Same order as BoatIndex.scan(): by value, ties in dataset order (reversed for "-")
+        positions = positions[np.argsort(columns.range_columns[name][positions], kind="stable")]
+        if sort.startswith("-"):
+            positions = positions[::-1]
+    snapshot = dataset.snapshot
+    return len(positions), (snapshot.boat(int(pos)) for pos in positions)
+
+
+def _batches(boats, size=EXPORT_BATCH):
+    batch = []
+    for boat in boats:
+        batch.append(boat)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv_row(boat, fields):
+    # csv writes None as an empty field; only nested values need encoding
+    row = [boat.get(field) for field in fields]
+    for i, value in enumerate(row):
+        if isinstance(value, (list, dict)):
+            row[i] = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return row
+
+
+def _csv(batches, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for batch in batches:
+        writer.writerows(_csv_row(boat, fields) for boat in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header only: nothing matched
+        yield buffer.getvalue().encode()
+
+
+def _ndjson(batches, fields):
+    for batch in batches:
+        if fields:
+            batch = [{field: boat.get(field) for field in fields} for boat in batch]
+        yield b"".join(dumps(boat) + b"\n" for boat in batch)
+
+
+def _string(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return str(value)
+
+
+def _float(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file for pyarrow writers; take() hands over what they wrote so far."""
+    def __init__(self):
+        self._buffer = bytearray()
+        self._written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._written
+
+    def take(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _columnar(batches, fields, fmt):
+    schema = pyarrow.schema([
+        (field, pyarrow.float64() if field in NUMERIC_COLUMNS else pyarrow.string()) for field in fields
+    ])
+    sink = _Sink()
+    if fmt == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+    try:
+        for batch in batches:
+            table = pyarrow.table({
+                field: [(_float if field in NUMERIC_COLUMNS else _string)(boat.get(field)) for boat in batch]
+                for field in fields
+            }, schema=schema)
+            writer.write_table(table)
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def _counted(boats, fmt):
+    count = 0
+    for count, boat in enumerate(boats, 1):
+        yield boat
+        if count % EXPORT_BATCH == 0:
+            EXPORT_ROWS.inc(EXPORT_BATCH, format=fmt)
+    if count % EXPORT_BATCH:
+        EXPORT_ROWS.inc(count % EXPORT_BATCH, format=fmt)
+
+
+def encode(boats, fmt, fields=None):
+    """Byte chunks of `boats` in format `fmt`, one chunk per EXPORT_BATCH rows."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt in COLUMNAR_FORMATS and pyarrow is None:
+        raise ValueError(f"{fmt} export needs pyarrow, which is not installed")
+    batches = _batches(_counted(boats, fmt))
+    if fmt == "ndjson":
+        return _ndjson(batches, fields)
+    fields = fields or EXPORT_COLUMNS
+    if fmt == "csv":
+        return _csv(batches, fields)
+    return _columnar(batches, fields, fmt)
+
+
+def gzip_stream(chunks, level=GZIP_LEVEL):
+    """Gzips a stream of chunks, flushing after each so every chunk reaches the client as it is made."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
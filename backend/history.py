@@ -0,0 +1,326 @@
+"""
+Append-only market history, kept in SQLite next to the snapshot.
+
+Every finished sync is diffed against the dataset it replaces and only the
+differences are written:
+
+    listings      one row per BoatID ever seen: first seen, delisting
+                  time, first and latest asking price (PriceEUR, so
+                  listings in other currencies compare)
+    price_changes BoatID, time, old and new price
+    events        listed / delisted / relisted, with time
+    syncs         time and counts of every recorded sync
+    daily_stats   per day and builder ("" for the whole market): inventory
+                  count and asking price sum, the last sync of the day wins
+
+so a year of daily syncs over 100k boats stays in the tens of megabytes and
+each analytics query is a range scan over one index. The database runs in
+WAL mode: the sync thread writes while request threads (and follower
+workers) read.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+DAY = 86400
+# Lower edges in days; the last bucket is open-ended
+TIME_ON_MARKET_BUCKETS = [0, 7, 30, 60, 90, 180, 365, 730]
+INTERVALS = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    boat_id TEXT PRIMARY KEY,
+    builder TEXT,
+    model TEXT,
+    country TEXT,
+    first_seen REAL NOT NULL,
+    removed_at REAL,
+    first_price REAL,
+    price REAL
+);
+CREATE INDEX IF NOT EXISTS listings_builder ON listings (builder, first_seen);
+CREATE INDEX IF NOT EXISTS listings_removed ON listings (removed_at);
+
+CREATE TABLE IF NOT EXISTS price_changes (
+    boat_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    old_price REAL,
+    new_price REAL
+);
+CREATE INDEX IF NOT EXISTS price_changes_ts ON price_changes (ts);
+CREATE INDEX IF NOT EXISTS price_changes_boat ON price_changes (boat_id, ts);
+
+CREATE TABLE IF NOT EXISTS events (
+    boat_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_kind_ts ON events (kind, ts);
+CREATE INDEX IF NOT EXISTS events_boat ON events (boat_id, ts);
+
+CREATE TABLE IF NOT EXISTS syncs (
+    ts REAL PRIMARY KEY,
+    listed INTEGER NOT NULL,
+    relisted INTEGER NOT NULL,
+    delisted INTEGER NOT NULL,
+    price_changes INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    day TEXT NOT NULL,
+    builder TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    price_sum REAL NOT NULL,
+    price_count INTEGER NOT NULL,
+    PRIMARY KEY (builder, day)
+) WITHOUT ROWID;
+"""
+
+
+def _price(boat):
+    price = boat.get("PriceEUR")
+    if isinstance(price, (int, float)) and not isinstance(price, bool) and price > 0:
+        return float(price)
+    return None
+
+
+def _day(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+def _in(column, values):
+    """SQL fragment and parameters for an optional IN filter."""
+    if not values:
+        return "", []
+    return f" AND {column} IN ({','.join('?' * len(values))})", list(values)
+
+
+class HistoryStore:
+    def __init__(self, path):
+        # Nothing is opened until the first read or write, so importing the
+        # service (followers, benchmarks, tests) leaves the file alone
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._has_schema = False
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        if not self._has_schema:
+            with self._schema_lock:
+                if not self._has_schema:
+                    db.executescript(SCHEMA)
+                    self._has_schema = True
+        return db
+
+    def record(self, previous, dataset, ts=None, previous_ts=None):
+        """
+        Writes what changed between `previous` (the boat list being replaced,
+        last confirmed at `previous_ts`) and `dataset` (the Dataset just
+        published), plus today's inventory stats. Boats of `previous` with no
+        listing yet (history started on an existing cache) get one, first
+        seen at `previous_ts`, so their changes and delisting are recorded.
+        Returns {"listed", "delisted", "relisted", "price_changes"}.
+        """
+        ts = ts or time.time()
+        previous_ts = min(previous_ts or ts, ts)
+        old = {str(b["BoatID"]): b for b in previous if "BoatID" in b}
+        new = {str(b["BoatID"]): b for b in dataset.boats if "BoatID" in b}
+
+        price_changes = []
+        for boat_id, boat in new.items():
+            before = old.get(boat_id)
+            if before is not None and _price(before) != _price(boat):
+                price_changes.append((boat_id, ts, _price(before), _price(boat)))
+        delisted = [boat_id for boat_id in old if boat_id not in new]
+        appeared = [boat_id for boat_id in new if boat_id not in old]
+
+        with self._write_lock, self._connect() as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO listings (boat_id, builder, model, country, first_seen, first_price, price)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (boat_id, boat.get("Builder"), boat.get("Model"), boat.get("Country"),
+                     previous_ts, _price(boat), _price(boat))
+                    for boat_id, boat in old.items()
+                ],
+            )
+            known = set()
+            # Boats we have seen before (delisted earlier, or history older than the cache)
+            for chunk in range(0, len(appeared), 500):
+                ids = appeared[chunk:chunk + 500]
+                known.update(row[0] for row in db.execute(
+                    f"SELECT boat_id FROM listings WHERE boat_id IN ({','.join('?' * len(ids))})", ids
+                ))
+            listed = [boat_id for boat_id in appeared if boat_id not in known]
+            relisted = [boat_id for boat_id in appeared if boat_id in known]
+
+            db.executemany(
+                "INSERT INTO listings (boat_id, builder, model, country, first_seen, first_price, price)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (boat_id, new[boat_id].get("Builder"), new[boat_id].get("Model"), new[boat_id].get("Country"),
+                     ts, _price(new[boat_id]), _price(new[boat_id]))
+                    for boat_id in listed
+                ],
+            )
+            db.executemany(
+                "UPDATE listings SET removed_at = NULL, price = ? WHERE boat_id = ?",
+                [(_price(new[boat_id]), boat_id) for boat_id in relisted],
+            )
+            db.executemany("UPDATE listings SET removed_at = ? WHERE boat_id = ?", [(ts, boat_id) for boat_id in delisted])
+            db.executemany(
+                "UPDATE listings SET price = ? WHERE boat_id = ?",
+                [(new_price, boat_id) for boat_id, _, _, new_price in price_changes],
+            )
+            db.executemany("INSERT INTO price_changes VALUES (?, ?, ?, ?)", price_changes)
+            db.executemany(
+                "INSERT INTO events VALUES (?, ?, ?)",
+                [(boat_id, ts, "listed") for boat_id in listed]
+                + [(boat_id, ts, "relisted") for boat_id in relisted]
+                + [(boat_id, ts, "delisted") for boat_id in delisted],
+            )
+            counts = {
+                "listed": len(listed),
+                "relisted": len(relisted),
+                "delisted": len(delisted),
+                "price_changes": len(price_changes),
+            }
+            # Active boats are "last seen" at the latest sync, so rows need no touching
+            db.execute("INSERT OR REPLACE INTO syncs VALUES (:ts, :listed, :relisted, :delisted, :price_changes)",
+                       {"ts": ts, **counts})
+            self._write_daily_stats(db, dataset.aggregates, _day(ts))
+        return counts
+
+    def _write_daily_stats(self, db, aggregates, day):
+        rows = [("", aggregates.total)] + list(aggregates.groups["builders"].items())
+        db.execute("DELETE FROM daily_stats WHERE day = ?", (day,))
+        db.executemany(
+            "INSERT INTO daily_stats VALUES (?, ?, ?, ?, ?)",
+            [
+                (day, builder, summary.count, float(summary.price_sum), sum(summary.prices.values()))
+                for builder, summary in rows if summary.count > 0
+            ],
+        )
+
+    def price_trend(self, builders=(), interval="day", since=None, until=None):
+        """Inventory and average asking price per interval, market-wide or for some builders."""
+        if interval not in INTERVALS:
+            raise ValueError(f"Unknown interval: {interval}")
+        builder_sql, params = _in("builder", builders) if builders else (" AND builder = ?", [""])
+        date_sql = ""
+        if since is not None:
+            date_sql += " AND day >= ?"
+            params.append(_day(since))
+        if until is not None:
+            date_sql += " AND day <= ?"
+            params.append(_day(until))
+        # Average the days of each interval, then sum across the selected builders
+        rows = self._connect().execute(
+            f"""
+            SELECT period, SUM(count) AS count, SUM(price_sum) AS price_sum, SUM(price_count) AS price_count
+            FROM (
+                SELECT strftime(?, day) AS period, builder,
+                       AVG(count) AS count, AVG(price_sum) AS price_sum, AVG(price_count) AS price_count
+                FROM daily_stats WHERE 1 = 1{builder_sql}{date_sql}
+                GROUP BY period, builder
+            )
+            GROUP BY period ORDER BY period
+            """,
+            [INTERVALS[interval]] + params,
+        ).fetchall()
+        return [
+            {
+                "period": row["period"],
+                "count": round(row["count"]),
+                "avg_price": row["price_sum"] / row["price_count"] if row["price_count"] else None,
+            }
+            for row in rows
+        ]
+
+    def price_drops(self, since=None, builders=(), min_drop=0.0, limit=50):
+        """Most recent asking-price reductions, newest first."""
+        builder_sql, builder_params = _in("l.builder", builders)
+        rows = self._connect().execute(
+            f"""
+            SELECT c.boat_id, c.ts, c.old_price, c.new_price, l.builder, l.model, l.country, l.removed_at
+            FROM price_changes c JOIN listings l ON l.boat_id = c.boat_id
+            WHERE c.ts >= ? AND c.new_price < c.old_price
+              AND (c.old_price - c.new_price) / c.old_price >= ?{builder_sql}
+            ORDER BY c.ts DESC LIMIT ?
+            """,
+            [since or 0, min_drop] + builder_params + [limit],
+        ).fetchall()
+        return [
+            {
+                "boat_id": row["boat_id"],
+                "changed_at": row["ts"],
+                "old_price": row["old_price"],
+                "new_price": row["new_price"],
+                "drop": round((row["old_price"] - row["new_price"]) / row["old_price"], 4),
+                "builder": row["builder"],
+                "model": row["model"],
+                "country": row["country"],
+                "active": row["removed_at"] is None,
+            }
+            for row in rows
+        ]
+
+    def time_on_market(self, builders=(), status="sold", now=None):
+        """
+        Distribution of days on market: for delisted boats (status="sold",
+        first seen to delisting) or for the current inventory ("active").
+        """
+        if status not in ("sold", "active"):
+            raise ValueError(f"Unknown status: {status}")
+        now = now or time.time()
+        end = "removed_at" if status == "sold" else "?"
+        where = "removed_at IS NOT NULL" if status == "sold" else "removed_at IS NULL"
+        builder_sql, params = _in("builder", builders)
+        cases = " ".join(
+            f"WHEN days >= {edge} THEN {i}" for i, edge in reversed(list(enumerate(TIME_ON_MARKET_BUCKETS)))
+        )
+        rows = self._connect().execute(
+            f"""
+            SELECT CASE {cases} ELSE 0 END AS bucket, COUNT(*) AS count, AVG(days) AS avg_days
+            FROM (SELECT ({end} - first_seen) / {DAY}.0 AS days FROM listings WHERE {where}{builder_sql})
+            GROUP BY bucket
+            """,
+            ([now] if status == "active" else []) + params,
+        ).fetchall()
+        counts = {row["bucket"]: row["count"] for row in rows}
+        total = sum(counts.values())
+        avg_days = sum(row["avg_days"] * row["count"] for row in rows) / total if total else None
+        buckets = []
+        for i, low in enumerate(TIME_ON_MARKET_BUCKETS):
+            high = TIME_ON_MARKET_BUCKETS[i + 1] if i + 1 < len(TIME_ON_MARKET_BUCKETS) else None
+            buckets.append({"from": low, "to": high, "count": counts.get(i, 0)})
+        return {"status": status, "total": total, "avg_days": avg_days, "distribution": buckets}
+
+    def boat_history(self, boat_id):
+        """Listing record, price changes and events for one boat, or None."""
+        db = self._connect()
+        listing = db.execute("SELECT * FROM listings WHERE boat_id = ?", (str(boat_id),)).fetchone()
+        if listing is None:
+            return None
+        prices = db.execute(
+            "SELECT ts, old_price, new_price FROM price_changes WHERE boat_id = ? ORDER BY ts", (str(boat_id),)
+        ).fetchall()
+        events = db.execute("SELECT ts, kind FROM events WHERE boat_id = ? ORDER BY ts", (str(boat_id),)).fetchall()
+        last_seen = listing["removed_at"] or db.execute("SELECT MAX(ts) FROM syncs").fetchone()[0]
+        return {
+            **dict(listing),
+            "last_seen": last_seen,
+            "price_changes": [dict(row) for row in prices],
+            "events": [dict(row) for row in events],
+        }
@@ -1,10 +1,23 @@
-from fastapi import FastAPI, HTTPException, Query
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Query, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from service import get_cached_boats, start_background_sync, sync_state, calculate_stats, get_boat_details
+from fastapi.responses import FileResponse, StreamingResponse, Response
+from pydantic import BaseModel, Field
+from service import get_dataset, sync_state, get_stats, detail_fetcher, history, upstream_breaker
+from query import DEFAULT_LIMIT, MAX_LIMIT
+from similar import DEFAULT_K, MAX_K, spec_boat
+from responses import CachedBody, etag_matches, accepted_encodings
+from export import FORMATS, available_formats, encode, gzip_stream, select_rows
+from scheduler import dataset_age, is_stale, MAX_STALENESS
+from events import MAX_IDS, EventBroker
+from cluster import Cluster
+import metrics
+import asyncio
+import email.utils
 import logging
 import os
+import time
 
 app = FastAPI()
 
@@ -15,50 +28,467 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by the dashboard to apply "dataset" events to the list it holds
+    expose_headers=["X-Dataset-Version"],
 )
 
 logger = logging.getLogger("uvicorn")
 
+MAX_DETAIL_BATCH = 50
+MAX_VALUATION_BATCH = 500
+
+# GET endpoints answered from the live dataset alone: they carry its age and
+# validators, and a revalidation against an unchanged dataset is a bare 304
+DATASET_ROUTES = {"/api/boats", "/api/boats/query", "/api/stats", "/api/search", "/api/search/suggest"}
+
+SYNC_MESSAGES = {
+    "started": "Sync started",
+    "forwarded": "Sync requested from the leader",
+    "running": "Sync already running",
+    "pending": "Sync already scheduled",
+    "debounced": "Data was just synced, request ignored",
+}
+
+# Leader election between uvicorn workers: only the leader syncs upstream
+cluster = Cluster()
+
+# Push channel for dashboards (replaces /api/status polling)
+event_broker = EventBroker()
+sync_state.on_progress(lambda state: event_broker.publish_progress(state.get_status()))
+sync_state.on_dataset_change(event_broker.publish_dataset)
+
+@metrics.register_collector
+def collect_cache_metrics():
+    """Detail cache and SSE figures, read from their owners at scrape time."""
+    details = detail_fetcher.stats()
+    yield "detail_cache_entries", "gauge", "Boat details held in the LRU cache", {(): details["size"]}
+    yield "detail_cache_lookups_total", "counter", "Detail lookups by result", {
+        (("result", "hit"),): details["hits"],
+        (("result", "miss"),): details["misses"],
+        (("result", "coalesced"),): details["coalesced"],
+    }
+    yield "detail_upstream_errors_total", "counter", "Failed upstream detail fetches", {(): details["errors"]}
+    yield "event_subscribers", "gauge", "Open /api/events streams", {(): event_broker.subscriber_count}
+    yield "dataset_version", "gauge", "Version of the live dataset", {(): sync_state.version}
+    age = dataset_age(sync_state.dataset)
+    if age is not None:
+        yield "dataset_age_seconds", "gauge", "Seconds since the live dataset was confirmed upstream", {(): age}
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    # Label by route template so /api/boats/{boat_id} stays one series
+    if route is not None and route.path.startswith("/api"):
+        metrics.HTTP_SECONDS.observe(
+            time.perf_counter() - started, route=route.path, method=request.method, status=response.status_code
+        )
+        size = response.headers.get("content-length")
+        if size is not None:
+            metrics.HTTP_RESPONSE_BYTES.observe(int(size), route=route.path)
+    return response
+
+@app.middleware("http")
+async def dataset_freshness(request: Request, call_next):
+    """
+    Age headers on DATASET_ROUTES: Last-Modified (when this version was
+    built), X-Dataset-Version, X-Dataset-Age (seconds since it was last
+    confirmed upstream) and X-Dataset-Stale past MAX_STALENESS. Routes other
+    than /api/boats (which has a content ETag of its own) get a weak ETag
+    naming the dataset version, so a client or proxy revalidates them with
+    If-None-Match instead of downloading them again.
+    """
+    if request.method != "GET" or request.url.path not in DATASET_ROUTES:
+        return await call_next(request)
+    dataset = get_dataset()
+    age = dataset_age(dataset)
+    headers = {
+        "Last-Modified": email.utils.formatdate(dataset.created, usegmt=True),
+        "X-Dataset-Version": str(dataset.version),
+    }
+    if age is not None:
+        headers["X-Dataset-Age"] = str(int(age))
+    if is_stale(dataset):
+        headers["X-Dataset-Stale"] = "true"
+    if request.url.path != "/api/boats":
+        # Versions are numbered per worker, the build time is the same only for the same data
+        headers["ETag"] = f'W/"{dataset.version}-{int(dataset.created * 1000):x}"'
+        headers["Cache-Control"] = "no-cache"
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    response = await call_next(request)
+    if response.status_code < 400:
+        response.headers.update(headers)
+    return response
+
 @app.on_event("startup")
 async def startup_event():
-    logger.info("Starting up... Triggering initial sync.")
-    start_background_sync(initial=True)
+    event_broker.bind(asyncio.get_running_loop())
+    logger.info("Starting up... Electing sync leader.")
+    cluster.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    cluster.stop()
+    await detail_fetcher.close()
 
 @app.get("/api/boats")
-def get_boats(refresh: bool = False):
+def get_boats(request: Request, refresh: bool = False, full: bool = False):
     """
     Returns the cached list of boats.
-    If refresh=True, triggers a background sync (if not already running).
+    If refresh=True, asks the scheduler for a sync soon (debounced like POST /api/sync).
+    Syncs are incremental unless full=True.
+    The body is encoded and compressed once per dataset version and
+    revalidated with its ETag.
     """
     if refresh:
-        start_background_sync()
-        
-    boats = get_cached_boats()
-    return boats
+        cluster.request_sync(full=full, source="refresh")
+
+    dataset = get_dataset()
+
+    def build():
+        # Right after boot the dataset is still the mapped snapshot: reuse its bytes as-is
+        raw = dataset.raw_boats_json()
+        return CachedBody(raw) if raw is not None else CachedBody.from_object(dataset.boats)
+
+    # The body stays a plain list, so a partial dataset is flagged in a header
+    headers = {"X-Dataset-Partial": "true"} if dataset.partial else None
+    return dataset.body("boats", build).response(request, headers)
+
+def boat_filters(
+    builders: List[str] = Query([]),
+    models: List[str] = Query([]),
+    countries: List[str] = Query([]),
+    conditions: List[str] = Query([]),
+    vat_classes: List[str] = Query([], alias="vatClasses", description="paid, excluded or unknown"),
+    country_codes: List[str] = Query([], alias="countryCodes", description="ISO 3166 alpha-2"),
+    builder_keys: List[str] = Query([], alias="builderKeys", description="Normalised builder names"),
+    year_from: Optional[float] = Query(None, alias="yearFrom"),
+    year_to: Optional[float] = Query(None, alias="yearTo"),
+    length_from: Optional[float] = Query(None, alias="lengthFrom"),
+    length_to: Optional[float] = Query(None, alias="lengthTo"),
+    price_from: Optional[float] = Query(None, alias="priceFrom"),
+    price_to: Optional[float] = Query(None, alias="priceTo"),
+    price_eur_from: Optional[float] = Query(None, alias="priceEurFrom"),
+    price_eur_to: Optional[float] = Query(None, alias="priceEurTo"),
+    price_per_meter_from: Optional[float] = Query(None, alias="pricePerMeterFrom"),
+    price_per_meter_to: Optional[float] = Query(None, alias="pricePerMeterTo"),
+    age_from: Optional[float] = Query(None, alias="ageFrom"),
+    age_to: Optional[float] = Query(None, alias="ageTo"),
+    q: Optional[str] = None,
+):
+    """Dashboard filter state, shared by every endpoint that accepts filters."""
+    return {
+        "builders": builders,
+        "models": models,
+        "countries": countries,
+        "conditions": conditions,
+        "vatClasses": vat_classes,
+        "countryCodes": [code.upper() for code in country_codes],
+        "builderKeys": builder_keys,
+        "yearFrom": year_from,
+        "yearTo": year_to,
+        "lengthFrom": length_from,
+        "lengthTo": length_to,
+        "priceFrom": price_from,
+        "priceTo": price_to,
+        "priceEurFrom": price_eur_from,
+        "priceEurTo": price_eur_to,
+        "pricePerMeterFrom": price_per_meter_from,
+        "pricePerMeterTo": price_per_meter_to,
+        "ageFrom": age_from,
+        "ageTo": age_to,
+        "q": q,
+    }
+
+@app.get("/api/boats/query")
+def query_boats(
+    filters: dict = Depends(boat_filters),
+    sort: Optional[str] = Query(None, description="price, priceEur, pricePerMeter, year, age or length; prefix with - for descending"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_LIMIT, ge=0, le=MAX_LIMIT),
+    facets: bool = True,
+):
+    """
+    Filtered, sorted and paginated view of the cached boats, with the total
+    match count and per-value facet counts for the categorical filters.
+    "partial" is true while a cold-start sync is still loading the catalogue.
+    """
+    dataset = get_dataset()
+    try:
+        result = dataset.index.query(filters, sort=sort, offset=offset, limit=limit, facets=facets)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result["partial"] = dataset.partial
+    return result
+
+@app.get("/api/boats/export")
+def export_boats(
+    request: Request,
+    filters: dict = Depends(boat_filters),
+    fmt: str = Query("csv", alias="format", description="csv, ndjson, parquet or arrow (the last two need pyarrow)"),
+    fields: List[str] = Query([], description="Columns to export, in order; default: the standard set (all fields for ndjson)"),
+    sort: Optional[str] = Query(None, description="A range field (price, year, ...), - for descending; dataset order when omitted"),
+):
+    """
+    Every boat matching the dashboard filters, streamed from the cached
+    dataset in batches as CSV, NDJSON, Parquet or Arrow, gzipped on the fly
+    when the client accepts it. X-Total-Count gives the number of rows.
+    """
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format {fmt!r}, expected one of {list(FORMATS)}")
+    if fmt not in available_formats():
+        raise HTTPException(status_code=501, detail=f"{fmt} export needs pyarrow on the server")
+    dataset = get_dataset()
+    try:
+        selected = select_rows(dataset, filters, sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if selected is None:
+        raise HTTPException(status_code=503, detail="Dataset still loading", headers={"Retry-After": "5"})
+    total, boats = selected
+
+    media_type, extension, compressible = FORMATS[fmt]
+    chunks = encode(boats, fmt, fields)
+    headers = {
+        "Content-Disposition": f'attachment; filename="boats-v{dataset.version}.{extension}"',
+        "X-Total-Count": str(total),
+        "X-Dataset-Version": str(dataset.version),
+        "Vary": "Accept-Encoding",
+    }
+    if dataset.partial:
+        headers["X-Dataset-Partial"] = "true"
+    if compressible and "gzip" in accepted_encodings(request):
+        headers["Content-Encoding"] = "gzip"
+        chunks = gzip_stream(chunks)
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+@app.get("/api/search")
+def search_boats(
+    filters: dict = Depends(boat_filters),
+    sort: Optional[str] = Query(None, description="Relevance when omitted; else a range field (price, pricePerMeter, age, ...), - for descending"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_LIMIT, ge=0, le=MAX_LIMIT),
+    ids: bool = Query(False, description="Return the BoatIDs of every match instead of a page of boats"),
+):
+    """
+    Ranked, typo-tolerant search for `q` over builder, model, country,
+    condition and BoatID, combined with the structured filters.
+    """
+    dataset = get_dataset()
+    filters = dict(filters)
+    text = filters.pop("q", None) or ""
+    try:
+        result = dataset.index.search_query(text, filters, sort=sort, offset=offset, limit=limit, ids=ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result["partial"] = dataset.partial
+    return result
+
+@app.get("/api/search/suggest")
+def suggest_values(
+    field: str = Query(..., description="builders, models, countries or conditions"),
+    text: str = "",
+    limit: int = Query(10, ge=1, le=100),
+    filters: dict = Depends(boat_filters),
+):
+    """
+    Autocomplete for a filter dropdown: matching values of `field`, best
+    first, with boat counts under the other active filters.
+    """
+    dataset = get_dataset()
+    try:
+        return {"field": field, "results": dataset.index.suggest(field, text, filters, limit)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/status")
 def get_sync_status():
     """
     Returns the current sync status.
     """
-    return sync_state.get_status()
+    return {
+        **sync_state.get_status(),
+        "age": dataset_age(sync_state.dataset),
+        "stale": is_stale(sync_state.dataset),
+        "max_staleness": MAX_STALENESS,
+        "schedule": cluster.scheduler.status() if cluster.is_leader else None,
+        "role": cluster.role,
+        "upstream": upstream_breaker.state,
+        "detail_cache": detail_fetcher.stats(),
+        "event_subscribers": event_broker.subscriber_count,
+    }
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition of the server's counters and histograms."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/events")
+async def stream_events(request: Request):
+    """
+    Server-Sent Events: the current status on connect, then "progress" while
+    a sync runs and "dataset" (version + changed ids) when new data is live.
+    """
+    return StreamingResponse(
+        event_broker.stream(request, sync_state.get_status()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/api/sync")
-def trigger_sync():
+def trigger_sync(full: bool = False):
     """
-    Manually triggers a sync.
+    Asks for a sync now instead of at its scheduled time (incremental unless
+    full=True). Requests while a sync runs or is pending, or shortly after
+    the last one, are coalesced; "result" says which. On a follower worker
+    the request is handed to the leader.
     """
-    start_background_sync()
-    return {"message": "Sync started"}
+    result = cluster.request_sync(full=full, source="api")
+    return {
+        "message": SYNC_MESSAGES[result],
+        "started": result in ("started", "forwarded"),
+        "result": result,
+        "full": full,
+    }
 
 @app.get("/api/stats")
-def get_stats():
-    boats = get_cached_boats()
-    return calculate_stats(boats)
+def get_dashboard_stats(filters: dict = Depends(boat_filters)):
+    """
+    Price/year stats, builder/country/condition histograms and price/length
+    distributions, for the whole inventory or the boats matching the filters.
+    """
+    dataset = get_dataset()
+    stats = get_stats(filters, dataset)
+    # Stats dicts are shared and memoised: copy rather than flag them in place
+    return {**stats, "partial": True} if dataset.partial else stats
+
+@app.get("/api/history/trend")
+def get_price_trend(
+    builders: List[str] = Query([]),
+    interval: str = Query("day", description="day, week or month"),
+    since: Optional[float] = Query(None, description="Unix time"),
+    until: Optional[float] = Query(None, description="Unix time"),
+):
+    """Inventory count and average asking price over time, market-wide or for the given builders."""
+    try:
+        return {"interval": interval, "points": history.price_trend(builders, interval, since, until)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/history/price-drops")
+def get_price_drops(
+    builders: List[str] = Query([]),
+    since: Optional[float] = Query(None, description="Unix time"),
+    min_drop: float = Query(0.0, alias="minDrop", ge=0, le=1, description="Fraction of the old price"),
+    limit: int = Query(50, ge=1, le=MAX_LIMIT),
+):
+    """Most recent asking-price reductions seen by the syncs, newest first."""
+    return {"results": history.price_drops(since, builders, min_drop, limit)}
+
+@app.get("/api/history/time-on-market")
+def get_time_on_market(
+    builders: List[str] = Query([]),
+    status: str = Query("sold", description="sold (delisted boats) or active"),
+):
+    """Distribution of days on market, in buckets, for delisted boats or the current inventory."""
+    try:
+        return history.time_on_market(builders, status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/history/boats/{boat_id}")
+def get_boat_history(boat_id: str):
+    """First/last seen, price changes and listing events for one boat."""
+    record = history.boat_history(boat_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="No history for this boat")
+    return record
+
+class DetailBatch(BaseModel):
+    ids: List[str]
+
+@app.post("/api/boats/details")
+async def get_boat_details_batch(batch: DetailBatch):
+    """
+    Details for several boats in one round trip: {"results": {id: details or null}}.
+    """
+    if len(batch.ids) > MAX_DETAIL_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_DETAIL_BATCH} ids per batch")
+    return {"results": await detail_fetcher.get_many(batch.ids)}
+
+class RowBatch(BaseModel):
+    ids: List[str]
+
+@app.post("/api/boats/rows")
+def get_boat_rows(batch: RowBatch):
+    """
+    The /api/boats rows of the given boats in the live dataset, for clients
+    applying the ids of a "dataset" event instead of reloading the list:
+    {"version", "results": [row], "missing": [id]}. An id is missing when
+    the boat is not listed, or while a loaded snapshot is still decoding.
+    """
+    if len(batch.ids) > MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IDS} ids per batch")
+    dataset = get_dataset()
+    results, missing = [], []
+    for boat_id in dict.fromkeys(batch.ids):
+        boat = dataset.find(boat_id)
+        if boat is None:
+            missing.append(boat_id)
+        else:
+            results.append(boat)
+    return {"version": dataset.version, "results": results, "missing": missing}
+
+class ValuationItem(BaseModel):
+    # A listed boat, or the specs of one that is not
+    boat_id: Optional[str] = Field(None, alias="boatId")
+    builder: Optional[str] = None
+    model: Optional[str] = None
+    length: Optional[float] = None
+    year: Optional[int] = None
+
+class ValuationBatch(BaseModel):
+    boats: List[ValuationItem]
+    k: int = Field(DEFAULT_K, ge=1, le=MAX_K)
+
+@app.post("/api/boats/valuation")
+def value_boats(batch: ValuationBatch):
+    """
+    Estimated price (EUR) of each boat from the median asking price of its k
+    nearest comparables by length, year, builder and model, with their
+    interquartile range and BoatIDs: {"results": [valuation or null]}, in
+    request order. A boatId is valued as listed (its own price left out);
+    otherwise builder, model, length and year describe the boat.
+    """
+    if len(batch.boats) > MAX_VALUATION_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_VALUATION_BATCH} boats per batch")
+    dataset = get_dataset()
+    boats = []
+    for item in batch.boats:
+        if item.boat_id is not None:
+            boats.append(dataset.similar.get(item.boat_id) or {})
+        else:
+            boats.append(spec_boat(item.builder, item.model, item.length, item.year))
+    return {"results": dataset.similar.value(boats, batch.k), "partial": dataset.partial}
+
+@app.get("/api/boats/{boat_id}/similar")
+def get_similar_boats(boat_id: str, k: int = Query(DEFAULT_K, ge=1, le=MAX_K)):
+    """
+    The k listings most like this one by length, year and price, same
+    builder and model first, nearest first, with their distances and median
+    asking price (EUR).
+    """
+    dataset = get_dataset()
+    boat = dataset.similar.get(boat_id)
+    if boat is None:
+        raise HTTPException(status_code=404, detail="Boat not found or without a length and year")
+    return {"boat_id": boat_id, **dataset.similar.similar(boat, k), "partial": dataset.partial}
 
 @app.get("/api/boats/{boat_id}")
-def get_boat_detail(boat_id: str):
-    details = get_boat_details(boat_id)
+async def get_boat_detail(boat_id: str):
+    details = await detail_fetcher.get(boat_id)
     if not details:
         raise HTTPException(status_code=404, detail="Boat not found")
     return details
@@ -0,0 +1,240 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms live in one registry and are rendered by
+GET /metrics. Blocks are timed with Histogram.time() instead of calling
+time.perf_counter() by hand:
+
+    with SYNC_SECONDS.time(mode="full"):
+        ...
+
+Values that already exist elsewhere (cache sizes, hit counters kept by the
+caches themselves) are read at scrape time through register_collector(),
+so the hot paths carry no extra bookkeeping for them.
+
+No dependency on prometheus_client: the format is a few lines of text and
+the server only needs the three metric types below.
+"""
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds, from a cached lookup to a slow upstream call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = tuple(2 ** n for n in range(8, 28, 2))  # 256 B .. 64 MB
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    kind = None
+
+    def __init__(self, name, help, labels=(), registry=None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    @abstractmethod
+    def samples(self):
+        """[(name suffix, label values, extra label pairs, value)] to render."""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, label_values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.label_names, label_values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [("_total", key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, help, labels, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, sum, count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels):
+        """(count, sum) for one label set."""
+        entry = self._values.get(self._key(labels))
+        return (entry[2], entry[1]) if entry else (0, 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items())
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", key, (("le", _format_value(float(bound))),), cumulative))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), count))
+        return samples
+
+
+class TimedLock:
+    """threading.Lock that records how long callers waited to acquire it."""
+
+    def __init__(self, histogram, **labels):
+        self._lock = threading.Lock()
+        self._histogram = histogram
+        self._labels = labels
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            self._histogram.observe(0.0, **self._labels)
+            return True
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        self._histogram.observe(time.perf_counter() - started, **self._labels)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def register_collector(self, collect):
+        """collect() runs on every scrape and yields (name, kind, help, {labels: value})."""
+        self._collectors.append(collect)
+
+    def render(self):
+        blocks = [metric.render() for metric in list(self._metrics.values())]
+        for collect in self._collectors:
+            for name, kind, help, values in collect():
+                lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                for labels, value in values.items():
+                    label_names = [label for label, _ in labels]
+                    label_values = [label_value for _, label_value in labels]
+                    lines.append(f"{name}{_format_labels(label_names, label_values)} {_format_value(value)}")
+                blocks.append("\n".join(lines))
+        return "\n".join(blocks) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def register_collector(collect):
+    REGISTRY.register_collector(collect)
+    return collect
+
+
+def render():
+    return REGISTRY.render()
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Metrics shared across the backend ---
+
+UPSTREAM_PAGE_SECONDS = Histogram("upstream_page_seconds", "Latency of one upstream boats page request", ["outcome"])
+UPSTREAM_ERRORS = Counter("upstream_errors", "Failed upstream requests by reason", ["reason"])
+SYNC_SECONDS = Histogram("sync_duration_seconds", "Wall time of a sync's catalogue walk", ["mode"])
+SYNC_RUNS = Counter("sync_runs", "Finished syncs by mode and outcome", ["mode", "outcome"])
+SYNC_TRIGGERS = Counter("sync_triggers", "Manual sync triggers by source and what came of them", ["source", "result"])
+SYNC_DEDUP_RATIO = Gauge("sync_dedup_ratio", "Unique boats / records fetched in the last full sync")
+SYNC_BOATS = Gauge("sync_boats", "Boats in the live dataset")
+HTTP_SECONDS = Histogram("http_request_duration_seconds", "API request latency", ["route", "method", "status"])
+HTTP_RESPONSE_BYTES = Histogram("http_response_size_bytes", "Serialized response size", ["route"], buckets=SIZE_BUCKETS)
+EXPORT_ROWS = Counter("export_rows", "Rows streamed by /api/boats/export by format", ["format"])
+CACHE_LOOKUPS = Counter("cache_lookups", "Cache lookups by cache and result", ["cache", "result"])
+LOCK_WAIT_SECONDS = Histogram(
+    "lock_wait_seconds", "Time spent waiting to acquire a lock", ["lock"],
+    buckets=(0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+)
@@ -0,0 +1,210 @@
+"""
+Normalisation stage of the sync: typed fields derived once per boat, when its
+page arrives from upstream, and stored on the record next to the upstream
+fields, so the query index, the columnar store and the aggregates treat them
+like any other field and nothing re-derives them per request.
+
+    PriceEUR        SellPrice in euros, converted from the listing's currency
+                    (Currency, or the symbol/code in SellPriceFormatted;
+                    euros when neither says otherwise). None if unknown.
+    VATClass        "paid", "excluded" or "unknown" (no VAT text), from the
+                    Italian SellPriceVAT text
+    PricePerMeter   PriceEUR / Length
+    Age             years since YearBuilt
+    BuilderKey      builder name lower-cased, accents and punctuation dropped
+                    ("Bénéteau" and "BENETEAU" -> "beneteau")
+    ModelKey        BuilderKey plus the model without the builder's name
+                    ("Azimut 55 Fly" -> "azimut 55 fly")
+    CountryCode     ISO 3166 alpha-2 code of Country (English, Italian or
+                    French name, also as the last part of "Port, Country")
+
+The same functions back ig.py (VAT labels, price per metre), so the
+dashboard and the carousels agree.
+"""
+import datetime
+import json
+import os
+import re
+from functools import lru_cache
+
+from search import normalize
+
+DERIVED_FIELDS = ("PriceEUR", "VATClass", "PricePerMeter", "Age", "BuilderKey", "ModelKey", "CountryCode")
+
+# Euros per unit of currency; override with FX_RATES='{"USD": 0.9, ...}'
+FX_RATES = {
+    "EUR": 1.0, "USD": 0.92, "GBP": 1.17, "CHF": 1.05, "SEK": 0.087, "NOK": 0.086, "DKK": 0.134,
+    "PLN": 0.23, "CZK": 0.04, "HUF": 0.0025, "TRY": 0.027, "AUD": 0.61, "CAD": 0.68, "NZD": 0.56,
+    "AED": 0.25, "JPY": 0.0062, "HKD": 0.118, "SGD": 0.69,
+}
+FX_RATES.update({code.upper(): float(rate) for code, rate in json.loads(os.environ.get("FX_RATES", "{}")).items()})
+
+# Checked in order, so "US$" wins over "$"
+CURRENCY_MARKERS = [("€", "EUR"), ("US$", "USD"), ("A$", "AUD"), ("C$", "CAD"), ("£", "GBP"), ("$", "USD"), ("¥", "JPY")]
+_CURRENCY_CODE = re.compile(r"\b([A-Z]{3})\b")
+
+VAT_LABELS = {"paid": "VAT Paid", "excluded": "VAT Excluded", "unknown": "VAT Excluded"}
+# Anything else ("esclusa", "esente", "non pagata", "se dovuta", ...) is excluded
+_VAT_PAID = ("inclusa", "incl.", "pagata")
+
+COUNTRY_CODES = {
+    "IT": ["italy", "italia", "italie"],
+    "FR": ["france", "francia"],
+    "ES": ["spain", "spagna", "espana", "espagne"],
+    "PT": ["portugal", "portogallo"],
+    "HR": ["croatia", "croazia", "croatie", "hrvatska"],
+    "GR": ["greece", "grecia", "grece"],
+    "MC": ["monaco", "principato di monaco", "principality of monaco"],
+    "MT": ["malta", "malte"],
+    "ME": ["montenegro"],
+    "SI": ["slovenia", "slovenie"],
+    "AL": ["albania", "albanie"],
+    "TR": ["turkey", "turchia", "turquie", "turkiye"],
+    "CY": ["cyprus", "cipro", "chypre"],
+    "DE": ["germany", "germania", "allemagne", "deutschland"],
+    "NL": ["netherlands", "paesi bassi", "olanda", "holland", "pays bas", "the netherlands"],
+    "BE": ["belgium", "belgio", "belgique"],
+    "GB": ["united kingdom", "regno unito", "uk", "great britain", "england", "inghilterra", "scotland", "wales"],
+    "IE": ["ireland", "irlanda", "irlande"],
+    "CH": ["switzerland", "svizzera", "suisse"],
+    "AT": ["austria", "autriche"],
+    "DK": ["denmark", "danimarca", "danemark"],
+    "SE": ["sweden", "svezia", "suede"],
+    "NO": ["norway", "norvegia", "norvege"],
+    "FI": ["finland", "finlandia", "finlande"],
+    "PL": ["poland", "polonia", "pologne"],
+    "EE": ["estonia"],
+    "US": ["united states", "usa", "stati uniti", "etats unis", "united states of america"],
+    "CA": ["canada"],
+    "MX": ["mexico", "messico"],
+    "BS": ["bahamas"],
+    "AE": ["united arab emirates", "emirati arabi uniti", "uae"],
+    "SC": ["seychelles"],
+    "TH": ["thailand", "thailandia"],
+    "AU": ["australia", "australie"],
+    "NZ": ["new zealand", "nuova zelanda"],
+}
+_COUNTRY_LOOKUP = {name: code for code, names in COUNTRY_CODES.items() for name in names}
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+# Years after this many into the future are typos, not boats under construction
+MAX_FUTURE_YEARS = 2
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+@lru_cache(maxsize=4096)
+def vat_class(text):
+    """"paid", "excluded" or "unknown" for a SellPriceVAT text (the rules ig.py labelled slides with)."""
+    if not text:
+        return "unknown"
+    text = text.lower()
+    if any(marker in text for marker in _VAT_PAID) and "non pagata" not in text:
+        return "paid"
+    return "excluded"
+
+
+def vat_label(boat):
+    """Slide label for a boat: its VATClass, or the class of its raw SellPriceVAT (detail payloads)."""
+    return VAT_LABELS[boat.get("VATClass") or vat_class(boat.get("SellPriceVAT") or "")]
+
+
+@lru_cache(maxsize=1024)
+def _currency_of(currency, formatted):
+    if currency:
+        return currency.strip().upper()
+    if not formatted:
+        return "EUR"
+    for marker, code in CURRENCY_MARKERS:
+        if marker in formatted:
+            return code
+    match = _CURRENCY_CODE.search(formatted)
+    return match.group(1) if match else "EUR"
+
+
+def currency(boat):
+    return _currency_of(boat.get("Currency") or "", boat.get("SellPriceFormatted") or "")
+
+
+def price_eur(boat):
+    price = boat.get("SellPrice")
+    if not _number(price) or price <= 0:
+        return None
+    rate = FX_RATES.get(currency(boat))
+    if rate is None:
+        return None
+    return price if rate == 1.0 else round(price * rate)
+
+
+def _per_meter(price, length):
+    if price is None or not _number(length) or length <= 0:
+        return None
+    return round(price / length, 2)
+
+
+def price_per_meter(boat):
+    """PricePerMeter when the boat has been normalised, else derived on the spot."""
+    if "PricePerMeter" in boat:
+        return boat["PricePerMeter"]
+    return _per_meter(price_eur(boat), boat.get("Length"))
+
+
+@lru_cache(maxsize=65536)
+def name_key(text):
+    """Spelling-insensitive key of a builder or model name."""
+    return _NON_WORD.sub(" ", normalize(text)).strip()
+
+
+@lru_cache(maxsize=65536)
+def model_key(builder, model):
+    builder, model = name_key(builder), name_key(model)
+    # "Azimut 55" listed under builder "Azimut": keep the builder once
+    if builder and model.startswith(builder):
+        model = model[len(builder):].strip()
+    return f"{builder} {model}".strip()
+
+
+@lru_cache(maxsize=4096)
+def country_code(country):
+    if not country:
+        return None
+    # "Liguria, Italy": the country is usually the last part
+    for part in reversed(country.split(",")):
+        code = _COUNTRY_LOOKUP.get(name_key(part))
+        if code:
+            return code
+    return None
+
+
+def normalize_boat(boat, year=None):
+    """Adds the DERIVED_FIELDS to `boat` in place and returns it."""
+    year = year or datetime.date.today().year
+    price = price_eur(boat)
+    boat["PriceEUR"] = price
+    boat["VATClass"] = vat_class(boat.get("SellPriceVAT") or "")
+    boat["PricePerMeter"] = _per_meter(price, boat.get("Length"))
+    built = boat.get("YearBuilt")
+    if _number(built) and 1900 < built <= year + MAX_FUTURE_YEARS:
+        boat["Age"] = max(0, year - int(built))
+    else:
+        boat["Age"] = None
+    builder, model = boat.get("Builder") or "", boat.get("Model") or ""
+    boat["BuilderKey"] = name_key(builder) or None
+    boat["ModelKey"] = model_key(builder, model) or None
+    boat["CountryCode"] = country_code(boat.get("Country") or "")
+    return boat
+
+
+def normalize_boats(boats):
+    """Normalises a list of boats in place (e.g. one upstream page) and returns it."""
+    year = datetime.date.today().year
+    for boat in boats:
+        normalize_boat(boat, year)
+    return boats
+
+
+def is_normalized(boats):
+    """Whether `boats` already carry the derived fields (caches written before this stage did not)."""
+    return not boats or all(field in boats[0] for field in DERIVED_FIELDS)
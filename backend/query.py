@@ -0,0 +1,279 @@
+"""
+In-memory query engine for the cached boat list.
+
+BoatIndex is built once per sync. It keeps hash indexes (value -> positions)
+for the categorical filters and sorted arrays for the numeric ranges, so a
+query is a handful of dict lookups and bisects plus work proportional to the
+number of matches, instead of a scan over every boat. The free-text `q`
+filter goes through the SearchIndex built alongside (see search.py).
+
+Filters use the same names as the dashboard's filter state:
+builders, models, countries, conditions (lists) and
+yearFrom/yearTo, lengthFrom/lengthTo, priceFrom/priceTo (inclusive ranges),
+plus the fields derived at ingest (normalize.py): vatClasses, countryCodes,
+builderKeys (lists) and priceEur, pricePerMeter, age (ranges, also sort keys).
+"""
+import heapq
+import math
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from search import SearchIndex
+
+# filter name -> boat field
+CATEGORICAL_FIELDS = {
+    "builders": "Builder",
+    "models": "Model",
+    "countries": "Country",
+    "conditions": "Condition",
+    "vatClasses": "VATClass",
+    "countryCodes": "CountryCode",
+    "builderKeys": "BuilderKey",
+}
+
+# range prefix -> boat field
+NUMERIC_FIELDS = {
+    "year": "YearBuilt",
+    "length": "Length",
+    "price": "SellPrice",
+    "priceEur": "PriceEUR",
+    "pricePerMeter": "PricePerMeter",
+    "age": "Age",
+}
+
+DEFAULT_LIMIT = 24
+MAX_LIMIT = 500
+
+
+def _number(value):
+    # Same convention as the dashboard: missing or non-numeric values count as 0
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 0
+    return value
+
+
+class BoatIndex:
+    def __init__(self, boats):
+        self.boats = boats
+        self.size = len(boats)
+
+        # filter name -> {value: [positions]}
+        self.categorical = {name: defaultdict(list) for name in CATEGORICAL_FIELDS}
+        for pos, boat in enumerate(boats):
+            for name, field in CATEGORICAL_FIELDS.items():
+                value = boat.get(field)
+                if value:
+                    self.categorical[name][value].append(pos)
+
+        # range prefix -> (sorted values, positions in the same order, rank of each position)
+        self.numeric = {}
+        for name, field in NUMERIC_FIELDS.items():
+            values = [_number(boat.get(field)) for boat in boats]
+            order = sorted(range(len(boats)), key=values.__getitem__)
+            rank = [0] * len(boats)
+            for r, pos in enumerate(order):
+                rank[pos] = r
+            self.numeric[name] = ([values[pos] for pos in order], order, rank)
+
+        self.search = SearchIndex(boats, self.categorical)
+
+    def _categorical_match(self, name, selected):
+        index = self.categorical[name]
+        positions = set()
+        for value in selected:
+            positions.update(index.get(value, ()))
+        return positions
+
+    def _range_match(self, name, low, high):
+        values, order, _ = self.numeric[name]
+        lo = bisect_left(values, low) if low is not None else 0
+        hi = bisect_right(values, high) if high is not None else len(values)
+        return order[lo:hi]
+
+    def _range_is_noop(self, name, low, high):
+        # A range covering the whole column filters nothing
+        values = self.numeric[name][0]
+        if low is None and high is None:
+            return True
+        return bool(values) and (low is None or low <= values[0]) and (high is None or high >= values[-1])
+
+    def active_filters(self, filters):
+        """Names of the filters that actually narrow the result (range filters by prefix, e.g. "price")."""
+        active = [name for name in CATEGORICAL_FIELDS if filters.get(name)]
+        active += [name for name in NUMERIC_FIELDS
+                   if not self._range_is_noop(name, filters.get(f"{name}From"), filters.get(f"{name}To"))]
+        if (filters.get("q") or "").strip():
+            active.append("q")
+        return active
+
+    def _constraints(self, filters, skip=None):
+        """Candidate position collections for every active filter, except `skip`."""
+        constraints = []
+        for name in self.active_filters(filters):
+            if name == skip or name == "q":
+                continue
+            if name in CATEGORICAL_FIELDS:
+                constraints.append(self._categorical_match(name, filters[name]))
+            else:
+                constraints.append(self._range_match(name, filters.get(f"{name}From"), filters.get(f"{name}To")))
+        return constraints
+
+    def _check(self, positions, filters, skip=None):
+        """
+        The `positions` passing the structured filters, tested boat by boat.
+        Cheaper than building the filters' position sets when `positions`
+        is a small candidate set (text search matches).
+        """
+        checks = []
+        for name in self.active_filters(filters):
+            if name == skip or name == "q":
+                continue
+            if name in CATEGORICAL_FIELDS:
+                field, allowed = CATEGORICAL_FIELDS[name], set(filters[name])
+                checks.append(lambda pos, field=field, allowed=allowed: self.boats[pos].get(field) in allowed)
+            else:
+                values, _, rank = self.numeric[name]
+                low, high = filters.get(f"{name}From"), filters.get(f"{name}To")
+                low = -math.inf if low is None else low
+                high = math.inf if high is None else high
+                checks.append(lambda pos, values=values, rank=rank, low=low, high=high: low <= values[rank[pos]] <= high)
+        if not checks:
+            return positions
+        return [pos for pos in positions if all(check(pos) for check in checks)]
+
+    def _intersect(self, constraints):
+        if not constraints:
+            return None  # everything matches
+        constraints = sorted(constraints, key=len)
+        result = set(constraints[0])
+        for other in constraints[1:]:
+            if not result:
+                break
+            if not isinstance(other, set):
+                other = set(other)
+            result &= other
+        return result
+
+    def select(self, filters, skip=None):
+        """Positions matching `filters` (None means every boat)."""
+        scores = self.search.match(filters["q"]) if filters.get("q") else None
+        if scores is not None:
+            return set(self._check(scores, filters, skip=skip))
+        return self._intersect(self._constraints(filters, skip=skip))
+
+    def _page(self, positions, sort, offset, limit):
+        """Positions for one page of results; only the first offset + limit are ordered."""
+        end = offset + limit
+        descending = bool(sort) and sort.startswith("-")
+        if positions is None:
+            if not sort:
+                return list(range(offset, min(end, self.size)))
+            order = self.numeric[sort.lstrip("-")][1]
+            if descending:
+                return order[max(0, self.size - end):max(0, self.size - offset)][::-1]
+            return order[offset:end]
+        if not sort:
+            return heapq.nsmallest(end, positions)[offset:]
+        rank = self.numeric[sort.lstrip("-")][2]
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        return pick(end, positions, key=rank.__getitem__)[offset:]
+
+    def scan(self, filters, sort=None):
+        """
+        (total, positions) of every boat matching `filters`, the positions
+        produced lazily in `sort` order (dataset order without one), for
+        exports that must not hold a copy of the result.
+        """
+        if sort and sort.lstrip("-") not in NUMERIC_FIELDS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        positions = self.select(filters)
+        total = self.size if positions is None else len(positions)
+        if sort:
+            order = self.numeric[sort.lstrip("-")][1]
+            if sort.startswith("-"):
+                order = reversed(order)
+            if positions is not None:
+                order = (pos for pos in order if pos in positions)
+            return total, order
+        if positions is None:
+            return total, iter(range(self.size))
+        return total, iter(sorted(positions))
+
+    def facets(self, filters):
+        """
+        Per-value counts for each categorical filter. Counts for a field ignore
+        that field's own selection, so a multi-select shows what adding another
+        value would match.
+        """
+        result = {}
+        for name, field in CATEGORICAL_FIELDS.items():
+            positions = self.select(filters, skip=name)
+            if positions is None:
+                result[name] = {value: len(p) for value, p in self.categorical[name].items()}
+                continue
+            counts = defaultdict(int)
+            for pos in positions:
+                value = self.boats[pos].get(field)
+                if value:
+                    counts[value] += 1
+            result[name] = dict(counts)
+        return result
+
+    def query(self, filters, sort=None, offset=0, limit=DEFAULT_LIMIT, facets=True):
+        if sort and sort.lstrip("-") not in NUMERIC_FIELDS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        limit = max(0, min(limit, MAX_LIMIT))
+        offset = max(0, offset)
+
+        positions = self.select(filters)
+        total = self.size if positions is None else len(positions)
+        page = self._page(positions, sort, offset, limit)
+
+        response = {
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "results": [self.boats[pos] for pos in page],
+        }
+        if facets:
+            response["facets"] = self.facets(filters)
+        return response
+
+    def search_query(self, text, filters, sort=None, offset=0, limit=DEFAULT_LIMIT, ids=False):
+        """
+        Boats matching `text` and the structured `filters`, best match first
+        (or by `sort`), with their relevance scores in the same order. With
+        `ids` only the BoatIDs of every match are returned, ranked the same way.
+        """
+        if sort and sort.lstrip("-") not in NUMERIC_FIELDS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        limit = max(0, min(limit, MAX_LIMIT))
+        offset = max(0, offset)
+
+        scores = self.search.match(text)
+        if scores is None:
+            # Nothing to search for: plain filtered listing
+            positions = self._intersect(self._constraints(filters))
+            scores = dict.fromkeys(range(self.size) if positions is None else positions, 0.0)
+        else:
+            scores = {pos: scores[pos] for pos in self._check(scores, filters)}
+        if ids:
+            offset, limit = 0, len(scores)
+        if sort:
+            page = self._page(scores, sort, offset, limit)
+        else:
+            page = self.search.ranked(scores, offset, limit)
+        if ids:
+            return {"total": len(scores), "ids": [self.boats[pos].get("BoatID") for pos in page]}
+        return {
+            "total": len(scores),
+            "offset": offset,
+            "limit": limit,
+            "results": [self.boats[pos] for pos in page],
+            "scores": [round(scores[pos], 3) for pos in page],
+        }
+
+    def suggest(self, name, text, filters=None, limit=10):
+        """Autocomplete for one categorical filter, counted under the other active filters."""
+        positions = self.select(filters, skip=name) if filters else None
+        return self.search.suggest(name, text, limit=limit, positions=positions)
@@ -0,0 +1,89 @@
+"""
+Pre-serialised JSON responses with compression and ETag revalidation.
+
+A CachedBody is encoded once per dataset version, along with its gzip and
+(when the brotli package is installed) brotli variants, and carries a strong
+ETag derived from its content. Serving it is a header lookup plus a write of
+ready-made bytes, and clients presenting a matching If-None-Match get a 304.
+"""
+import gzip
+import hashlib
+import json
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(obj):
+    """Compact JSON bytes, using orjson when it is available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def etag_matches(request, etag):
+    """If-None-Match check, by weak comparison as RFC 9110 specifies for it."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    etag = etag.removeprefix("W/")
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class CachedBody:
+    def __init__(self, body, media_type="application/json"):
+        self.body = bytes(body)
+        self.media_type = media_type
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=16).hexdigest() + '"'
+        self.variants = {"gzip": gzip.compress(self.body, compresslevel=GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+
+    @classmethod
+    def from_object(cls, obj):
+        return cls(dumps(obj))
+
+    def response(self, request: Request, headers=None):
+        headers = {
+            "ETag": self.etag,
+            "Vary": "Accept-Encoding",
+            # Let browsers and proxies keep the body but revalidate every time
+            "Cache-Control": "no-cache",
+            **(headers or {}),
+        }
+        if etag_matches(request, self.etag):
+            return Response(status_code=304, headers=headers)
+
+        accepted = accepted_encodings(request)
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and encoding in accepted:
+                headers["Content-Encoding"] = encoding
+                return Response(content=self.variants[encoding], media_type=self.media_type, headers=headers)
+        return Response(content=self.body, media_type=self.media_type, headers=headers)
+
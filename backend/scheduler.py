@@ -0,0 +1,195 @@
+"""
+Background sync schedule, run by the sync leader (see cluster.py).
+
+Upstream is polled on a fixed policy instead of whenever a client asks:
+
+  - an incremental sync every SYNC_INTERVAL seconds after the last one;
+  - a full sync every FULL_SYNC_INTERVAL seconds, each one moved by up to
+    FULL_SYNC_JITTER of the interval either way, so restarts and several
+    deployments don't line their full crawls up;
+  - after a failed sync, retries from SYNC_RETRY_INTERVAL, doubling up to
+    SYNC_INTERVAL, so the data never stays older than MAX_STALENESS for
+    longer than the outage itself (stale data is still served, flagged);
+  - manual triggers (POST /api/sync, /api/boats?refresh=true) only bring
+    the next sync forward: one made while a sync runs, while another
+    trigger is pending, or within SYNC_DEBOUNCE seconds of the last sync
+    (of the requested kind) is coalesced, so N clicks cause at most one sync.
+
+With nothing loaded the first sync runs straight away; a fresh snapshot at
+startup waits for its turn instead of re-crawling on every restart.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+from metrics import SYNC_TRIGGERS
+from service import fetch_worker, load_cache, sync_state
+
+logger = logging.getLogger(__name__)
+
+SYNC_INTERVAL = float(os.environ.get("SYNC_INTERVAL", 900))  # seconds between incremental syncs
+FULL_SYNC_INTERVAL = float(os.environ.get("FULL_SYNC_INTERVAL", 6 * 3600))
+FULL_SYNC_JITTER = float(os.environ.get("FULL_SYNC_JITTER", 0.1))  # share of FULL_SYNC_INTERVAL
+MAX_STALENESS = float(os.environ.get("MAX_STALENESS", 3600))  # seconds since the last good sync
+SYNC_RETRY_INTERVAL = float(os.environ.get("SYNC_RETRY_INTERVAL", 60))
+SYNC_DEBOUNCE = float(os.environ.get("SYNC_DEBOUNCE", 60))
+
+
+def dataset_age(dataset, now=None):
+    """Seconds since `dataset` was last confirmed upstream, None if never."""
+    if dataset.synced_at is None:
+        return None
+    return max(0.0, (now or time.time()) - dataset.synced_at)
+
+
+def is_stale(dataset, now=None, max_staleness=MAX_STALENESS):
+    age = dataset_age(dataset, now)
+    return age is None or age > max_staleness
+
+
+class SyncScheduler:
+    def __init__(self, run_sync=fetch_worker, state=sync_state, interval=SYNC_INTERVAL,
+                 full_interval=FULL_SYNC_INTERVAL, jitter=FULL_SYNC_JITTER, max_staleness=MAX_STALENESS,
+                 retry_interval=SYNC_RETRY_INTERVAL, debounce=SYNC_DEBOUNCE, clock=time.time, rng=None):
+        if interval > max_staleness:
+            logger.warning(f"SYNC_INTERVAL {interval:.0f}s exceeds MAX_STALENESS, syncing every {max_staleness:.0f}s")
+            interval = max_staleness
+        self.run_sync = run_sync
+        self.state = state
+        self.interval = interval
+        self.full_interval = full_interval
+        self.jitter = jitter
+        self.max_staleness = max_staleness
+        self.retry_interval = retry_interval
+        self.debounce = debounce
+        self.clock = clock
+        self.rng = rng or random.Random()
+
+        self.last_attempt = 0.0
+        self.last_full = None
+        self.next_full = None
+        self.failures = 0
+        # None, or the kind ("incremental"/"full") of a manual trigger waiting to run
+        self._pending = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, initial=False):
+        """Starts the schedule on a daemon thread; with initial=True the cache is loaded there first."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(initial,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def request(self, full=False, source="manual"):
+        """
+        Asks for a sync soon. Returns "started" when this call scheduled one,
+        else why it was coalesced: "running", "pending" or "debounced".
+        """
+        with self._lock:
+            now = self.clock()
+            last = (self.last_full or 0.0) if full else max(self.last_attempt, self.state.synced_at or 0.0)
+            if self.state.is_loading:
+                result = "running"
+            elif self._pending == "full" or (self._pending and not full):
+                result = "pending"
+            elif now - last < self.debounce and self.state.dataset.count:
+                result = "debounced"
+            else:
+                self._pending = "full" if full else "incremental"
+                result = "started"
+        SYNC_TRIGGERS.inc(source=source, result=result)
+        if result == "started":
+            self._wake.set()
+        return result
+
+    def _schedule_full(self, last_full):
+        self.last_full = last_full
+        spread = self.full_interval * self.jitter
+        self.next_full = last_full + self.full_interval + self.rng.uniform(-spread, spread)
+
+    def next_sync(self, now):
+        """(when, full, reason) of the next sync due."""
+        dataset = self.state.dataset
+        if self.next_full is None:
+            changeset = dataset.changeset or {}
+            # Unknown (old snapshot): count from the cached data's last sync. With no data at
+            # all the first sync is a full one anyway
+            self._schedule_full(changeset.get("full_at") or dataset.synced_at or now)
+        if self._pending:
+            return now, self._pending == "full", "manual"
+        if self.failures:
+            backoff = min(self.interval, self.retry_interval * 2 ** (self.failures - 1))
+            when, reason = self.last_attempt + backoff, "retry"
+        elif not dataset.count:
+            when, reason = now, "empty"
+        else:
+            when, reason = max(self.last_attempt, dataset.synced_at or 0.0) + self.interval, "interval"
+        if self.next_full <= when:
+            return self.next_full, True, "full_interval"
+        return when, False, reason
+
+    def status(self, now=None):
+        now = now or self.clock()
+        when, full, reason = self.next_sync(now)
+        return {
+            "next_sync_at": when,
+            "next_sync_full": full,
+            "next_sync_reason": reason,
+            "last_full_at": self.last_full,
+            "failures": self.failures,
+            "interval": self.interval,
+            "full_interval": self.full_interval,
+        }
+
+    def _run(self, initial):
+        if initial:
+            try:
+                load_cache()
+            except Exception as e:
+                logger.error(f"Failed to load cache: {e}")
+        while not self._stop.is_set():
+            self._wake.clear()
+            now = self.clock()
+            when, full, reason = self.next_sync(now)
+            if when > now:
+                self._wake.wait(when - now)
+                continue
+            try:
+                self._sync(full, reason)
+            except Exception as e:
+                logger.error(f"Scheduled sync failed: {e}")
+
+    def _sync(self, full, reason):
+        with self._lock:
+            self._pending = None
+            started = self.last_attempt = self.clock()
+        logger.info(f"Starting {'full' if full else 'incremental'} sync ({reason})")
+        if not self.run_sync(full=full):
+            # Another thread holds the sync guard: its result counts, look again once it is done
+            self._stop.wait(1.0)
+            return
+        dataset = self.state.dataset
+        if dataset.synced_at is not None and dataset.synced_at >= started:
+            self.failures = 0
+            if (dataset.changeset or {}).get("mode") == "full":
+                self._schedule_full(dataset.synced_at)
+            return
+        self.failures += 1
+        age = dataset_age(dataset, self.clock())
+        if age is not None and age > self.max_staleness:
+            logger.warning(f"Data is {age / 60:.0f} min old, over the {self.max_staleness / 60:.0f} min "
+                           f"staleness limit; {self.failures} syncs failed in a row")
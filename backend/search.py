@@ -0,0 +1,241 @@
+"""
+Typo-tolerant text search over the categorical fields of the boat list.
+
+SearchIndex is built with the BoatIndex, once per sync, from the distinct
+Builder, Model, Country and Condition values only: each value is split into
+normalised tokens (lower case, accents stripped), and the vocabulary of
+tokens gets a trigram index. A query token matches vocabulary terms
+
+    exactly                       weight 1.0
+    as a prefix ("azi" -> azimut) weight 0.8
+    within 1-2 edits ("azimtu")   weight 0.6 / 0.45
+
+and reaches the boats through the BoatIndex's value -> positions lists, so
+the work per query is proportional to the matching values and boats, not to
+the inventory. Every query token has to match (in any field); a boat scores
+the sum over tokens of its best field match times the field weight. BoatIDs
+are matched exactly or by prefix.
+
+The same matching ranks dropdown suggestions (suggest()) among the distinct
+values of one field.
+"""
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+# filter name -> weight of a match in that field
+FIELD_WEIGHTS = {
+    "builders": 1.0,
+    "models": 1.0,
+    "countries": 0.6,
+    "conditions": 0.4,
+}
+ID_WEIGHT = 2.0
+
+EXACT, PREFIX = 1.0, 0.8
+FUZZY = {1: 0.6, 2: 0.45}
+# Prefix matches per token are capped so a one-letter query stays cheap
+MAX_PREFIX_TERMS = 200
+MIN_FUZZY_LENGTH = 4
+# Share of the token's trigrams a fuzzy candidate must contain; short tokens
+# share few trigrams even with a one-letter typo, so one is enough there
+MIN_TRIGRAM_OVERLAP = 0.3
+SHORT_TOKEN = 6
+# Whole-value prefix bonus for suggestions ("Az" ranks "Azimut" above "Benetti Azure")
+SUGGEST_PREFIX_BONUS = 0.5
+DEFAULT_SUGGEST_LIMIT = 10
+# Recent query texts whose scores are kept (facets re-run the same search per field)
+MATCH_CACHE_SIZE = 64
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    text = str(text).lower()
+    if text.isascii():
+        return text
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return _TOKEN.findall(normalize(text))
+
+
+def _trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b, limit):
+    """Optimal string alignment distance, or limit + 1 once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SearchIndex:
+    def __init__(self, boats, categorical):
+        self.boats = boats
+        # BoatIndex.categorical: filter name -> {value: [positions]}
+        self.categorical = categorical
+
+        # term -> [(filter name, value)]
+        self.postings = defaultdict(list)
+        for name in FIELD_WEIGHTS:
+            for value in categorical[name]:
+                for term in set(tokenize(value)):
+                    self.postings[term].append((name, value))
+        self.vocabulary = sorted(self.postings)
+        self.trigrams = defaultdict(list)
+        for term in self.vocabulary:
+            for gram in _trigrams(term):
+                self.trigrams[gram].append(term)
+
+        self._ids = None
+        self._recent = {}
+
+    @property
+    def ids(self):
+        """Sorted (id string, position) for BoatID lookups, built on the first numeric query."""
+        if self._ids is None:
+            self._ids = sorted((str(boat["BoatID"]), pos) for pos, boat in enumerate(self.boats) if "BoatID" in boat)
+        return self._ids
+
+    def _term_weights(self, token):
+        """Vocabulary terms matching one query token, with their match weight."""
+        weights = {}
+        start = bisect_left(self.vocabulary, token)
+        for term in self.vocabulary[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(token):
+                break
+            weights[term] = EXACT if term == token else PREFIX
+
+        if len(token) >= MIN_FUZZY_LENGTH:
+            limit = 1 if len(token) < 7 else 2
+            grams = _trigrams(token)
+            min_shared = 1 if len(token) < SHORT_TOKEN else MIN_TRIGRAM_OVERLAP * len(grams)
+            overlap = defaultdict(int)
+            for gram in grams:
+                for term in self.trigrams.get(gram, ()):
+                    overlap[term] += 1
+            for term, shared in overlap.items():
+                if term in weights or shared < min_shared or abs(len(term) - len(token)) > limit:
+                    continue
+                distance = _edit_distance(token, term, limit)
+                if distance <= limit:
+                    weights[term] = FUZZY[distance]
+        return weights
+
+    def _id_positions(self, token):
+        start = bisect_left(self.ids, (token,))
+        matches = {}
+        for id_string, pos in self.ids[start:start + MAX_PREFIX_TERMS]:
+            if not id_string.startswith(token):
+                break
+            matches[pos] = ID_WEIGHT if id_string == token else ID_WEIGHT * PREFIX
+        return matches
+
+    def _token_scores(self, token):
+        """{position: score} for one query token, best field match per boat."""
+        value_scores = {}
+        for term, weight in self._term_weights(token).items():
+            for key in self.postings[term]:
+                score = weight * FIELD_WEIGHTS[key[0]]
+                if score > value_scores.get(key, 0):
+                    value_scores[key] = score
+        scores = {}
+        # Ascending, so a boat's best-scoring value is written last
+        for (name, value), score in sorted(value_scores.items(), key=lambda item: item[1]):
+            scores.update(dict.fromkeys(self.categorical[name][value], score))
+        if token.isdigit():
+            for pos, score in self._id_positions(token).items():
+                if score > scores.get(pos, 0):
+                    scores[pos] = score
+        return scores
+
+    def match(self, text):
+        """
+        {position: score} for the boats matching every token of `text`, or
+        None for a query without tokens. The dict is shared: do not modify it.
+        """
+        tokens = tuple(dict.fromkeys(tokenize(text)))
+        if not tokens:
+            return None
+        scores = self._recent.get(tokens)
+        if scores is not None:
+            return scores
+        per_token = sorted((self._token_scores(token) for token in tokens), key=len)
+        scores = per_token[0]
+        for other in per_token[1:]:
+            if not scores:
+                break
+            scores = {pos: score + other[pos] for pos, score in scores.items() if pos in other}
+        if len(self._recent) >= MATCH_CACHE_SIZE:
+            self._recent.clear()
+        self._recent[tokens] = scores
+        return scores
+
+    def ranked(self, scores, offset, limit):
+        """One page of positions by descending score (ties in inventory order)."""
+        end = offset + limit
+        return [pos for pos, _ in heapq.nsmallest(end, scores.items(), key=lambda item: (-item[1], item[0]))[offset:]]
+
+    def suggest(self, name, text, limit=DEFAULT_SUGGEST_LIMIT, positions=None):
+        """
+        Values of one categorical filter matching `text`, best first, as
+        [{"value", "count"}]. Counts are restricted to `positions` when given
+        (values without boats there are dropped).
+        """
+        if name not in FIELD_WEIGHTS:
+            raise ValueError(f"Unknown field: {name}")
+        values = self.categorical[name]
+        tokens = list(dict.fromkeys(tokenize(text)))
+        if positions is not None and not isinstance(positions, (set, dict)):
+            positions = set(positions)
+
+        def count(value):
+            matches = values[value]
+            return len(matches) if positions is None else sum(1 for pos in matches if pos in positions)
+
+        if not tokens:
+            candidates = {value: 0.0 for value in values}
+        else:
+            candidates = None
+            for token in tokens:
+                token_scores = {}
+                for term, weight in self._term_weights(token).items():
+                    for key in self.postings[term]:
+                        if key[0] == name and weight > token_scores.get(key[1], 0):
+                            token_scores[key[1]] = weight
+                if candidates is None:
+                    candidates = token_scores
+                else:
+                    candidates = {value: score + token_scores[value]
+                                  for value, score in candidates.items() if value in token_scores}
+                if not candidates:
+                    return []
+            prefix = normalize(text).strip()
+            for value in candidates:
+                if normalize(value).startswith(prefix):
+                    candidates[value] += SUGGEST_PREFIX_BONUS
+
+        ranked = []
+        for value, score in candidates.items():
+            n = count(value)
+            if n:
+                ranked.append((-score, -n, str(value), value, n))
+        return [{"value": value, "count": n} for *_, value, n in heapq.nsmallest(limit, ranked)]
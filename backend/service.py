@@ -1,205 +1,582 @@
-import requests
 import time
 import math
 import logging
 import threading
+import os
+import json
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from aggregates import Summary
+from dataset import Dataset
+from snapshot import read_snapshot, write_snapshot
+from details import DETAIL_ATTEMPTS, DETAIL_TIMEOUT, MAX_CONNECTIONS as DETAIL_CONNECTIONS, DetailFetcher
+from history import HistoryStore
+from normalize import DERIVED_FIELDS, is_normalized, normalize_boats
+from upstream import API_TOKEN, BASE_URL, PAGE_SIZE, CircuitBreaker, UpstreamClient, UpstreamError
+from metrics import (
+    TimedLock, LOCK_WAIT_SECONDS, SYNC_SECONDS, SYNC_RUNS, SYNC_DEDUP_RATIO, SYNC_BOATS,
+)
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-API_TOKEN = "Bearer 4b84405e-5034-42d2-aac3-6a6275c826d1"
-BASE_URL = "https://batoo.api.digibusiness.it/Navis2WS/v2/boats"
+CACHE_PATH = os.environ.get("CACHE_PATH", os.path.join(os.path.dirname(__file__), "boats_cache.snap"))
+LEGACY_CACHE_PATH = os.path.join(os.path.dirname(CACHE_PATH), "boats_cache.json")
+HISTORY_PATH = os.environ.get("HISTORY_PATH", os.path.join(os.path.dirname(__file__), "boats_history.sqlite"))
 
-PAGE_SIZE = 50
+# Concurrent sync tuning
+SYNC_WORKERS = int(os.environ.get("SYNC_WORKERS", 8))
+SYNC_RATE_LIMIT = float(os.environ.get("SYNC_RATE_LIMIT", 20))  # requests per second
+
+# Passes over the pages that still failed after their retries, at the end of a sync
+RECOVERY_ROUNDS = int(os.environ.get("SYNC_RECOVERY_ROUNDS", 3))
+# A sync that got fewer unique boats than this share of TotalResults is not published
+MIN_COMPLETENESS = float(os.environ.get("SYNC_MIN_COMPLETENESS", 0.98))
+
+# Incremental sync stops after this many consecutive unchanged pages
+DELTA_STABLE_PAGES = int(os.environ.get("DELTA_STABLE_PAGES", 2))
+
+# Cold-start syncs publish what they have so far at most this often (seconds)
+STREAM_PUBLISH_INTERVAL = float(os.environ.get("STREAM_PUBLISH_INTERVAL", 1.0))
+
+class IncompleteSyncError(Exception):
+    pass
+
+Progress = namedtuple("Progress", ["fetched", "estimated", "updated"])
 
 # Global State for Sync
 class SyncState:
+    """
+    Holds the live Dataset and the sync progress. Both are immutable values
+    replaced by reference assignment, so readers never take a lock; the lock
+    only serialises writers deriving one version from the previous one.
+    """
     def __init__(self):
-        self.boats = []
-        self.is_loading = False
-        self.total_fetched = 0
-        self.total_estimated = 0
-        self.last_updated = 0
-        self._lock = threading.Lock()
+        self.dataset = Dataset.empty()
+        self.progress = Progress(0, 0, 0)
+        self._sync_guard = threading.Lock()
+        self._listeners = {"dataset": [], "progress": []}
+        self._lock = TimedLock(LOCK_WAIT_SECONDS, lock="sync_state")
+
+    # Read-only views of the current dataset
+    boats = property(lambda self: self.dataset.boats)
+    index = property(lambda self: self.dataset.index)
+    aggregates = property(lambda self: self.dataset.aggregates)
+    columns = property(lambda self: self.dataset.columns)
+    snapshot = property(lambda self: self.dataset.snapshot)
+    version = property(lambda self: self.dataset.version)
+    last_delta = property(lambda self: self.dataset.delta)
+    last_changeset = property(lambda self: self.dataset.changeset)
+    synced_at = property(lambda self: self.dataset.synced_at)
+
+    @property
+    def is_loading(self):
+        return self._sync_guard.locked()
+
+    def on_dataset_change(self, callback):
+        """Registers callback(state) to run after each dataset swap."""
+        self._listeners["dataset"].append(callback)
+
+    def on_progress(self, callback):
+        """Registers callback(state) to run after each progress or loading-flag update."""
+        self._listeners["progress"].append(callback)
+
+    def _notify(self, kind="dataset"):
+        for callback in self._listeners[kind]:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error(f"{kind.capitalize()} listener failed: {e}")
+
+    def begin_sync(self):
+        """Single-flight guard: True if the caller now owns the one running sync."""
+        if not self._sync_guard.acquire(blocking=False):
+            return False
+        self._notify("progress")
+        return True
+
+    def end_sync(self):
+        self._sync_guard.release()
+        self._notify("progress")
 
     def update_progress(self, fetched, total):
+        self.progress = Progress(fetched, total, time.time())
+        self._notify("progress")
+
+    def _publish(self, derive):
         with self._lock:
-            self.total_fetched = fetched
-            self.total_estimated = total
-            self.last_updated = time.time()
-    
-    def set_loading(self, loading):
-        with self._lock:
-            self.is_loading = loading
+            dataset = derive(self.dataset)
+            self.dataset = dataset
+        SYNC_BOATS.set(dataset.count)
+        self._notify()
+        return dataset
             
-    def set_boats(self, boats):
+    def set_boats(self, boats, delta=None, changeset=None, synced_at=None, partial=False):
+        """
+        Publishes a new dataset version. `delta` ({"added": [...], "removed": [...]})
+        lets the aggregates be patched instead of rebuilt; `changeset` and
+        `synced_at` default to the previous version's. `partial` marks the
+        boats received so far by a sync that is still running.
+        """
+        return self._publish(lambda current: Dataset.build(
+            current.version + 1, boats, previous=current, delta=delta,
+            changeset=changeset if changeset is not None else current.changeset,
+            synced_at=synced_at if synced_at is not None else current.synced_at,
+            partial=partial,
+        ))
+
+    def confirm(self, synced_at, changeset=None):
+        """
+        Records that the current data was re-checked upstream without changes.
+        The version stays the same, so nothing is rebuilt, no "dataset" event
+        is sent and the cached bodies and ETags stay valid.
+        """
         with self._lock:
-            self.boats = boats
-            self.last_updated = time.time()
+            self.dataset = dataset = self.dataset.confirmed(synced_at, changeset)
+        return dataset
+
+    def restore(self, dataset):
+        """
+        Publishes `dataset`'s data again as a new version, e.g. to withdraw the
+        partial versions a failed sync published after it.
+        """
+        return self._publish(lambda current: dataset.republished(current.version + 1))
+
+    def set_snapshot(self, snapshot):
+        """Serves a freshly mapped snapshot while its records are decoded in the background."""
+        dataset = self._publish(lambda current: Dataset.from_snapshot(
+            current.version + 1, snapshot, previous=current, synced_at=os.path.getmtime(snapshot.path),
+        ))
+        self.update_progress(dataset.count, dataset.count)
             
     def get_status(self):
-        with self._lock:
-            return {
-                "total_fetched": self.total_fetched,
-                "total_estimated": self.total_estimated,
-                "is_loading": self.is_loading,
-                "boat_count": len(self.boats)
-            }
+        dataset, progress = self.dataset, self.progress
+        return {
+            "total_fetched": progress.fetched,
+            "total_estimated": progress.estimated,
+            "is_loading": self.is_loading,
+            "boat_count": dataset.count,
+            "last_sync": dataset.changeset,
+            "synced_at": dataset.synced_at,
+            "partial": dataset.partial,
+            "version": dataset.version
+        }
 
 sync_state = SyncState()
 
-def fetch_worker():
-    """Background worker to fetch boats"""
-    if sync_state.is_loading:
-        return
-        
-    sync_state.set_loading(True)
-    sync_state.update_progress(0, 0)
+# Shared by every sync and the detail fetcher, so a down upstream is not hammered again by the next caller
+upstream_breaker = CircuitBreaker()
+
+detail_fetcher = DetailFetcher(UpstreamClient(
+    BASE_URL, API_TOKEN, pool_size=DETAIL_CONNECTIONS, breaker=upstream_breaker,
+    max_attempts=DETAIL_ATTEMPTS, timeout=DETAIL_TIMEOUT,
+), listing=lambda boat_id: sync_state.dataset.find(boat_id))
+sync_state.on_dataset_change(detail_fetcher.on_dataset_change)
+
+# Written only by the process that syncs, read by every worker; opened on first use
+history = HistoryStore(HISTORY_PATH)
+
+def _fetch_page(client, start):
+    """One page of the catalogue with its boats normalised (see normalize.py)."""
+    data = client.fetch_page(start, PAGE_SIZE)
+    normalize_boats(data['Results'])
+    return data
+
+def _fetch_offsets(client, offsets, on_page=None):
+    """
+    Fetches the given page offsets on the worker pool.
+    Returns ({offset: results} for the pages that succeeded, [offsets that failed]).
+    """
+    pages, failed = {}, []
+    with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as pool:
+        futures = {pool.submit(_fetch_page, client, start): start for start in offsets}
+        for future in as_completed(futures):
+            start = futures[future]
+            try:
+                pages[start] = future.result().get('Results', [])
+            except Exception as e:
+                logger.error(f"Error fetching page at offset {start}: {e}")
+                failed.append(start)
+                continue
+            if on_page:
+                on_page(start, pages[start])
+    return pages, sorted(failed)
+
+def _recover(client, failed, on_page=None):
+    """
+    Retries pages that failed during the sync, waiting out an open circuit
+    between rounds. Returns ({offset: results} recovered, [offsets still missing]).
+    """
+    pages = {}
+    for round in range(RECOVERY_ROUNDS):
+        if not failed:
+            break
+        wait = client.breaker.retry_in()
+        if wait:
+            logger.info(f"Upstream circuit open, waiting {wait:.1f}s before recovering {len(failed)} pages")
+            time.sleep(wait)
+        logger.info(f"Recovering {len(failed)} failed pages (round {round + 1}/{RECOVERY_ROUNDS})")
+        recovered, failed = _fetch_offsets(client, failed, on_page)
+        pages.update(recovered)
+    return pages, failed
+
+def _dedupe(boats):
+    return list({b['BoatID']: b for b in boats if 'BoatID' in b}.values())
+
+def full_sync(client, stream=False):
+    """
+    Downloads every page of the catalogue, retrying failed pages at the end.
+    Returns (boats, report) where report counts total/fetched/recovered/missing
+    pages and upstream's TotalResults.
+
+    With stream=True (a cold start with nothing to serve) the pages received
+    so far are published as partial dataset versions: the first page right
+    away, then at most every STREAM_PUBLISH_INTERVAL seconds, each patching
+    the aggregates with just the boats that arrived since the last one.
+    """
+    data = _fetch_page(client, 0)
+    
+    total_results = data.get('TotalResults', 0)
+    pages = {0: data.get('Results', [])}
+    fetched = len(pages[0])
+    
+    sync_state.update_progress(fetched, total_results)
+
+    streamed = set()
+    last_publish = 0
+
+    def publish_partial():
+        nonlocal last_publish
+        boats = _dedupe([b for start in sorted(pages) for b in pages[start]])
+        added = [b for b in boats if b['BoatID'] not in streamed]
+        streamed.update(b['BoatID'] for b in added)
+        sync_state.set_boats(boats, delta={"added": added, "removed": []}, partial=True)
+        last_publish = time.monotonic()
+
+    if stream and pages[0]:
+        publish_partial()
+    
+    def on_page(start, page_results):
+        nonlocal fetched
+        fetched += len(page_results)
+        # Update Progress Live
+        sync_state.update_progress(fetched, total_results)
+        logger.info(f"Sync progress: {fetched}/{total_results}")
+        if stream:
+            pages[start] = page_results
+            if time.monotonic() - last_publish >= STREAM_PUBLISH_INTERVAL:
+                publish_partial()
     
+    failed, missing, recovered = [], [], {}
+    if total_results > PAGE_SIZE:
+        offsets = range(PAGE_SIZE, math.ceil(total_results / PAGE_SIZE) * PAGE_SIZE, PAGE_SIZE)
+        fetched_pages, failed = _fetch_offsets(client, offsets, on_page)
+        pages.update(fetched_pages)
+        recovered, missing = _recover(client, failed, on_page)
+        pages.update(recovered)
+    
+    # Merge pages in offset order so dedup keeps the upstream ordering
+    all_boats = [b for start in sorted(pages) for b in pages[start]]
+    unique = _dedupe(all_boats)
+    if all_boats:
+        SYNC_DEDUP_RATIO.set(round(len(unique) / len(all_boats), 4))
+    return unique, {
+        "total_results": total_results,
+        "pages_fetched": len(pages),
+        "total_pages": max(1, math.ceil(total_results / PAGE_SIZE)),
+        "recovered_pages": len(recovered),
+        "missing_pages": len(missing),
+    }
+
+def boat_fingerprint(boat):
+    # Derived fields are left out: Age moves at every new year without the listing changing
+    upstream = {key: value for key, value in boat.items() if key not in DERIVED_FIELDS}
+    return hashlib.blake2b(json.dumps(upstream, sort_keys=True, default=str).encode(), digest_size=8).digest()
+
+def _walk_is_complete(current, position, seen, changed):
+    """
+    Whether every known boat up to the deepest unchanged one the walk has
+    seen was seen too: a gap means a boat was removed from the walked part
+    of the list. Changed boats are left out, upstream may move them up.
+    """
+    deepest = max((position[bid] for bid in seen if bid in position and bid not in changed), default=-1)
+    return all(b.get('BoatID') in seen for b in current[:deepest + 1] if b.get('BoatID') not in changed)
+
+def _tail_matches(client, current, total_results):
+    """
+    Whether the catalogue's last page still lists the boats `current` (kept
+    in upstream order) ends with. A removal anywhere before it shifts the
+    tail, so this catches the removals that a count alone cannot see.
+    """
+    last = (math.ceil(total_results / PAGE_SIZE) - 1) * PAGE_SIZE
+    if len(current) < total_results - last:
+        return False
+    expected = [b.get('BoatID') for b in current[-(total_results - last):]]
     try:
-        headers = {'Authorization': API_TOKEN, 'Accept': 'application/json'}
-        params = {'start': 0, 'limit': PAGE_SIZE}
-        all_boats = []
+        page = _fetch_page(client, last).get('Results', [])
+    except UpstreamError as e:
+        logger.warning(f"Could not check the catalogue tail: {e}")
+        return False
+    return [b.get('BoatID') for b in page] == expected
+
+def delta_sync(client, current):
+    """
+    Walks the catalogue from the head, diffing every boat against a fingerprint
+    of the current dataset. Upstream lists the most recent listings first, so the
+    walk may stop once DELTA_STABLE_PAGES consecutive pages bring no new or
+    changed boats, but only when nothing can have been removed: the totals must
+    reconcile (known + added == TotalResults), no known boat may be missing
+    from the walked part of the list, and the last page must still end with
+    the boats the current list ends with, since equal counts alone also hold
+    when unseen additions offset removals. Otherwise the walk covers every
+    page and removals are found by elimination. Edits deep in the list, and an
+    addition and a removal both in the unwalked part before the last page, are
+    picked up by the next full sync.
+
+    Returns (boats, changeset, delta), or None when the walk could not complete
+    and a full sync is needed instead. `delta` lists the boat versions that
+    entered and left the dataset, for patching derived structures.
+    """
+    known = {b['BoatID']: boat_fingerprint(b) for b in current if 'BoatID' in b}
+    # Position in the current list, which keeps upstream order
+    position = {b['BoatID']: i for i, b in enumerate(current) if 'BoatID' in b}
+    added, changed, seen = {}, {}, set()
+    # BoatIDs in the order the walk met them, i.e. upstream order
+    walked = []
+    stable_pages = 0
+    
+    data = _fetch_page(client, 0)
+    total_results = data.get('TotalResults', 0)
+    total_pages = math.ceil(total_results / PAGE_SIZE)
+    batch = [data.get('Results', [])]
+    next_start = PAGE_SIZE
+    pages_fetched = 1
+    # Result of the tail check, made once the counts first reconcile
+    tail_confirmed = None
+    
+    while True:
+        for page_results in batch:
+            dirty = False
+            for boat in page_results:
+                bid = boat.get('BoatID')
+                if bid is None or bid in seen:
+                    continue
+                seen.add(bid)
+                walked.append(bid)
+                old = known.get(bid)
+                if old is None:
+                    added[bid] = boat
+                    dirty = True
+                elif old != boat_fingerprint(boat):
+                    changed[bid] = boat
+                    dirty = True
+            stable_pages = 0 if dirty else stable_pages + 1
         
-        # Initial Request
-        logger.info("Starting background sync...")
-        resp = requests.get(BASE_URL, headers=headers, params=params, timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
+        sync_state.update_progress(len(seen), total_results)
+        if next_start >= total_results:
+            break
+        reconciled = len(known) + len(added) == total_results
+        if stable_pages >= DELTA_STABLE_PAGES and reconciled and _walk_is_complete(current, position, seen, changed):
+            if tail_confirmed is None:
+                tail_confirmed = _tail_matches(client, current, total_results)
+                pages_fetched += 1
+            if tail_confirmed:
+                break
         
-        total_results = data.get('TotalResults', 0)
-        results = data.get('Results', [])
-        all_boats.extend(results)
+        # Next wave: one page per worker, merged back in offset order
+        offsets = list(range(next_start, min(total_results, next_start + SYNC_WORKERS * PAGE_SIZE), PAGE_SIZE))
+        pages, failed = _fetch_offsets(client, offsets)
+        # The walk needs every page of the wave before deciding whether to go on
+        recovered, missing = _recover(client, failed)
+        if missing:
+            return None
+        pages.update(recovered)
+        batch = [pages[start] for start in offsets]
+        next_start = offsets[-1] + PAGE_SIZE
+        pages_fetched += len(offsets)
+    
+    removed = set()
+    if next_start >= total_results:
+        # Walked the whole list, so anything unseen has been delisted
+        removed = set(known) - seen
+    
+    previous = {b['BoatID']: b for b in current if 'BoatID' in b}
+    # Upstream order (the walked head, then the rest as it was), which the next walk relies on
+    boats = [added.get(bid) or changed.get(bid) or previous[bid] for bid in walked] + [
+        b for b in current
+        if 'BoatID' in b and b['BoatID'] not in seen and b['BoatID'] not in removed
+    ]
+    changeset = {
+        "added": len(added),
+        "changed": len(changed),
+        "removed": len(removed),
+        "total_results": total_results,
+        "pages_fetched": pages_fetched,
+        "total_pages": total_pages,
+    }
+    delta = {
+        "added": list(added.values()) + list(changed.values()),
+        "removed": [previous[bid] for bid in removed] + [previous[bid] for bid in changed],
+    }
+    return _dedupe(boats), changeset, delta
+
+def fetch_worker(full=False):
+    """Runs one sync on the calling thread. Returns False if a sync is already running."""
+    if not sync_state.begin_sync():
+        return False
+    try:
+        _sync(full)
+    finally:
+        sync_state.end_sync()
+    return True
+
+def _sync(full):
+    """Body of a sync; the caller holds the single-flight guard."""
+    sync_state.update_progress(0, 0)
+    before = sync_state.dataset
+    current = before.boats
+    previous_synced_at = before.synced_at
+    mode = "full" if full or not current else "incremental"
+    
+    client = UpstreamClient(BASE_URL, API_TOKEN, rate=SYNC_RATE_LIMIT, pool_size=SYNC_WORKERS, breaker=upstream_breaker)
+    try:
+        started = time.time()
         
-        sync_state.update_progress(len(all_boats), total_results)
+        result = None
+        delta = None
+        if not full and current:
+            logger.info("Starting incremental sync...")
+            try:
+                with SYNC_SECONDS.time(mode="incremental"):
+                    result = delta_sync(client, current)
+            except Exception as e:
+                logger.error(f"Incremental sync failed: {e}")
+            if result is None:
+                logger.warning("Incremental sync incomplete, falling back to full sync")
         
-        if total_results > PAGE_SIZE:
-            num_pages = math.ceil(total_results / PAGE_SIZE) - 1
-            current_start = 0
-            
-            for i in range(num_pages):
-                current_start += PAGE_SIZE
-                params['start'] = current_start
-                
-                # Rate limit
-                time.sleep(0.1)
-                
-                try:
-                    resp = requests.get(BASE_URL, headers=headers, params=params, timeout=15)
-                    resp.raise_for_status()
-                    page_results = resp.json().get('Results', [])
-                    
-                    if not page_results:
-                        break
-                        
-                    all_boats.extend(page_results)
-                    # Update Progress Live
-                    sync_state.update_progress(len(all_boats), total_results)
-                    logger.info(f"Sync progress: {len(all_boats)}/{total_results}")
-                    
-                except Exception as e:
-                    logger.error(f"Error fetching page {i}: {e}")
-                    continue
-        
-        # Deduplicate
-        unique_boats = {b['BoatID']: b for b in all_boats if 'BoatID' in b}.values()
-        final_list = list(unique_boats)
+        if result is not None:
+            final_list, changeset, delta = result
+            changeset["mode"] = "incremental"
+        else:
+            mode = "full"
+            logger.info("Starting background sync...")
+            with SYNC_SECONDS.time(mode="full"):
+                final_list, report = full_sync(client, stream=not current)
+            old_ids = {b['BoatID'] for b in current if 'BoatID' in b}
+            new_ids = {b['BoatID'] for b in final_list}
+            changeset = {
+                "mode": "full",
+                "added": len(new_ids - old_ids),
+                "changed": None,
+                "removed": len(old_ids - new_ids),
+                **report,
+            }
+        changeset["duration"] = round(time.time() - started, 3)
+        changeset["finished_at"] = time.time()
+        # Carried across incremental syncs (and restarts, in the snapshot) for the full-sync schedule
+        changeset["full_at"] = (changeset["finished_at"] if changeset["mode"] == "full"
+                                else (sync_state.last_changeset or {}).get("full_at"))
+
+        # Failed pages or a short read must not replace good data
+        if len(final_list) < changeset["total_results"] * MIN_COMPLETENESS:
+            raise IncompleteSyncError(
+                f"got {len(final_list)} of {changeset['total_results']} boats "
+                f"({changeset.get('missing_pages', 0)} pages missing), keeping the current data"
+            )
         
-        sync_state.set_boats(final_list)
-        logger.info(f"Sync complete. Total boats: {len(final_list)}")
+        unchanged = (changeset["mode"] == "incremental"
+                     and not (changeset["added"] or changeset["changed"] or changeset["removed"])
+                     and [b['BoatID'] for b in final_list] == [b['BoatID'] for b in current])
+        if unchanged:
+            dataset = sync_state.confirm(changeset["finished_at"], changeset)
+        else:
+            dataset = sync_state.set_boats(final_list, delta=delta, changeset=changeset, synced_at=changeset["finished_at"])
+        sync_state.update_progress(len(final_list), len(final_list))
+        logger.info(f"Sync complete ({changeset['mode']}). Total boats: {len(final_list)}, "
+                    f"+{changeset['added']} ~{changeset['changed']} -{changeset['removed']}, "
+                    f"{changeset['pages_fetched']} pages ({changeset.get('recovered_pages', 0)} recovered)")
         
         # Save to cache file
+        if changeset["mode"] == "full" or changeset["added"] or changeset["changed"] or changeset["removed"]:
+            save_cache(final_list, columns=dataset.columns, stats=dataset.aggregates.total.stats(), changeset=changeset)
+        elif os.path.exists(CACHE_PATH):
+            # Nothing changed: bump the mtime so readers of the file know it is current
+            os.utime(CACHE_PATH)
+        SYNC_RUNS.inc(mode=mode, outcome="ok")
+
         try:
-            import json
-            import os
-            cache_path = os.path.join(os.path.dirname(__file__), "boats_cache.json")
-            with open(cache_path, "w") as f:
-                json.dump(final_list, f)
-            logger.info(f"Cached data saved to {cache_path}")
+            recorded = history.record(current, dataset, ts=changeset["finished_at"], previous_ts=previous_synced_at)
+            logger.info(f"History: +{recorded['listed']} listed, {recorded['relisted']} relisted, "
+                        f"{recorded['delisted']} delisted, {recorded['price_changes']} price changes")
         except Exception as e:
-            logger.error(f"Failed to save cache: {e}")
+            logger.error(f"Failed to record history: {e}")
 
+    except IncompleteSyncError as e:
+        SYNC_RUNS.inc(mode=mode, outcome="incomplete")
+        logger.error(f"Sync incomplete: {e}")
     except Exception as e:
+        SYNC_RUNS.inc(mode=mode, outcome="error")
         logger.error(f"Sync failed: {e}")
     finally:
-        sync_state.set_loading(False)
-
-def start_background_sync(initial=False):
-    # If initial, try loading from cache first
-    if initial:
-        try:
-            import json
-            import os
-            cache_path = os.path.join(os.path.dirname(__file__), "boats_cache.json")
-            if os.path.exists(cache_path):
-                logger.info(f"Loading from cache: {cache_path}")
-                with open(cache_path, "r") as f:
-                    cached_boats = json.load(f)
-                    sync_state.set_boats(cached_boats)
-                    sync_state.update_progress(len(cached_boats), len(cached_boats))
-                logger.info("Loaded initial data from cache.")
-        except Exception as e:
-            logger.error(f"Failed to load cache: {e}")
-
-    thread = threading.Thread(target=fetch_worker)
-    thread.daemon = True
-    thread.start()
+        client.close()
+        if sync_state.dataset.partial:
+            # A streaming sync that did not finish: never leave its partial catalogue live
+            logger.warning(f"Withdrawing the partial dataset, serving version {before.version}'s data again")
+            sync_state.restore(before)
 
-def get_cached_boats():
-    return sync_state.boats
-
-def get_boat_details(boat_id):
-    url = f"{BASE_URL}/{boat_id}"
-    headers = {'Authorization': API_TOKEN, 'Accept': 'application/json'}
+def save_cache(boats, columns=None, stats=None, changeset=None):
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+        write_snapshot(CACHE_PATH, boats, columns=columns, stats=stats, changeset=changeset)
+        logger.info(f"Cached data saved to {CACHE_PATH}")
     except Exception as e:
-        logger.error(f"Error fetching boat details for {boat_id}: {e}")
-        return None
+        logger.error(f"Failed to save cache: {e}")
+
+def _normalized(boats):
+    # Caches written before the normalisation stage lack the derived fields
+    if not is_normalized(boats):
+        logger.info("Cached boats predate the derived fields, normalising them")
+        normalize_boats(boats)
+    return boats
 
-def fetch_all_boats(filters=None):
-    # Compatibility wrapper for legacy calls if any, but properly we should use cached.
-    # If no cache, return empty or trigger sync.
-    if not sync_state.boats and not sync_state.is_loading:
-        start_background_sync()
-    return sync_state.boats
+def load_cache():
+    """
+    Loads the snapshot cache, falling back to the legacy boats_cache.json.
+    On an empty server the mapped snapshot is served straight away while its
+    records are decoded; a follower reloading the leader's snapshot keeps
+    serving its current version until the new one is decoded.
+    """
+    if os.path.exists(CACHE_PATH):
+        logger.info(f"Loading from cache: {CACHE_PATH}")
+        snapshot = read_snapshot(CACHE_PATH)
+        if not sync_state.dataset.boats:
+            sync_state.set_snapshot(snapshot)
+        boats = _normalized(snapshot.boats())
+        sync_state.set_boats(boats, synced_at=os.path.getmtime(CACHE_PATH))
+    elif os.path.exists(LEGACY_CACHE_PATH):
+        logger.info(f"Loading from legacy cache: {LEGACY_CACHE_PATH}")
+        with open(LEGACY_CACHE_PATH, "r") as f:
+            boats = _normalized(json.load(f))
+        sync_state.set_boats(boats, synced_at=os.path.getmtime(LEGACY_CACHE_PATH))
+        sync_state.update_progress(len(boats), len(boats))
+    else:
+        return
+    logger.info(f"Loaded initial data from cache ({len(boats)} boats).")
+
+def get_dataset():
+    """The live Dataset; hold on to it for a consistent view across several reads."""
+    return sync_state.dataset
 
 def calculate_stats(boats):
-    if not boats:
-        return {
-            "avg_price": 0,
-            "max_price": 0,
-            "min_price": 0,
-            "total_boats": 0,
-            "avg_year": 0,
-            "max_year": 0,
-            "min_year": 0,
-            "brands": {}
-        }
-        
-    prices = [b.get("SellPrice") for b in boats if b.get("SellPrice")]
-    avg_price = sum(prices) / len(prices) if prices else 0
-    max_price = max(prices) if prices else 0
-    min_price = min(prices) if prices else 0
-    
-    # Year Stats
-    years = [b.get("YearBuilt") for b in boats if b.get("YearBuilt")]
-    years = [y for y in years if isinstance(y, int) and y > 1900]
-    
-    avg_year = sum(years) / len(years) if years else 0
-    max_year = max(years) if years else 0
-    min_year = min(years) if years else 0
-    
-    return {
-        "avg_price": avg_price,
-        "max_price": max_price,
-        "min_price": min_price,
-        "avg_year": int(avg_year),
-        "max_year": max_year,
-        "min_year": min_year,
-        "total_boats": len(boats)
-        # brands removed for brevity if not used, or re-add if needed
-    }
+    return Summary.from_boats(boats).stats()
+
+def get_stats(filters=None, dataset=None):
+    """Precomputed stats for the cached dataset, optionally narrowed by query filters."""
+    dataset = dataset or sync_state.dataset
+    if dataset.raw_boats_json() is not None:
+        # Records still decoding: use the snapshot's stats and mapped columns (no text search yet)
+        if not filters and dataset.snapshot.stats:
+            return dataset.snapshot.stats
+        return dataset.columns.stats(dataset.columns.mask(filters or {}))
+    return dataset.aggregates.stats(filters, dataset.index, dataset.columns)
@@ -0,0 +1,268 @@
+"""
+Comparable listings: the boats nearest to a given one by length, year and
+price, preferring the same builder and model.
+
+Each boat with a usable length and year is a point
+
+    log(Length) / LENGTH_SCALE, YearBuilt / YEAR_SCALE, log(PriceEUR) / PRICE_SCALE
+
+so one unit along any axis is "about as different" (15% longer, 5 years
+newer, 25% dearer), and a different BuilderKey or ModelKey (normalize.py)
+adds a fixed penalty to the squared distance. Only boats with a price are
+returned as comparables. Queries are vectorised NumPy distance blocks over
+the whole inventory followed by a partial sort, a few milliseconds at 100k
+boats; a valuation leaves the price axis out, since that is what it asks for,
+and quotes the median price of the comparables.
+
+SimilarityIndex is built with each Dataset and, after an incremental sync,
+patched from the delta like the aggregates: removed boats are tombstoned,
+changed and new ones appended, and the arrays are compacted once the dead
+rows reach COMPACT_RATIO of the total.
+"""
+import math
+
+import numpy as np
+
+from normalize import model_key, name_key
+
+LENGTH_SCALE = math.log(1.15)
+YEAR_SCALE = 5.0
+PRICE_SCALE = math.log(1.25)
+# Added to the squared distance (1.0 = one unit along an axis)
+BUILDER_PENALTY = 1.0
+MODEL_PENALTY = 0.5
+
+DEFAULT_K = 10
+MAX_K = 100
+# Valuations computed per distance block (block x inventory float32 matrix)
+VALUATION_BLOCK = 32
+COMPACT_RATIO = 0.25
+
+# Code 0: no builder/model, which never counts as the same
+MISSING = 0
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _point(length, year, price):
+    """Scaled coordinates, None when the length or year is unusable."""
+    if not _number(length) or length <= 0 or not _number(year) or year <= 1900:
+        return None
+    price = math.log(price) / PRICE_SCALE if _number(price) and price > 0 else math.nan
+    return math.log(length) / LENGTH_SCALE, year / YEAR_SCALE, price
+
+
+class SimilarityIndex:
+    def __init__(self, boats=()):
+        self.rows = []
+        # str(BoatID) -> row of its live version
+        self.positions = {}
+        self.codes = {"BuilderKey": {}, "ModelKey": {}}
+        points, builders, models = [], [], []
+        for boat in boats:
+            row = self._row(boat)
+            if row is not None:
+                point, builder, model = row
+                self.positions[str(boat.get("BoatID"))] = len(self.rows)
+                self.rows.append(boat)
+                points.append(point)
+                builders.append(builder)
+                models.append(model)
+        self.points = np.array(points, dtype=np.float32).reshape(-1, 3)
+        self.builders = np.array(builders, dtype=np.int32)
+        self.models = np.array(models, dtype=np.int32)
+        self.alive = np.ones(len(self.rows), dtype=bool)
+        self.dead = 0
+
+    @property
+    def size(self):
+        return len(self.rows) - self.dead
+
+    def _code(self, field, value, add=True):
+        """Code of a row's value; for a query (add=False) -1, matching nothing, when unknown or missing."""
+        if not value:
+            return MISSING if add else -1
+        lookup = self.codes[field]
+        code = lookup.get(value)
+        if code is None:
+            if not add:
+                return -1
+            code = lookup[value] = len(lookup) + 1
+        return code
+
+    def _row(self, boat):
+        point = _point(boat.get("Length"), boat.get("YearBuilt"), boat.get("PriceEUR"))
+        if point is None:
+            return None
+        return point, self._code("BuilderKey", boat.get("BuilderKey")), self._code("ModelKey", boat.get("ModelKey"))
+
+    def apply(self, added=(), removed=()):
+        """
+        Returns a new index with the given boats added and removed (a changed
+        boat is its old version removed plus its new version added). This
+        index is left intact for readers still holding it.
+        """
+        index = SimilarityIndex.__new__(SimilarityIndex)
+        index.rows = list(self.rows)
+        index.positions = dict(self.positions)
+        index.codes = {field: dict(lookup) for field, lookup in self.codes.items()}
+        index.alive = self.alive.copy()
+        index.dead = self.dead
+
+        for boat in removed:
+            row = index.positions.pop(str(boat.get("BoatID")), None)
+            if row is not None and index.alive[row]:
+                index.alive[row] = False
+                index.dead += 1
+
+        points, builders, models = [], [], []
+        for boat in added:
+            bid = str(boat.get("BoatID"))
+            row = index.positions.pop(bid, None)
+            if row is not None and index.alive[row]:
+                # Added again without being removed first: the newer version wins
+                index.alive[row] = False
+                index.dead += 1
+            entry = index._row(boat)
+            if entry is None:
+                continue
+            point, builder, model = entry
+            index.positions[bid] = len(index.rows)
+            index.rows.append(boat)
+            points.append(point)
+            builders.append(builder)
+            models.append(model)
+
+        index.points = np.concatenate([self.points, np.array(points, dtype=np.float32).reshape(-1, 3)])
+        index.builders = np.concatenate([self.builders, np.array(builders, dtype=np.int32)])
+        index.models = np.concatenate([self.models, np.array(models, dtype=np.int32)])
+        index.alive = np.concatenate([index.alive, np.ones(len(points), dtype=bool)])
+        if index.dead > COMPACT_RATIO * len(index.rows):
+            index._compact()
+        return index
+
+    def _compact(self):
+        keep = np.flatnonzero(self.alive)
+        self.rows = [self.rows[row] for row in keep]
+        self.positions = {str(boat.get("BoatID")): row for row, boat in enumerate(self.rows)}
+        self.points = self.points[keep]
+        self.builders = self.builders[keep]
+        self.models = self.models[keep]
+        self.alive = np.ones(len(self.rows), dtype=bool)
+        self.dead = 0
+
+    def get(self, boat_id):
+        row = self.positions.get(str(boat_id))
+        return self.rows[row] if row is not None else None
+
+    def _distances(self, queries, builders, models, use_price):
+        """(queries x rows) squared distances; inf where a row cannot be a comparable."""
+        distances = np.zeros((len(queries), len(self.rows)), dtype=np.float32)
+        for axis in range(3 if use_price else 2):
+            distances += np.square(self.points[None, :, axis] - queries[:, axis, None])
+        distances += BUILDER_PENALTY * (self.builders[None, :] != builders[:, None])
+        distances += MODEL_PENALTY * (self.models[None, :] != models[:, None])
+        # No price (NaN along the price axis) or no longer in the inventory
+        unpriced = np.isnan(self.points[:, 2]) | ~self.alive
+        distances[:, unpriced] = np.inf
+        return distances
+
+    def _nearest(self, distances, k):
+        """Rows and distances of the k nearest finite entries of one distance row."""
+        k = min(k, distances.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.argpartition(distances, k - 1)[:k]
+        rows = rows[np.argsort(distances[rows], kind="stable")]
+        rows = rows[np.isfinite(distances[rows])]
+        return rows, distances[rows]
+
+    def _own_row(self, boat):
+        # A listed boat is not its own comparable
+        if boat.get("BoatID") is None:
+            return None
+        return self.positions.get(str(boat["BoatID"]))
+
+    def _query(self, boat):
+        point = _point(boat.get("Length"), boat.get("YearBuilt"), boat.get("PriceEUR"))
+        if point is None:
+            return None
+        return (point, self._code("BuilderKey", boat.get("BuilderKey"), add=False),
+                self._code("ModelKey", boat.get("ModelKey"), add=False))
+
+    def _result(self, rows, distances):
+        prices = [self.rows[row]["PriceEUR"] for row in rows]
+        return {
+            "results": [self.rows[row] for row in rows],
+            "distances": [round(math.sqrt(d), 3) for d in distances.tolist()],
+            "median_price": float(np.median(prices)) if prices else None,
+        }
+
+    def similar(self, boat, k=DEFAULT_K):
+        """
+        The `k` listings most like `boat` (itself excluded), nearest first,
+        with their distances and median price. None if the boat has no usable
+        length or year.
+        """
+        query = self._query(boat)
+        if query is None or not len(self.rows):
+            return None
+        point, builder, model = query
+        use_price = not math.isnan(point[2])
+        distances = self._distances(np.array([point], dtype=np.float32), np.array([builder]),
+                                    np.array([model]), use_price)[0]
+        row = self._own_row(boat)
+        if row is not None:
+            distances[row] = np.inf
+        return self._result(*self._nearest(distances, min(k, MAX_K)))
+
+    def value(self, boats, k=DEFAULT_K):
+        """
+        Valuation of each of `boats` (listed or hypothetical) from the median
+        price of its `k` nearest comparables by length, year, builder and
+        model; price is not a coordinate. Comparables are listed by BoatID.
+        None for a boat with no usable length or year.
+        """
+        k = min(k, MAX_K)
+        queries = [self._query(boat) for boat in boats]
+        valid = [i for i, query in enumerate(queries) if query is not None]
+        results = [None] * len(boats)
+        if not len(self.rows):
+            return results
+        for start in range(0, len(valid), VALUATION_BLOCK):
+            block = valid[start:start + VALUATION_BLOCK]
+            distances = self._distances(
+                np.array([queries[i][0] for i in block], dtype=np.float32),
+                np.array([queries[i][1] for i in block]),
+                np.array([queries[i][2] for i in block]),
+                use_price=False,
+            )
+            for j, i in enumerate(block):
+                row = self._own_row(boats[i])
+                if row is not None:
+                    distances[j, row] = np.inf
+                rows, _ = self._nearest(distances[j], k)
+                prices = [self.rows[row]["PriceEUR"] for row in rows]
+                results[i] = {
+                    "median_price": float(np.median(prices)) if prices else None,
+                    # Interquartile range of the comparables' prices
+                    "price_range": [float(np.percentile(prices, 25)), float(np.percentile(prices, 75))] if prices else None,
+                    "comparables": len(prices),
+                    "ids": [self.rows[row].get("BoatID") for row in rows],
+                }
+        return results
+
+
+def spec_boat(builder=None, model=None, length=None, year=None):
+    """A hypothetical listing with the fields valuation reads, for valuing a boat that is not listed."""
+    builder, model = builder or "", model or ""
+    return {
+        "BoatID": None,
+        "Length": length,
+        "YearBuilt": year,
+        "PriceEUR": None,
+        "BuilderKey": name_key(builder) or None,
+        "ModelKey": model_key(builder, model) or None,
+    }
@@ -0,0 +1,217 @@
+"""
+Versioned binary snapshot of the boat dataset, replacing boats_cache.json.
+
+Layout (little-endian):
+
+    prefix   magic "BOATSNAP", format version (u32), header offset (u64), header length (u64)
+    records  the boats as one JSON array, one compact record per element
+    arrays   record start offsets (u64, n + 1, each record ends one byte before
+             the next offset) and the columnar sections, 8-byte aligned
+    header   JSON: count, creation time, section table, categories, precomputed
+             stats, changeset of the sync that wrote it
+
+The records section is itself a valid JSON array, so /api/boats can be served
+straight from the memory map, and the precomputed stats answer /api/stats
+before a single record is decoded. Snapshots are written to a temp file,
+fsynced and renamed into place, so a crash mid-write never leaves a torn cache.
+
+    python snapshot.py import boats_cache.json boats_cache.snap
+    python snapshot.py export boats_cache.snap boats_cache.json
+"""
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"BOATSNAP"
+VERSION = 1
+PREFIX = struct.Struct("<8sIQQ")
+ALIGNMENT = 8
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _pad(f):
+    remainder = f.tell() % ALIGNMENT
+    if remainder:
+        f.write(b"\0" * (ALIGNMENT - remainder))
+
+
+def _write_array(f, sections, name, array):
+    _pad(f)
+    array = np.ascontiguousarray(array)
+    sections[name] = {
+        "offset": f.tell(),
+        "length": array.nbytes,
+        "dtype": array.dtype.str,
+        "count": int(array.size),
+    }
+    f.write(array.tobytes())
+
+
+def write_snapshot(path, boats, columns=None, stats=None, changeset=None):
+    """Atomically writes `boats` (plus optional ColumnarStore sections, stats and changeset) to `path`."""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    sections = {}
+    categories = {}
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(PREFIX.pack(MAGIC, VERSION, 0, 0))
+
+            start = f.tell()
+            offsets = np.empty(len(boats) + 1, dtype="<u8")
+            f.write(b"[")
+            for i, boat in enumerate(boats):
+                if i:
+                    f.write(b",")
+                offsets[i] = f.tell() - start
+                f.write(json.dumps(boat, separators=(",", ":")).encode())
+            # Every record is followed by one separator byte ("," or the closing "]")
+            offsets[len(boats)] = f.tell() - start + 1
+            f.write(b"]")
+            sections["records"] = {"offset": start, "length": f.tell() - start}
+            _write_array(f, sections, "record_offsets", offsets)
+
+            if columns is not None:
+                arrays, categories = columns.to_sections()
+                for name, array in arrays.items():
+                    _write_array(f, sections, name, array)
+
+            header = json.dumps({
+                "version": VERSION,
+                "created": time.time(),
+                "count": len(boats),
+                "sections": sections,
+                "categories": categories,
+                "stats": stats,
+                "changeset": changeset,
+            }).encode()
+            header_offset = f.tell()
+            f.write(header)
+            f.seek(0)
+            f.write(PREFIX.pack(MAGIC, VERSION, header_offset, len(header)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < PREFIX.size:
+            raise SnapshotError(f"{path} is too short to be a snapshot")
+        magic, version, header_offset, header_length = PREFIX.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not a boat snapshot")
+        if version != VERSION:
+            raise SnapshotError(f"{path} has unsupported snapshot version {version}")
+        self.header = json.loads(self._mm[header_offset:header_offset + header_length])
+
+    @property
+    def count(self):
+        return self.header["count"]
+
+    @property
+    def created(self):
+        return self.header["created"]
+
+    @property
+    def stats(self):
+        return self.header.get("stats")
+
+    @property
+    def changeset(self):
+        return self.header.get("changeset")
+
+    def has_section(self, name):
+        return name in self.header["sections"]
+
+    def section(self, name):
+        info = self.header["sections"][name]
+        return memoryview(self._mm)[info["offset"]:info["offset"] + info["length"]]
+
+    def array(self, name):
+        """Zero-copy NumPy view over an array section."""
+        info = self.header["sections"][name]
+        return np.frombuffer(self._mm, dtype=np.dtype(info["dtype"]), count=info["count"], offset=info["offset"])
+
+    def boats_json(self):
+        """The whole dataset as JSON array bytes, straight from the map."""
+        return self.section("records")
+
+    def boat(self, i):
+        offsets = self.array("record_offsets")
+        start = self.header["sections"]["records"]["offset"]
+        return json.loads(self._mm[start + int(offsets[i]):start + int(offsets[i + 1]) - 1])
+
+    def boats(self):
+        info = self.header["sections"]["records"]
+        return json.loads(self._mm[info["offset"]:info["offset"] + info["length"]])
+
+    def columns(self, boats=None):
+        """ColumnarStore over the mapped arrays, or None if the snapshot has none."""
+        from columnar import ColumnarStore
+
+        if not self.header["categories"]:
+            return None
+        arrays = {name: self.array(name) for name in self.header["sections"]
+                  if name not in ("records", "record_offsets")}
+        try:
+            return ColumnarStore.from_sections(boats, self.count, arrays, self.header["categories"])
+        except KeyError:
+            # Written before a column was added: rebuilt from the records once decoded
+            return None
+
+
+def read_snapshot(path):
+    return Snapshot(path)
+
+
+def import_json(json_path, snapshot_path):
+    """Converts a legacy boats_cache.json into a snapshot."""
+    from aggregates import Summary
+    from columnar import ColumnarStore
+
+    with open(json_path, "r") as f:
+        boats = json.load(f)
+    write_snapshot(snapshot_path, boats, columns=ColumnarStore(boats), stats=Summary.from_boats(boats).stats())
+    return len(boats)
+
+
+def export_json(snapshot_path, json_path):
+    """Writes a snapshot's records back out as a plain JSON list."""
+    snapshot = read_snapshot(snapshot_path)
+    tmp_path = f"{json_path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(snapshot.boats_json())
+    os.replace(tmp_path, json_path)
+    return snapshot.count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert between boats_cache.json and snapshot files")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("source")
+    parser.add_argument("destination")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        count = import_json(args.source, args.destination)
+    else:
+        count = export_json(args.source, args.destination)
+    print(f"{args.command}ed {count} boats: {args.source} -> {args.destination}")
@@ -0,0 +1,244 @@
+"""
+Client for the Navis2WS boats API, shared by the sync (service.py) and the
+carousel generator (ig.py).
+
+Every request goes through the same protections:
+
+  - a TokenBucket rate limit (optional), slowed down on 429/5xx and sped
+    back up on success;
+  - up to MAX_ATTEMPTS tries on connection errors, timeouts, unreadable
+    bodies and 429/5xx, sleeping a random time up to BACKOFF_BASE * 2^n
+    (capped at BACKOFF_CAP, "full jitter") or Retry-After between tries;
+  - a CircuitBreaker: after FAILURE_THRESHOLD consecutive failed tries it
+    opens and every call fails fast with CircuitOpenError for
+    RESET_TIMEOUT seconds, then a single probe decides whether it closes.
+
+Errors surface as UpstreamError, so callers decide what a failed page means
+instead of getting an incomplete answer.
+"""
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import Gauge, UPSTREAM_ERRORS, UPSTREAM_PAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+API_TOKEN = os.environ.get("API_TOKEN", "Bearer 4b84405e-5034-42d2-aac3-6a6275c826d1")
+BASE_URL = os.environ.get("UPSTREAM_URL", "https://batoo.api.digibusiness.it/Navis2WS/v2/boats")
+
+PAGE_SIZE = 50
+REQUEST_TIMEOUT = 15  # seconds
+MAX_ATTEMPTS = int(os.environ.get("UPSTREAM_MAX_ATTEMPTS", 5))
+BACKOFF_BASE = 0.25  # seconds
+BACKOFF_CAP = 8.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+FAILURE_THRESHOLD = int(os.environ.get("UPSTREAM_FAILURE_THRESHOLD", 10))
+RESET_TIMEOUT = float(os.environ.get("UPSTREAM_RESET_TIMEOUT", 30))  # seconds
+
+CIRCUIT_STATE = Gauge("upstream_circuit_state", "Upstream circuit breaker: 0 closed, 1 half-open, 2 open")
+
+
+class UpstreamError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all sync workers.
+    The refill rate is halved whenever upstream answers 429/5xx and
+    creeps back towards the configured rate on every successful page.
+    """
+    def __init__(self, rate, capacity=None, min_rate=1.0):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.blocked_until = 0
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.last_refill
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def penalize(self, retry_after=None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def reward(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate * 1.1)
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. Open (after `failure_threshold` consecutive
+    failures): calls fail fast until `reset_timeout` has passed. Half-open:
+    one probe call goes through; its success closes the circuit, its
+    failure opens it again.
+    """
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.retry_in() == 0 else "open"
+
+    def retry_in(self):
+        """Seconds until calls are let through again (0 when closed or probing)."""
+        if self.opened_at is None:
+            return 0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self.retry_in() > 0 or self._probing:
+                raise CircuitOpenError(f"Upstream circuit open, retry in {self.retry_in():.1f}s")
+            self._probing = True
+            CIRCUIT_STATE.set(1)
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Upstream recovered, closing the circuit")
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+            CIRCUIT_STATE.set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                logger.warning(f"Upstream failing ({self.failures} in a row), opening the circuit "
+                               f"for {self.reset_timeout:.0f}s")
+                self.opened_at = time.monotonic()
+                self._probing = False
+                CIRCUIT_STATE.set(2)
+
+
+def create_session(token=API_TOKEN, pool_size=8):
+    """Keep-alive session sized for the worker pool."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({'Authorization': token, 'Accept': 'application/json'})
+    return session
+
+
+def _retry_after(resp):
+    try:
+        return float(resp.headers.get("Retry-After", 0))
+    except ValueError:
+        return 0
+
+
+class UpstreamClient:
+    def __init__(self, base_url=BASE_URL, token=API_TOKEN, rate=None, pool_size=8, breaker=None,
+                 max_attempts=MAX_ATTEMPTS, timeout=REQUEST_TIMEOUT):
+        self.base_url = base_url
+        self.session = create_session(token, pool_size)
+        self.limiter = TokenBucket(rate) if rate else None
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    def close(self):
+        self.session.close()
+
+    def _get(self, url, params=None, page=False):
+        """GET returning the decoded JSON body, retried and guarded as described above."""
+        error = None
+        for attempt in range(self.max_attempts):
+            self.breaker.before_call()
+            if self.limiter:
+                self.limiter.acquire()
+            retry_after = 0
+            requested = time.perf_counter()
+            try:
+                resp = self.session.get(url, params=params, timeout=self.timeout)
+                if resp.status_code < 400:
+                    data = resp.json()
+                    if page:
+                        UPSTREAM_PAGE_SECONDS.observe(time.perf_counter() - requested, outcome="ok")
+                    self.breaker.record_success()
+                    if self.limiter:
+                        self.limiter.reward()
+                    return data
+                UPSTREAM_ERRORS.inc(reason=str(resp.status_code))
+                if resp.status_code not in RETRY_STATUSES:
+                    if page:
+                        UPSTREAM_PAGE_SECONDS.observe(time.perf_counter() - requested, outcome="error")
+                    # A definite answer (e.g. 404): upstream itself is healthy
+                    self.breaker.record_success()
+                    raise UpstreamError(f"Upstream returned {resp.status_code} for {url}", resp.status_code)
+                retry_after = _retry_after(resp)
+                error = UpstreamError(f"Upstream returned {resp.status_code}", resp.status_code)
+                if self.limiter:
+                    self.limiter.penalize(retry_after)
+            except (requests.RequestException, ValueError) as e:
+                # Connection errors, timeouts and truncated or non-JSON bodies
+                UPSTREAM_ERRORS.inc(reason=type(e).__name__)
+                error = e
+            self.breaker.record_failure()
+
+            last = attempt == self.max_attempts - 1
+            if page:
+                UPSTREAM_PAGE_SECONDS.observe(time.perf_counter() - requested, outcome="error" if last else "retry")
+            if last:
+                break
+            delay = max(retry_after, random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+            logger.warning(f"Upstream request failed ({error}), retry {attempt + 1} in {delay:.2f}s")
+            time.sleep(delay)
+        raise UpstreamError(f"Upstream request failed after {self.max_attempts} attempts: {error}",
+                            getattr(error, "status", None)) from error
+
+    def fetch_page(self, start, limit=PAGE_SIZE, params=None):
+        """One page of the boats list: {"TotalResults": n, "Results": [...]}."""
+        data = self._get(self.base_url, {**(params or {}), 'start': start, 'limit': limit}, page=True)
+        if not isinstance(data, dict) or not isinstance(data.get('Results'), list):
+            raise UpstreamError(f"Unexpected page payload at offset {start}")
+        return data
+
+    def get_details(self, boat_id):
+        """Detail payload of one boat."""
+        return self._get(f"{self.base_url}/{boat_id}")
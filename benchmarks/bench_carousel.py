@@ -0,0 +1,104 @@
+"""
+Carousel generation timing: the serial ig.py flow versus the pipelined one.
+
+Fixture 2048px JPEGs are served by the local stub (with its per-request
+latency), so the run exercises detail fetches, image downloads, decoding,
+fitting, drawing and saving without touching the live API or CDN. The
+"re-render" column repeats the pipelined run against its now warm image
+cache, as after a text tweak.
+
+    python benchmarks/bench_carousel.py --selections 3 --latency 0.05 --json results/carousel.json
+"""
+import argparse
+import os
+import random
+import tempfile
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+import common
+import ig  # noqa: E402
+from image_cache import ImageCache  # noqa: E402
+from stub_server import StubServer, make_boats  # noqa: E402
+
+STAGES = ["fetch_details", "fetch_images", "decode", "fit", "draw", "save"]
+
+
+def make_fixtures(count=4, size=(2048, 1365), seed=7):
+    """Noisy gradient JPEGs at the CDN's 2048px size (noise keeps the file size realistic)."""
+    rng = random.Random(seed)
+    fixtures = []
+    for _ in range(count):
+        img = Image.new("RGB", size)
+        draw = ImageDraw.Draw(img)
+        top, bottom = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(2)]
+        for y in range(size[1]):
+            t = y / size[1]
+            draw.line([(0, y), (size[0], y)], fill=tuple(int(a + (b - a) * t) for a, b in zip(top, bottom)))
+        noise = Image.effect_noise(size, 40).convert("RGB")
+        img = Image.blend(img, noise, 0.15)
+        buffer = BytesIO()
+        img.save(buffer, "JPEG", quality=90)
+        fixtures.append(buffer.getvalue())
+    return fixtures
+
+
+def render(selections, output_root, cache_root, workers, processes, draft, rerender=False):
+    ig.DOWNLOAD_WORKERS = workers
+    ig.RENDER_PROCESSES = processes
+    ig.USE_DRAFT = draft
+    ig.IMAGE_CACHE = ImageCache(cache_root)
+    return ig.crea_caroselli(selections, output_root=output_root, rigenera=rerender)
+
+
+def run(selections=3, boats=6, latency=0.05, processes=ig.RENDER_PROCESSES):
+    """Per-configuration stage and wall times in seconds, as {config: {...}}."""
+    with StubServer([], latency=latency, images=make_fixtures()) as server:
+        inventory = make_boats(selections * boats, image_base=server.image_base)
+        server.api.boats = inventory
+        ig.UPSTREAM.base_url = server.base_url
+        batches = [(n + 1, inventory[n * boats:(n + 1) * boats]) for n in range(selections)]
+
+        pipelined = dict(workers=ig.DOWNLOAD_WORKERS, processes=processes, draft=True)
+        configs = [
+            ("serial", "serial", dict(workers=1, processes=0, draft=False)),
+            ("pipelined", "pipelined", pipelined),
+            ("re-render", "pipelined", dict(pipelined, rerender=True)),
+        ]
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, workspace, config in configs:
+                output_root = os.path.join(tmp, workspace)
+                server.api.requests = 0
+                timings = render(batches, output_root, os.path.join(output_root, "cache"), **config)
+                results[name] = {f"{stage}_s": timings.get(stage, 0) for stage in STAGES + ["wall"]}
+                results[name]["requests"] = server.api.requests
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--selections", type=int, default=3)
+    parser.add_argument("--boats", type=int, default=6, help="boats per selection")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--processes", type=int, default=ig.RENDER_PROCESSES)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON (- for stdout)")
+    args = parser.parse_args()
+
+    params = dict(selections=args.selections, boats=args.boats, latency=args.latency, processes=args.processes)
+    results = run(**params)
+
+    slides = args.selections * (args.boats + 1)
+    print(f"\n{args.selections} selections, {slides} slides, {args.latency * 1000:.0f} ms upstream latency")
+    print(f"{'stage':<14}" + "".join(f"{name:>12}" for name in results))
+    for stage in STAGES + ["wall"]:
+        print(f"{stage:<14}" + "".join(f"{r[stage + '_s']:>11.2f}s" for r in results.values()))
+    print(f"{'requests':<14}" + "".join(f"{r['requests']:>12}" for r in results.values()))
+    print("(stage times are summed across workers; wall is end to end)")
+    if args.json:
+        common.write_json(args.json, common.report("carousel", params, results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Cold-start timing: legacy boats_cache.json versus the memory-mapped snapshot.
+
+Measures how long after "boot" the server can answer /api/boats and
+/api/stats, and how long until the full dataset (index, aggregates) is warm.
+
+    python benchmarks/bench_coldstart.py --boats 100000 --json results/coldstart.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import common
+import service  # noqa: E402
+from aggregates import Summary  # noqa: E402
+from columnar import ColumnarStore  # noqa: E402
+from snapshot import read_snapshot, write_snapshot  # noqa: E402
+from stub_server import make_boats  # noqa: E402
+
+
+def run(boats=100_000):
+    """Cold-start timings in ms and file sizes in MB, as a flat dict."""
+    service.logger.setLevel("WARNING")
+    count = boats
+    boats = make_boats(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "boats_cache.json")
+        snap_path = os.path.join(tmp, "boats_cache.snap")
+
+        t0 = time.perf_counter()
+        with open(json_path, "w") as f:
+            json.dump(boats, f)
+        json_write = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        write_snapshot(snap_path, boats, columns=ColumnarStore(boats), stats=Summary.from_boats(boats).stats())
+        snap_write = time.perf_counter() - t0
+        del boats
+
+        # Legacy: nothing can be served until the whole file is parsed and indexed
+        t0 = time.perf_counter()
+        with open(json_path) as f:
+            loaded = json.load(f)
+        json_parsed = time.perf_counter() - t0
+        service.sync_state.set_boats(loaded)
+        json_warm = time.perf_counter() - t0
+
+        # Snapshot: map, serve raw records + header stats, decode in the background
+        service.sync_state = service.SyncState()
+        t0 = time.perf_counter()
+        snapshot = read_snapshot(snap_path)
+        service.sync_state.set_snapshot(snapshot)
+        body = service.get_dataset().raw_boats_json()
+        stats = service.get_stats()
+        snap_ready = time.perf_counter() - t0
+        service.sync_state.set_boats(snapshot.boats())
+        snap_warm = time.perf_counter() - t0
+        assert len(body) and stats["total_boats"] == count
+
+        return {
+            "json_size_mb": os.path.getsize(json_path) / 1e6,
+            "snapshot_size_mb": os.path.getsize(snap_path) / 1e6,
+            "json_write_ms": json_write * 1000,
+            "snapshot_write_ms": snap_write * 1000,
+            "json_first_response_ms": json_parsed * 1000,
+            "snapshot_first_response_ms": snap_ready * 1000,
+            "json_warm_ms": json_warm * 1000,
+            "snapshot_warm_ms": snap_warm * 1000,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--boats", type=int, default=100_000)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON (- for stdout)")
+    args = parser.parse_args()
+
+    r = run(args.boats)
+    print(f"{args.boats} boats, json {r['json_size_mb']:.1f} MB, snapshot {r['snapshot_size_mb']:.1f} MB")
+    print(f"  write:          json {r['json_write_ms']:8.1f} ms   snapshot {r['snapshot_write_ms']:8.1f} ms")
+    print(f"  first response: json {r['json_first_response_ms']:8.1f} ms   snapshot {r['snapshot_first_response_ms']:8.1f} ms")
+    print(f"  fully warm:     json {r['json_warm_ms']:8.1f} ms   snapshot {r['snapshot_warm_ms']:8.1f} ms")
+    if args.json:
+        common.write_json(args.json, common.report("coldstart", {"boats": args.boats}, r))
+
+
+if __name__ == "__main__":
+    main()
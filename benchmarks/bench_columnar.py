@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: stats over list-of-dicts versus the NumPy columnar store.
+
+    python benchmarks/bench_columnar.py --sizes 10000 100000 1000000
+"""
+import argparse
+import time
+
+import common  # noqa: F401  (sys.path and scratch cache/history paths)
+from columnar import ColumnarStore  # noqa: E402
+from service import calculate_stats  # noqa: E402
+from stub_server import make_boats  # noqa: E402
+
+FILTERS = {"builders": ["Azimut", "Riva"], "yearFrom": 2005, "priceFrom": 200_000, "priceTo": 2_000_000}
+
+
+def legacy_stats(boats):
+    """The original calculate_stats body (price/year only, no histograms)."""
+    prices = [b.get("SellPrice") for b in boats if b.get("SellPrice")]
+    years = [b.get("YearBuilt") for b in boats if b.get("YearBuilt")]
+    years = [y for y in years if isinstance(y, int) and y > 1900]
+    return {
+        "avg_price": sum(prices) / len(prices) if prices else 0,
+        "max_price": max(prices) if prices else 0,
+        "min_price": min(prices) if prices else 0,
+        "avg_year": int(sum(years) / len(years)) if years else 0,
+        "max_year": max(years) if years else 0,
+        "min_year": min(years) if years else 0,
+        "total_boats": len(boats),
+    }
+
+
+def dict_filter(boats):
+    return [
+        b for b in boats
+        if b["Builder"] in FILTERS["builders"]
+        and (b.get("YearBuilt") or 0) >= FILTERS["yearFrom"]
+        and FILTERS["priceFrom"] <= (b.get("SellPrice") or 0) <= FILTERS["priceTo"]
+    ]
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    columns_header = ("legacy", "summary", "col build", "col stats", "dict filt", "col filt")
+    print(f"{'boats':>9} " + " ".join(f"{name:>10}" for name in columns_header) + "  (ms)")
+    for size in args.sizes:
+        boats = make_boats(size)
+        columns = ColumnarStore(boats)
+        row = [
+            timed(lambda: legacy_stats(boats)),
+            timed(lambda: calculate_stats(boats)),
+            timed(lambda: ColumnarStore(boats), repeat=1),
+            timed(lambda: columns.stats()),
+            timed(lambda: calculate_stats(dict_filter(boats))),
+            timed(lambda: columns.stats(columns.mask(FILTERS))),
+        ]
+        print(f"{size:>9} " + " ".join(f"{v:>10.1f}" for v in row))
+
+
+if __name__ == "__main__":
+    main()
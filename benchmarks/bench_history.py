@@ -0,0 +1,98 @@
+"""
+Benchmark: the SQLite history store after a simulated run of daily syncs.
+
+Each simulated day delists and lists a share of the inventory and re-prices
+another share, then the history endpoints' queries are timed.
+
+    python benchmarks/bench_history.py --boats 100000 --days 365
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+import common  # noqa: F401  (sys.path and scratch cache/history paths)
+from aggregates import AggregateStore  # noqa: E402
+from history import DAY, HistoryStore  # noqa: E402
+from stub_server import make_boats  # noqa: E402
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--boats", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--churn", type=float, default=0.003, help="share of boats delisted (and listed) per day")
+    parser.add_argument("--reprice", type=float, default=0.01, help="share of boats re-priced per day")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    pool = make_boats(args.boats * 3, seed=7)
+    boats = pool[:args.boats]
+    spare = pool[args.boats:]
+    start = time.time() - args.days * DAY
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.sqlite")
+        store = HistoryStore(path)
+        aggregates = AggregateStore(boats)
+        previous = []
+        record_seconds = 0.0
+        for day in range(args.days):
+            dataset = SimpleNamespace(boats=boats, aggregates=aggregates)
+            t0 = time.perf_counter()
+            store.record(previous, dataset, ts=start + day * DAY)
+            record_seconds += time.perf_counter() - t0
+
+            # Tomorrow's inventory
+            previous = boats
+            boats = list(boats)
+            removed, added = [], []
+            for _ in range(int(args.boats * args.churn)):
+                removed.append(boats.pop(rng.randrange(len(boats))))
+                if spare:
+                    added.append(spare.pop())
+            boats.extend(added)
+            for _ in range(int(args.boats * args.reprice)):
+                i = rng.randrange(len(boats))
+                old = boats[i]
+                new = {**old, "SellPrice": round((old.get("SellPrice") or 100_000) * rng.uniform(0.85, 1.05))}
+                boats[i] = new
+                removed.append(old)
+                added.append(new)
+            aggregates = aggregates.apply(added, removed)
+            if day % 50 == 0:
+                print(f"  day {day}: {record_seconds:.1f}s recording so far")
+
+        size = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+        print(f"{args.days} syncs of {args.boats} boats: {record_seconds / args.days * 1000:.0f} ms per sync, "
+              f"{size / 1e6:.1f} MB on disk")
+
+        builders = [boats[0]["Builder"], boats[1]["Builder"]]
+        now = start + args.days * DAY
+        queries = {
+            "trend (market, daily)": lambda: store.price_trend(interval="day"),
+            "trend (2 builders, weekly)": lambda: store.price_trend(builders, interval="week"),
+            "price drops (last 30d)": lambda: store.price_drops(since=now - 30 * DAY, limit=100),
+            "price drops (builders, >10%)": lambda: store.price_drops(builders=builders, min_drop=0.1),
+            "time on market (sold)": lambda: store.time_on_market(now=now),
+            "time on market (active)": lambda: store.time_on_market(status="active", now=now),
+            "time on market (builders)": lambda: store.time_on_market(builders, now=now),
+            "boat history": lambda: store.boat_history(boats[0]["BoatID"]),
+        }
+        for name, query in queries.items():
+            print(f"{name:>30}: {timed(query):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
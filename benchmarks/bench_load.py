@@ -0,0 +1,228 @@
+"""
+Load test: the real backend (uvicorn, main:app) serving a synthetic inventory
+synced from the local stub API, hit by concurrent clients.
+
+The stub and the server run as separate processes, so the client, the API
+and "upstream" do not share a GIL. For each scenario and concurrency level
+the clients send requests back to back for --duration seconds:
+
+    boats        GET /api/boats, the full list (gzip, body read but not decoded)
+    boats_304    GET /api/boats revalidated with its ETag
+    stats        GET /api/stats with random dashboard filters
+    query        GET /api/boats/query with random filters, sort and page
+    similar      GET /api/boats/{id}/similar over --detail-ids random boats
+    details      GET /api/boats/{id} over --detail-ids random boats (misses
+                 go to the stub, with its latency; repeats hit the cache)
+
+    python benchmarks/bench_load.py --boats 20000 --concurrency 1 8 32 --json results/load.json
+
+Client-side numbers: with high concurrency on a small machine the Python
+client itself can become the bottleneck, so compare runs on the same host.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+import common
+from stub_server import BUILDERS, COUNTRIES
+
+SCENARIOS = ["boats", "boats_304", "stats", "query", "similar", "details"]
+SORTS = ["price", "-price", "year", "-year", "length"]
+READY_TIMEOUT = 300  # seconds
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def random_filters(rng):
+    params = {}
+    if rng.random() < 0.6:
+        params["builders"] = rng.sample(BUILDERS, rng.randint(1, 3))
+    if rng.random() < 0.4:
+        params["countries"] = rng.sample(COUNTRIES, rng.randint(1, 2))
+    if rng.random() < 0.5:
+        low = rng.randrange(20_000, 2_000_000, 10_000)
+        params["priceFrom"] = low
+        params["priceTo"] = low + rng.randrange(100_000, 3_000_000, 10_000)
+    if rng.random() < 0.3:
+        params["yearFrom"] = rng.randrange(1980, 2020)
+    return params
+
+
+class Services:
+    """Stub API and backend subprocesses; use as a context manager."""
+    def __init__(self, boats, latency, page_size, workers):
+        self.tmp = tempfile.TemporaryDirectory()
+        stub_port, api_port = free_port(), free_port()
+        self.stub_url = f"http://127.0.0.1:{stub_port}/Navis2WS/v2/boats"
+        self.api_url = f"http://127.0.0.1:{api_port}"
+        self.boats = boats
+        self.commands = [
+            ([sys.executable, os.path.join(common.ROOT, "benchmarks", "stub_server.py"), "--boats", str(boats),
+              "--latency", str(latency), "--page-size", str(page_size), "--port", str(stub_port)], None),
+            ([sys.executable, "-m", "uvicorn", "main:app", "--port", str(api_port), "--workers", str(workers),
+              "--log-level", "warning"], common.BACKEND_DIR),
+        ]
+        self.env = {
+            **os.environ,
+            "UPSTREAM_URL": self.stub_url,
+            "CACHE_PATH": os.path.join(self.tmp.name, "boats_cache.snap"),
+            "HISTORY_PATH": os.path.join(self.tmp.name, "boats_history.sqlite"),
+        }
+        self.processes = []
+
+    def __enter__(self):
+        for command, cwd in self.commands:
+            self.processes.append(subprocess.Popen(command, cwd=cwd, env=self.env,
+                                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        return self
+
+    def __exit__(self, *exc):
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.tmp.cleanup()
+
+    def wait_ready(self):
+        """Seconds from launch until the backend has synced the whole inventory."""
+        started = time.perf_counter()
+        with httpx.Client(timeout=5) as client:
+            while time.perf_counter() - started < READY_TIMEOUT:
+                if any(p.poll() is not None for p in self.processes):
+                    raise RuntimeError("The stub or the backend exited during startup")
+                try:
+                    status = client.get(f"{self.api_url}/api/status").json()
+                    if status["boat_count"] >= self.boats and not status["is_loading"] and not status["partial"]:
+                        return time.perf_counter() - started
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.2)
+        raise RuntimeError(f"Backend not ready after {READY_TIMEOUT}s")
+
+
+async def load(client, make_request, concurrency, duration):
+    """Runs `concurrency` clients for `duration` seconds; latency percentiles in ms."""
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(rng):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, url, params, headers = make_request(rng)
+            started = time.perf_counter()
+            try:
+                async with client.stream(method, url, params=params, headers=headers) as resp:
+                    async for _ in resp.aiter_raw():
+                        pass
+                ok = resp.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(random.Random(seed)) for seed in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+async def run_load(api_url, scenarios, levels, duration, detail_ids):
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=60,
+                                 headers={"Accept-Encoding": "gzip"}) as client:
+        first = await client.get("/api/boats")
+        etag = first.headers.get("etag")
+        ids = random.Random(1).sample([str(b["BoatID"]) for b in first.json()], detail_ids)
+
+        requests = {
+            "boats": lambda rng: ("GET", "/api/boats", None, None),
+            "boats_304": lambda rng: ("GET", "/api/boats", None, {"If-None-Match": etag}),
+            "stats": lambda rng: ("GET", "/api/stats", random_filters(rng), None),
+            "query": lambda rng: ("GET", "/api/boats/query", {
+                **random_filters(rng), "sort": rng.choice(SORTS), "offset": rng.randrange(0, 240, 24), "limit": 24,
+            }, None),
+            "similar": lambda rng: ("GET", f"/api/boats/{rng.choice(ids)}/similar", None, None),
+            "details": lambda rng: ("GET", f"/api/boats/{rng.choice(ids)}", None, None),
+        }
+        results = {}
+        for name in scenarios:
+            results[name] = {}
+            for concurrency in levels:
+                results[name][f"c{concurrency}"] = await load(client, requests[name], concurrency, duration)
+        return results
+
+
+def run(boats=20_000, latency=0.01, page_size=50, workers=1, concurrency=(1, 8, 32), duration=5.0,
+        scenarios=tuple(SCENARIOS), detail_ids=500):
+    """{"startup": {...}, scenario: {"c<n>": {...}}}"""
+    # service.py configures INFO logging; one line per request would swamp the output
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with Services(boats, latency, page_size, workers) as services:
+        results = {"startup": {"synced_s": services.wait_ready()}}
+        results.update(asyncio.run(run_load(services.api_url, scenarios, concurrency, duration,
+                                            min(detail_ids, boats))))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--boats", type=int, default=20_000)
+    parser.add_argument("--latency", type=float, default=0.01, help="stub latency per request, seconds")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario and concurrency level")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--detail-ids", type=int, default=500, help="distinct boats the details scenario asks for")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON (- for stdout)")
+    args = parser.parse_args()
+
+    params = dict(boats=args.boats, latency=args.latency, page_size=args.page_size, workers=args.workers,
+                  concurrency=args.concurrency, duration=args.duration, scenarios=args.scenarios,
+                  detail_ids=args.detail_ids)
+    results = run(**params)
+
+    print(f"{args.boats} boats synced in {results['startup']['synced_s']:.2f}s, {args.workers} worker(s)")
+    print(f"{'scenario':>10} {'conc':>5} {'requests':>9} {'errors':>7} {'req/s':>8} "
+          f"{'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}  (ms)")
+    for name in args.scenarios:
+        for level, r in results[name].items():
+            print(f"{name:>10} {level[1:]:>5} {r['requests']:>9} {r['errors']:>7} {r['throughput_rps']:8.1f} "
+                  f"{r['p50_ms']:8.2f} {r['p90_ms']:8.2f} {r['p99_ms']:8.2f} {r['max_ms']:8.2f}")
+    if args.json:
+        common.write_json(args.json, common.report("load", params, results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Resilience check: full syncs against the stub API with injected faults.
+
+Each scenario starts from the same good dataset and runs one full sync:
+
+    clean        no faults
+    flaky        a share of requests answered 503 or cut off
+    stubborn     some pages fail more often than a request retries; the
+                 end-of-sync recovery pass has to fetch them
+    holes        some pages never succeed; the sync must refuse to publish
+    outage       every request fails; the circuit breaker must open and the
+                 sync give up quickly, keeping the current data
+
+    python benchmarks/bench_resilience.py --boats 5000
+"""
+import argparse
+import time
+
+import common  # noqa: F401  (sys.path and scratch cache/history paths)
+import service  # noqa: E402
+import upstream  # noqa: E402
+from stub_server import StubServer, make_boats  # noqa: E402
+
+
+def run(boats, baseline, latency, **faults):
+    service.upstream_breaker = upstream.CircuitBreaker(reset_timeout=1.0)
+    service.sync_state.set_boats(baseline)
+    before = service.sync_state.version
+    with StubServer(boats, latency=latency, **faults) as server:
+        service.BASE_URL = server.base_url
+        started = time.perf_counter()
+        service.fetch_worker(full=True)
+        elapsed = time.perf_counter() - started
+        api = server.api
+    published = service.sync_state.version != before
+    changeset = service.sync_state.last_changeset or {} if published else {}
+    return {
+        "published": published,
+        "boats": len(service.sync_state.boats),
+        "recovered": changeset.get("recovered_pages", 0),
+        "faults": api.faults,
+        "requests": api.requests,
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--boats", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.01)
+    args = parser.parse_args()
+    service.logger.setLevel("CRITICAL")
+    upstream.logger.setLevel("CRITICAL")
+    service.save_cache = lambda *args, **kwargs: None
+
+    boats = make_boats(args.boats)
+    # The "current" data every scenario starts from: slightly older
+    baseline = boats[10:]
+    pages = list(range(0, args.boats, service.PAGE_SIZE))
+    holes = max(1, int(len(pages) * 0.05))
+
+    scenarios = {
+        "clean": {},
+        "flaky": {"error_rate": 0.15, "drop_rate": 0.05},
+        "stubborn": {"fail_offsets": {start: upstream.MAX_ATTEMPTS + 1 for start in pages[1::10]}},
+        "holes": {"fail_offsets": {start: None for start in pages[1:1 + holes]}},
+        "outage": {"fail_offsets": {}, "error_rate": 1.0},
+    }
+    print(f"{'scenario':>10} {'published':>10} {'boats':>7} {'recovered':>10} {'faults':>7} {'requests':>9} {'seconds':>8}")
+    for name, faults in scenarios.items():
+        result = run(boats, baseline, args.latency, **faults)
+        print(f"{name:>10} {str(result['published']):>10} {result['boats']:>7} {result['recovered']:>10} "
+              f"{result['faults']:>7} {result['requests']:>9} {result['seconds']:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
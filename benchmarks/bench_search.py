@@ -0,0 +1,107 @@
+"""
+Benchmark: free-text search and dropdown autocomplete, legacy substring scan
+versus the SearchIndex.
+
+The stub inventory only has ten builders, so builder names are replaced by
+generated ones to give the index a realistically sized vocabulary.
+
+    python benchmarks/bench_search.py --boats 100000 --builders 3000
+"""
+import argparse
+import random
+import time
+
+import common  # noqa: F401  (sys.path and scratch cache/history paths)
+from query import BoatIndex  # noqa: E402
+from search import SearchIndex  # noqa: E402
+from stub_server import make_boats  # noqa: E402
+
+SYLLABLES = ["az", "i", "mut", "fer", "ret", "ti", "san", "lo", "ren", "zo", "ri", "va", "prin", "cess", "sun",
+             "see", "ker", "be", "ne", "teau", "jean", "ab", "so", "lute", "per", "shing", "ma", "ri", "ner", "cra"]
+FILTERS = {"priceFrom": 100_000, "yearFrom": 1990}
+
+
+def make_inventory(count, builders, seed=3):
+    rng = random.Random(seed)
+    names = sorted({"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+                  for _ in range(builders * 2)})[:builders]
+    boats = make_boats(count)
+    for boat in boats:
+        builder = rng.choice(names)
+        boat["Builder"] = builder
+        boat["Model"] = f"{builder} {rng.randrange(30, 120)}{rng.choice(['', '', 'S', ' Fly', ' HT'])}"
+    return boats, names
+
+
+def legacy_search(boats, q):
+    """The substring scan the dashboard used for `q`."""
+    q = q.strip().lower()
+    return [b for b in boats
+            if q in str(b.get("Model") or "").lower()
+            or q in str(b.get("Builder") or "").lower()
+            or q in str(b.get("BoatID", ""))]
+
+
+def legacy_options(boats, field, text):
+    """FilterSection: substring filter over the distinct values."""
+    options = sorted({b[field] for b in boats if b.get(field)})
+    return [o for o in options if text.lower() in o.lower()]
+
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--boats", type=int, default=100_000)
+    parser.add_argument("--builders", type=int, default=3000)
+    args = parser.parse_args()
+
+    boats, names = make_inventory(args.boats, args.builders)
+    t0 = time.perf_counter()
+    index = BoatIndex(boats)
+    build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    SearchIndex(boats, index.categorical)
+    search_build = time.perf_counter() - t0
+    print(f"{args.boats} boats, {len(index.search.vocabulary)} terms: BoatIndex build {build * 1000:.0f} ms "
+          f"(search index {search_build * 1000:.0f} ms)")
+
+    builder = names[0]
+    # One dropped letter
+    typo = builder[:3] + builder[4:]
+    model = next(b["Model"] for b in boats if b["Builder"] == builder)
+    queries = [
+        ("builder", builder),
+        ("prefix", builder[:3]),
+        ("typo", typo),
+        ("builder + model no.", model),
+        ("builder + country", f"{builder} italy"),
+        ("boat id", str(boats[500]["BoatID"])),
+    ]
+    print(f"{'query':>22} {'text':>20} {'matches':>8} {'legacy':>9} {'index':>9} {'+filters':>9}  (ms)")
+    for label, text in queries:
+        matches = index.search_query(text, {}, limit=24)["total"]
+        legacy = timed(lambda: legacy_search(boats, text))
+        # Cold: drop the memoised match first, as a new query would find it
+        indexed = timed(lambda: (index.search._recent.clear(), index.search_query(text, {}, limit=24)))
+        filtered = timed(lambda: (index.search._recent.clear(), index.search_query(text, FILTERS, limit=24)))
+        print(f"{label:>22} {text[:20]:>20} {matches:>8} {legacy:9.2f} {indexed:9.2f} {filtered:9.2f}")
+
+    print(f"\n{'autocomplete':>22} {'text':>20} {'top':>20} {'legacy':>9} {'index':>9}  (ms)")
+    for field, name, text in [("Builder", "builders", builder[:2]), ("Builder", "builders", typo),
+                              ("Model", "models", model[:-1]), ("Country", "countries", "ita")]:
+        top = index.suggest(name, text, limit=10)
+        legacy = timed(lambda: legacy_options(boats, field, text))
+        indexed = timed(lambda: index.suggest(name, text, limit=10))
+        print(f"{name:>22} {text[:20]:>20} {(top[0]['value'] if top else '-')[:20]:>20} {legacy:9.2f} {indexed:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Compares full sync wall time of the concurrent fetch_worker against the
+previous serial page loop, both running against the local stub API.
+
+    python benchmarks/bench_sync.py --boats 5000 --latency 0.05 --json results/sync.json
+"""
+import argparse
+import math
+import time
+
+import requests
+
+import common
+import service  # noqa: E402
+from stub_server import StubServer, make_boats  # noqa: E402
+
+
+def serial_sync(base_url):
+    """The pre-concurrency sync loop: one page at a time, new connection per page."""
+    headers = {'Authorization': service.API_TOKEN, 'Accept': 'application/json'}
+    params = {'start': 0, 'limit': service.PAGE_SIZE}
+    resp = requests.get(base_url, headers=headers, params=params, timeout=15)
+    data = resp.json()
+    total_results = data.get('TotalResults', 0)
+    all_boats = list(data.get('Results', []))
+    for i in range(math.ceil(total_results / service.PAGE_SIZE) - 1):
+        params['start'] += service.PAGE_SIZE
+        time.sleep(0.1)
+        resp = requests.get(base_url, headers=headers, params=params, timeout=15)
+        all_boats.extend(resp.json().get('Results', []))
+    return list({b['BoatID']: b for b in all_boats}.values())
+
+
+def concurrent_sync(base_url):
+    service.BASE_URL = base_url
+    service.sync_state.set_boats([])
+    service.fetch_worker(full=True)
+    return service.sync_state.boats
+
+
+def simulate_turnover(boats, new_listings, seed=7):
+    """Puts fresh listings at the head of the list and reprices a few recent ones."""
+    fresh = make_boats(new_listings, seed=seed)
+    for i, boat in enumerate(fresh):
+        boat["BoatID"] = 900000 + i
+    for boat in boats[:new_listings]:
+        boat["SellPrice"] = int(boat["SellPrice"] * 0.95)
+    boats[:0] = fresh
+
+
+def run(boats=5000, latency=0.05, page_size=50, turnover=20, serial=True):
+    """Full and incremental sync timings against the stub, as a flat dict."""
+    service.logger.setLevel("WARNING")
+    # Keep the benchmark from overwriting the cache file
+    service.save_cache = lambda *args, **kwargs: None
+    service.PAGE_SIZE = page_size
+
+    results = {}
+    with StubServer(make_boats(boats), latency=latency, max_page_size=page_size) as server:
+        runs = (("serial", serial_sync), ("concurrent", concurrent_sync)) if serial else (("concurrent", concurrent_sync),)
+        for name, fn in runs:
+            t0 = time.perf_counter()
+            synced = fn(server.base_url)
+            elapsed = time.perf_counter() - t0
+            results[f"{name}_s"] = elapsed
+            results[f"{name}_boats"] = len(synced)
+            results[f"{name}_boats_rps"] = len(synced) / elapsed
+
+        simulate_turnover(server.api.boats, turnover)
+        requests_before = server.api.requests
+        t0 = time.perf_counter()
+        service.fetch_worker()
+        results["incremental_s"] = time.perf_counter() - t0
+        results["incremental_requests"] = server.api.requests - requests_before
+        changeset = service.sync_state.last_changeset
+        for key in ("added", "changed", "removed"):
+            results[f"incremental_{key}"] = changeset[key]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--boats", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--page-size", type=int, default=service.PAGE_SIZE)
+    parser.add_argument("--turnover", type=int, default=20, help="new listings between syncs")
+    parser.add_argument("--no-serial", dest="serial", action="store_false", help="skip the slow serial baseline")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON (- for stdout)")
+    args = parser.parse_args()
+
+    params = dict(boats=args.boats, latency=args.latency, page_size=args.page_size,
+                  turnover=args.turnover, serial=args.serial)
+    results = run(**params)
+    for name in ("serial", "concurrent"):
+        if f"{name}_s" in results:
+            print(f"{name:>11}: {results[f'{name}_boats']} boats in {results[f'{name}_s']:.2f}s "
+                  f"({results[f'{name}_boats_rps']:.0f} boats/s)")
+    print(f"incremental: {len(service.sync_state.boats)} boats in {results['incremental_s']:.2f}s, "
+          f"{results['incremental_requests']} requests, +{results['incremental_added']} "
+          f"~{results['incremental_changed']} -{results['incremental_removed']}")
+    if args.json:
+        common.write_json(args.json, common.report("sync", params, results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Shared setup for the benchmarks: import this before any backend module.
+
+Puts the repo root and backend/ on sys.path and points the backend's cache
+and history files at a scratch directory, so a benchmark never touches the
+real ones. Also writes results as JSON for tracking regressions:
+
+    {"suite": ..., "params": {...}, "results": {...}, "meta": {commit, python, ...}}
+
+Result keys carry their unit: *_s and *_ms are lower-is-better times,
+*_rps is higher-is-better throughput (see run_suite.py --baseline).
+"""
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT, "backend")
+for path in (BACKEND_DIR, ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+SCRATCH = tempfile.mkdtemp(prefix="broker-bench-")
+os.environ.setdefault("CACHE_PATH", os.path.join(SCRATCH, "boats_cache.snap"))
+os.environ.setdefault("HISTORY_PATH", os.path.join(SCRATCH, "boats_history.sqlite"))
+
+
+def metadata():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "describe": git("describe", "--always", "--dirty"),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def report(suite, params, results):
+    return {"suite": suite, "params": params, "results": results, "meta": metadata()}
+
+
+def write_json(path, data):
+    """Writes `data` to `path` ("-" for stdout)."""
+    text = json.dumps(data, indent=2, sort_keys=True)
+    if path == "-":
+        print(text)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text + "\n")
+    print(f"Results written to {path}")
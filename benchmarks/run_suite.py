@@ -0,0 +1,123 @@
+"""
+Runs the benchmark suites and writes one JSON report, optionally compared
+against an earlier report to catch regressions between versions.
+
+    python benchmarks/run_suite.py --out results/$(git rev-parse --short HEAD).json
+    python benchmarks/run_suite.py --quick --baseline results/main.json --tolerance 0.2
+
+Suites: sync (full and incremental sync throughput against the stub),
+coldstart (JSON cache vs mapped snapshot), carousel (ig.py render) and load
+(the HTTP API under concurrent clients). --quick runs small sizes, for CI or
+a pre-commit sanity check; compare quick reports only with quick reports.
+
+With --baseline, every metric whose name ends in _s or _ms (lower is better)
+or _rps (higher is better) is compared; a change worse than --tolerance
+(relative) is reported and the exit status is 1. Timings under
+--min-time-ms are too noisy to compare and are skipped.
+"""
+import argparse
+import json
+import sys
+
+import common
+
+SUITES = ["sync", "coldstart", "carousel", "load"]
+
+PROFILES = {
+    "full": {
+        "sync": dict(boats=5000, latency=0.05, turnover=20),
+        "coldstart": dict(boats=100_000),
+        "carousel": dict(selections=3, boats=6, latency=0.05),
+        "load": dict(boats=20_000, latency=0.01, concurrency=(1, 8, 32), duration=5.0),
+    },
+    "quick": {
+        "sync": dict(boats=1000, latency=0.01, turnover=20, serial=False),
+        "coldstart": dict(boats=10_000),
+        "carousel": dict(selections=1, boats=3, latency=0.01),
+        "load": dict(boats=2000, latency=0.005, concurrency=(1, 8), duration=1.0),
+    },
+}
+
+
+def run_suite(name, params):
+    # Imported lazily: each suite pulls in its own dependencies (Pillow for the carousel, ...)
+    if name == "sync":
+        import bench_sync as bench
+    elif name == "coldstart":
+        import bench_coldstart as bench
+    elif name == "carousel":
+        import bench_carousel as bench
+    else:
+        import bench_load as bench
+    return bench.run(**params)
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(report, baseline, tolerance, min_time_ms):
+    """[(metric, baseline, current, relative change)] for the regressions."""
+    regressions = []
+    for suite, data in report["suites"].items():
+        if suite not in baseline.get("suites", {}):
+            continue
+        before = flatten(baseline["suites"][suite]["results"])
+        for metric, value in flatten(data["results"]).items():
+            old = before.get(metric)
+            if old is None or old <= 0:
+                continue
+            if metric.endswith("_rps"):
+                change = (old - value) / old
+            elif metric.endswith("_ms") or metric.endswith("_s"):
+                scale = 1000 if metric.endswith("_s") else 1
+                if max(old, value) * scale < min_time_ms:
+                    continue
+                change = (value - old) / old
+            else:
+                continue
+            if change > tolerance:
+                regressions.append((f"{suite}.{metric}", old, value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=SUITES)
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a fast sanity run")
+    parser.add_argument("--out", default="-", help="report path (default: stdout)")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown reported as a regression")
+    parser.add_argument("--min-time-ms", type=float, default=5.0, help="ignore timings below this")
+    args = parser.parse_args()
+
+    profile = "quick" if args.quick else "full"
+    report = {"profile": profile, "meta": common.metadata(), "suites": {}}
+    for name in args.suites:
+        params = PROFILES[profile][name]
+        print(f"Running {name} ({', '.join(f'{k}={v}' for k, v in params.items())})...", file=sys.stderr)
+        report["suites"][name] = {"params": params, "results": run_suite(name, params)}
+    common.write_json(args.out, report)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("profile") != profile:
+            print(f"Warning: comparing a {profile} run with a {baseline.get('profile')} baseline", file=sys.stderr)
+        regressions = compare(report, baseline, args.tolerance, args.min_time_ms)
+        for metric, old, new, change in regressions:
+            print(f"REGRESSION {metric}: {old:.4g} -> {new:.4g} ({change:+.0%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
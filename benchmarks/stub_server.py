@@ -0,0 +1,219 @@
+"""
+Local stand-in for the Navis2WS boats API, used by the benchmarks.
+
+Serves GET /Navis2WS/v2/boats?start=&limit= and /Navis2WS/v2/boats/{id}
+with a synthetic inventory (make_boats), a configurable per-request latency
+and page size, so sync and detail code can be timed without touching the
+live service. Run it standalone to point a dev backend at it:
+
+    python benchmarks/stub_server.py --boats 20000 --latency 0.05
+    UPSTREAM_URL=http://127.0.0.1:8081/Navis2WS/v2/boats uvicorn main:app
+
+When given fixture JPEGs it also serves them for any /img/ path, for the
+carousel benchmark.
+
+Faults can be injected for the resilience benchmark: a share of requests
+answered 503 (`error_rate`) or cut off without a response (`drop_rate`),
+specific list offsets that fail a number of times before succeeding
+(`fail_offsets`, {offset: times}, None for always), and `down` to fail
+everything.
+"""
+import json
+import random
+import socket
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+BUILDERS = ["Azimut", "Ferretti", "Sanlorenzo", "Riva", "Princess", "Sunseeker", "Beneteau", "Jeanneau", "Absolute", "Pershing"]
+COUNTRIES = ["Italy", "France", "Spain", "Croatia", "Greece", "Monaco", "Germany", "Netherlands"]
+CONDITIONS = ["Used", "New", "Demo"]
+
+
+def make_boats(count, seed=42, image_base="https://example.invalid/img"):
+    """Synthetic listings shaped like the upstream list payload."""
+    rng = random.Random(seed)
+    boats = []
+    for i in range(count):
+        builder = rng.choice(BUILDERS)
+        price = rng.randrange(20_000, 5_000_000, 1_000)
+        boats.append({
+            "BoatID": 100000 + i,
+            "Builder": builder,
+            "Model": f"{builder} {rng.randrange(30, 120)}",
+            "Country": rng.choice(COUNTRIES),
+            "Condition": rng.choice(CONDITIONS),
+            "YearBuilt": rng.randrange(1975, 2026),
+            "Length": round(rng.uniform(5, 60), 2),
+            "SellPrice": price,
+            "SellPriceFormatted": f"€ {price:,}".replace(",", "."),
+            "SellPriceVAT": rng.choice(["IVA inclusa", "IVA esclusa", "IVA pagata", ""]),
+            "ImageUrl": f"{image_base}/{100000 + i}",
+        })
+    return boats
+
+
+def make_details(boat, images=3):
+    """Detail payload for a listing: the summary fields plus an image gallery."""
+    return {
+        **boat,
+        "AgencyName": "Stub Yachts",
+        "AgencyPhone": "+39 000 000000",
+        "Images": [{"ImageUrl": f"{boat['ImageUrl']}/{i}"} for i in range(images)],
+    }
+
+
+class StubAPI:
+    def __init__(self, boats, latency=0.05, max_page_size=50, images=(),
+                 error_rate=0.0, drop_rate=0.0, fail_offsets=None, seed=0):
+        self.boats = boats
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.images = list(images)
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.fail_offsets = dict(fail_offsets or {})
+        self.down = False
+        self.requests = 0
+        self.faults = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def fault(self, path, query):
+        """"error", "drop" or None for this request."""
+        with self._lock:
+            if self.down:
+                kind = "error"
+            elif path.endswith("/boats") and int(query.get("start", [0])[0]) in self.fail_offsets:
+                start = int(query.get("start", [0])[0])
+                remaining = self.fail_offsets[start]
+                if remaining is not None:
+                    if remaining <= 1:
+                        del self.fail_offsets[start]
+                    else:
+                        self.fail_offsets[start] = remaining - 1
+                kind = "error"
+            else:
+                roll = self._rng.random()
+                kind = "error" if roll < self.error_rate else "drop" if roll < self.error_rate + self.drop_rate else None
+            if kind:
+                self.faults += 1
+            return kind
+
+    def find(self, boat_id):
+        for boat in self.boats:
+            if str(boat["BoatID"]) == boat_id:
+                return boat
+        return None
+
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with api._lock:
+                    api.requests += 1
+                if api.latency:
+                    time.sleep(api.latency)
+
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                path = url.path.rstrip("/")
+                fault = api.fault(path, query)
+                if fault == "drop":
+                    self.close_connection = True
+                    self.wfile.flush()
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                if fault == "error":
+                    self.send_error(503)
+                    return
+                content_type = "application/json"
+                if "/img/" in path and api.images:
+                    # Stable fixture per URL, so repeated runs fetch identical bytes
+                    body = api.images[zlib.crc32(path.encode()) % len(api.images)]
+                    content_type = "image/jpeg"
+                elif path.endswith("/boats"):
+                    start = int(query.get("start", [0])[0])
+                    limit = min(int(query.get("limit", [api.max_page_size])[0]), api.max_page_size)
+                    body = json.dumps({
+                        "TotalResults": len(api.boats),
+                        "Results": api.boats[start:start + limit],
+                    }).encode()
+                elif "/boats/" in path:
+                    boat = api.find(path.rsplit("/", 1)[-1])
+                    if boat is None:
+                        self.send_error(404)
+                        return
+                    body = json.dumps(make_details(boat)).encode()
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+class StubServer:
+    """Runs a StubAPI on a background thread; use as a context manager."""
+    def __init__(self, boats, latency=0.05, max_page_size=50, port=0, images=(), **faults):
+        self.api = StubAPI(boats, latency=latency, max_page_size=max_page_size, images=images, **faults)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.api.handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def root_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self):
+        return f"{self.root_url}/Navis2WS/v2/boats"
+
+    @property
+    def image_base(self):
+        return f"{self.root_url}/img"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the local Navis2WS stub")
+    parser.add_argument("--boats", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every request")
+    parser.add_argument("--page-size", type=int, default=50, help="largest page served, whatever the limit asked")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the synthetic inventory")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 503")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of connections cut without a response")
+    args = parser.parse_args()
+
+    with StubServer(make_boats(args.boats, seed=args.seed), latency=args.latency, max_page_size=args.page_size,
+                    port=args.port, error_rate=args.error_rate, drop_rate=args.drop_rate) as server:
+        print(f"Stub API listening on {server.base_url} ({args.boats} boats)")
+        print(f"Point the backend at it with UPSTREAM_URL={server.base_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -1,7 +1,7 @@
 
-import React, { useEffect, useState, useMemo } from 'react';
+import React, { useEffect, useState, useMemo, useRef } from 'react';
 import { LayoutDashboard, TrendingUp, DollarSign, Anchor, RefreshCw, BarChart3, Search, Calendar, Ruler, ChevronDown, ChevronUp, ChevronLeft, ChevronRight } from 'lucide-react';
-import { fetchBoats, fetchDashboardStats, fetchSyncStatus } from './api';
+import { fetchBoatRows, fetchBoats, fetchDashboardStats, fetchSyncStatus, searchBoats, subscribeToEvents, triggerSync } from './api';
 import StatCard from './components/StatCard';
 import BoatCard from './components/BoatCard';
 import Charts from './components/Charts';
@@ -70,46 +70,121 @@ function App() {
     priceTo: 300000000 // Increased default max
   });
 
+  // True while the push channel is connected; otherwise we fall back to polling
+  const liveRef = useRef(false);
+  // Dataset version of the boats we hold, so "dataset" events can be applied as diffs
+  const versionRef = useRef(null);
+
   useEffect(() => {
-    // Initial Load Logic with Polling
+    // Initial Load Logic: live events from the server, polling as a fallback
     let pollInterval;
+    let source;
+    let loaded = false;
+    let streaming = false;
+
+    const loadBoats = async () => {
+      loaded = true;
+      try {
+        const { boats: data, version } = await fetchBoats();
+        versionRef.current = version;
+        setBoats(data);
+      } catch (e) {
+        console.error("Failed to fetch final boats", e);
+      } finally {
+        setLoading(false);
+      }
+    };
 
-    const checkStatus = async () => {
-      const status = await fetchSyncStatus();
-      if (status) {
-        setSyncStatus(status);
-
-        // If loading is done and we have boats (or expected to have), fetch data
-        if (!status.is_loading && status.boat_count > 0) {
-          clearInterval(pollInterval);
-
-          // Fetch final data
-          try {
-            const data = await fetchBoats();
-            setBoats(data);
-          } catch (e) {
-            console.error("Failed to fetch final boats", e);
-          } finally {
-            setLoading(false);
-          }
-        } else if (!status.is_loading && status.boat_count === 0 && status.total_estimated === 0) {
-          // Not started yet? Trigger sync
-          await fetchBoats({ refresh: true }); // This triggers sync in backend
+    const handleStatus = async (status) => {
+      setSyncStatus(status);
+
+      // If loading is done and we have boats (or expected to have), fetch data.
+      // A cold-start sync streams partial data, so there is no need to wait for it.
+      if (!loaded && (!status.is_loading || status.partial) && status.boat_count > 0) {
+        await loadBoats();
+      }
+      // An empty server syncs on its own schedule straight away: nothing to trigger here
+    };
+
+    // A sync swapped in new data: fetch just the boats it added or changed and
+    // drop the removed ones, or reload the list when the diff doesn't follow
+    // the version we hold (missed events, large syncs sent without ids)
+    const applyDataset = async (event) => {
+      if (!loaded) return;
+      const ids = event.ids;
+      if (!ids || versionRef.current == null || event.version !== versionRef.current + 1) {
+        await loadBoats();
+        return;
+      }
+      versionRef.current = event.version;
+      const wanted = [...ids.added, ...ids.changed];
+      let rows = [];
+      if (wanted.length) {
+        const data = await fetchBoatRows(wanted);
+        if (!data || data.missing.length) {
+          await loadBoats();
+          return;
         }
+        rows = data.results;
       }
+      const removed = new Set(ids.removed);
+      const updated = new Map(rows.map(b => [b.BoatID, b]));
+      setBoats(current => {
+        const known = new Set(current.map(b => b.BoatID));
+        // New listings go first, as upstream lists them
+        const added = rows.filter(b => !known.has(b.BoatID));
+        return [...added, ...current.filter(b => !removed.has(b.BoatID)).map(b => updated.get(b.BoatID) || b)];
+      });
     };
 
-    pollInterval = setInterval(checkStatus, 800);
-    checkStatus(); // Initial check
+    const startPolling = () => {
+      const checkStatus = async () => {
+        const status = await fetchSyncStatus();
+        if (status) {
+          const wasLoaded = loaded;
+          await handleStatus(status);
+          // Keep refreshing partial data until the sync has loaded everything (once more at the end)
+          if (wasLoaded && (status.partial || streaming)) await loadBoats();
+          streaming = status.partial;
+          if (loaded && !status.partial) clearInterval(pollInterval);
+        }
+      };
+      pollInterval = setInterval(checkStatus, 800);
+      checkStatus(); // Initial check
+    };
 
-    return () => clearInterval(pollInterval);
+    if (window.EventSource) {
+      source = subscribeToEvents({
+        onOpen: () => { liveRef.current = true; },
+        onStatus: handleStatus,
+        onDataset: applyDataset,
+        onError: () => {
+          // Never connected: the server or a proxy doesn't do SSE, so poll instead
+          if (!liveRef.current) {
+            source.close();
+            startPolling();
+          }
+        },
+      });
+    } else {
+      startPolling();
+    }
+
+    return () => {
+      clearInterval(pollInterval);
+      if (source) source.close();
+      liveRef.current = false;
+    };
   }, []);
 
   const triggerResync = async () => {
+    const result = await triggerSync();
+    // Coalesced by the server (a sync is running, pending or just finished): nothing new to wait for
+    if (!result || !result.started) return;
+    // Progress and the refreshed dataset arrive over the event stream
+    if (liveRef.current) return;
     setLoading(true);
     setBoats([]);
-    // Trigger sync logic again (reload page or reset state to trigger polling)
-    await fetchBoats({ refresh: true });
     window.location.reload(); // Simplest way to restart polling cycle for this prototype
   };
 
@@ -118,8 +193,45 @@ function App() {
     setCurrentPage(1);
   }, [filters, searchTerm]);
 
+  // Server-side aggregates for the current selection (histograms for the charts)
+  const [serverStats, setServerStats] = useState(null);
+  useEffect(() => {
+    if (loading) return;
+    let cancelled = false;
+    fetchDashboardStats({ ...filters, q: searchTerm || undefined }).then(data => {
+      if (!cancelled) setServerStats(data);
+    });
+    return () => { cancelled = true; };
+  }, [filters, searchTerm, loading, boats]);
+
+  // Ranked BoatIDs from the server's search index while a search term is set
+  const [searchIds, setSearchIds] = useState(null);
+  useEffect(() => {
+    const text = searchTerm.trim();
+    if (!text || loading) {
+      setSearchIds(null);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(() => {
+      searchBoats({ ...filters, q: text }, { ids: true }).then(data => {
+        if (!cancelled && data) setSearchIds(data.ids);
+      });
+    }, 200);
+    return () => { cancelled = true; clearTimeout(timer); };
+  }, [filters, searchTerm, loading, boats]);
+
+  // Stable identity, so the dropdowns only re-query suggestions when the selection changes
+  const searchFilters = useMemo(() => ({ ...filters, q: searchTerm || undefined }), [filters, searchTerm]);
+
+  const boatsById = useMemo(() => new Map(boats.map(b => [b.BoatID, b])), [boats]);
+
   // Derived Data & Filtering
   const filteredBoats = useMemo(() => {
+    // The server already applied the filters and ranked the matches
+    if (searchIds) return searchIds.map(id => boatsById.get(id)).filter(Boolean);
+
+    // Substring matching until the ranked results arrive
     return boats.filter(b => {
       const matchesSearch = !searchTerm ||
         b.Model?.toLowerCase().includes(searchTerm.toLowerCase()) ||
@@ -145,7 +257,7 @@ function App() {
 
       return matchesSearch && matchesBuilder && matchesModel && matchesCountry && matchesCondition && matchesYear && matchesLength && matchesPrice;
     });
-  }, [boats, searchTerm, filters]);
+  }, [boats, boatsById, searchIds, searchTerm, filters]);
 
   // Pagination Logic
   const totalPages = Math.ceil(filteredBoats.length / itemsPerPage);
@@ -158,7 +270,7 @@ function App() {
   const stats = useMemo(() => {
     if (filteredBoats.length === 0) return null;
 
-    const prices = filteredBoats.map(b => b.SellPrice).filter(p => p > 0);
+    const prices = filteredBoats.map(b => b.PriceEUR ?? b.SellPrice).filter(p => p > 0);
     const years = filteredBoats.map(b => b.YearBuilt).filter(y => y > 1900);
 
     return {
@@ -219,11 +331,14 @@ function App() {
           >
             <button
               onClick={triggerResync}
-              disabled={loading}
+              title={syncStatus?.age != null ? `Data checked ${Math.round(syncStatus.age / 60)} min ago${syncStatus.stale ? " (stale)" : ""}` : undefined}
+              disabled={loading || syncStatus?.is_loading}
               className="flex items-center gap-2 px-6 py-3 bg-slate-900 text-white rounded-xl font-semibold hover:bg-slate-800 transition-all shadow-lg shadow-slate-900/20 active:scale-95 disabled:opacity-70 disabled:cursor-not-allowed"
             >
-              <RefreshCw size={18} className={loading ? "animate-spin" : ""} />
-              {loading ? "Syncing..." : "Sync Data"}
+              <RefreshCw size={18} className={loading || syncStatus?.is_loading ? "animate-spin" : ""} />
+              {syncStatus?.partial
+                ? `Loading ${formatNumber(syncStatus.total_fetched)} / ${formatNumber(syncStatus.total_estimated)}`
+                : loading || syncStatus?.is_loading ? "Syncing..." : "Sync Data"}
             </button>
           </motion.div>
         </div>
@@ -237,6 +352,7 @@ function App() {
           uniqueModels={uniqueModels}
           uniqueCountries={uniqueCountries}
           uniqueConditions={uniqueConditions}
+          searchFilters={searchFilters}
           resetFilters={() => setFilters({
             builders: [],
             models: [],
@@ -300,7 +416,7 @@ function App() {
               <h3 className="font-bold text-xl text-slate-800">Market Distribution</h3>
             </div>
           </div>
-          <Charts boats={filteredBoats} />
+          <Charts boats={filteredBoats} brands={serverStats?.brands} />
         </motion.div>
 
         {/* Inventory Section (Collapsible) */}
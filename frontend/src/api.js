@@ -2,22 +2,72 @@ import axios from 'axios';
 
 const API_URL = "http://localhost:8000/api";
 
+// The whole list with the dataset version it belongs to: { boats, version }
 export const fetchBoats = async (filters = {}) => {
     try {
         const params = {};
         if (filters.refresh) params.refresh = true;
 
         const response = await axios.get(`${API_URL}/boats`, { params });
-        return response.data;
+        const version = Number(response.headers['x-dataset-version']);
+        return { boats: response.data, version: Number.isFinite(version) ? version : null };
     } catch (error) {
         console.error("Error fetching boats:", error);
-        return [];
+        return { boats: [], version: null };
+    }
+};
+
+// List rows of some boats in the live dataset: { version, results, missing }
+export const fetchBoatRows = async (boatIds) => {
+    try {
+        const response = await axios.post(`${API_URL}/boats/rows`, { ids: boatIds.map(String) });
+        return response.data;
+    } catch (error) {
+        console.error("Error fetching boat rows:", error);
+        return null;
     }
 };
 
-export const fetchDashboardStats = async () => {
+// Ranked, typo-tolerant search for `filters.q` combined with the other filters.
+// With `ids` the response lists the BoatIDs of every match, best first.
+export const searchBoats = async (filters = {}, { sort, offset = 0, limit = 24, ids = false } = {}) => {
     try {
-        const response = await axios.get(`${API_URL}/stats`);
+        const params = { ...filters, offset, limit };
+        if (sort) params.sort = sort;
+        if (ids) params.ids = true;
+
+        const response = await axios.get(`${API_URL}/search`, {
+            params,
+            paramsSerializer: { indexes: null },
+        });
+        return response.data;
+    } catch (error) {
+        console.error("Error searching boats:", error);
+        return null;
+    }
+};
+
+// Autocomplete for a filter dropdown (`field`: builders, models, countries, conditions).
+// Returns [{ value, count }], counted under the other active filters.
+export const suggestValues = async (field, text, filters = {}, limit = 50) => {
+    try {
+        const response = await axios.get(`${API_URL}/search/suggest`, {
+            params: { ...filters, field, text, limit },
+            paramsSerializer: { indexes: null },
+        });
+        return response.data.results;
+    } catch (error) {
+        console.error("Error fetching suggestions:", error);
+        return null;
+    }
+};
+
+export const fetchDashboardStats = async (filters = {}) => {
+    try {
+        const response = await axios.get(`${API_URL}/stats`, {
+            params: filters,
+            paramsSerializer: { indexes: null },
+        });
         return response.data;
     } catch (error) {
         console.error("Error fetching stats:", error);
@@ -35,6 +85,30 @@ export const fetchSyncStatus = async () => {
     }
 };
 
+export const triggerSync = async ({ full = false } = {}) => {
+    try {
+        const response = await axios.post(`${API_URL}/sync`, null, { params: full ? { full: true } : {} });
+        return response.data;
+    } catch (error) {
+        console.error("Error triggering sync:", error);
+        return null;
+    }
+};
+
+// Live sync progress and dataset changes over Server-Sent Events.
+// Returns the EventSource; call .close() to unsubscribe.
+export const subscribeToEvents = ({ onOpen, onStatus, onDataset, onError } = {}) => {
+    const source = new EventSource(`${API_URL}/events`);
+    const parse = (handler) => (event) => handler && handler(JSON.parse(event.data));
+
+    source.onopen = () => onOpen && onOpen();
+    source.onerror = (error) => onError && onError(error);
+    source.addEventListener('status', parse(onStatus));
+    source.addEventListener('progress', parse(onStatus));
+    source.addEventListener('dataset', parse(onDataset));
+    return source;
+};
+
 export const fetchBoatDetails = async (boatId) => {
     try {
         const response = await axios.get(`${API_URL}/boats/${boatId}`);
@@ -44,3 +118,13 @@ export const fetchBoatDetails = async (boatId) => {
         return null;
     }
 }
+
+export const fetchBoatDetailsBatch = async (boatIds) => {
+    try {
+        const response = await axios.post(`${API_URL}/boats/details`, { ids: boatIds.map(String) });
+        return response.data.results;
+    } catch (error) {
+        console.error("Error fetching boat details batch:", error);
+        return {};
+    }
+};
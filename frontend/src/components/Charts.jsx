@@ -3,16 +3,19 @@ import {
     BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, Cell
 } from 'recharts';
 
-const Charts = ({ boats }) => {
+const Charts = ({ boats, brands }) => {
     // Process data for charts
     // 1. Price Distribution (Histogram-ish) or Top Brands
 
-    // Group by Brand for this example
-    const brandCounts = {};
-    boats.forEach(b => {
-        const brand = b.Builder || "Unknown";
-        brandCounts[brand] = (brandCounts[brand] || 0) + 1;
-    });
+    // Group by Brand, preferring the server's precomputed histogram
+    let brandCounts = brands;
+    if (!brandCounts) {
+        brandCounts = {};
+        boats.forEach(b => {
+            const brand = b.Builder || "Unknown";
+            brandCounts[brand] = (brandCounts[brand] || 0) + 1;
+        });
+    }
 
     // Sort and take top 5
     const data = Object.entries(brandCounts)
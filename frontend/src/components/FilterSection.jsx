@@ -1,13 +1,28 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { SlidersHorizontal, X, ChevronDown, Check, Search } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
+import { suggestValues } from '../api';
 
-const MultiSelect = ({ label, options, selected, onChange }) => {
+const MultiSelect = ({ label, options, selected, onChange, field, filters }) => {
     const [isOpen, setIsOpen] = useState(false);
     const [search, setSearch] = useState("");
+    const [suggestions, setSuggestions] = useState(null);
     const wrapperRef = useRef(null);
 
-    const filteredOptions = options.filter(opt =>
+    // Typo-tolerant, ranked matches from the server; substring matching until they arrive
+    useEffect(() => {
+        setSuggestions(null);
+        if (!field || !search.trim()) return;
+        let cancelled = false;
+        const timer = setTimeout(() => {
+            suggestValues(field, search, filters).then(results => {
+                if (!cancelled && results) setSuggestions(results.map(r => r.value));
+            });
+        }, 150);
+        return () => { cancelled = true; clearTimeout(timer); };
+    }, [field, search, filters]);
+
+    const filteredOptions = suggestions ?? options.filter(opt =>
         String(opt).toLowerCase().includes(search.toLowerCase())
     );
 
@@ -128,6 +143,7 @@ const FilterSection = ({
     uniqueModels,
     uniqueCountries,
     uniqueConditions,
+    searchFilters,
     resetFilters
 }) => {
     const activeFiltersCount = filters.builders.length + filters.models.length + filters.countries.length + filters.conditions.length;
@@ -161,6 +177,8 @@ const FilterSection = ({
                 {/* Row 1: Primary Selectors */}
                 <MultiSelect
                     label="Builders"
+                    field="builders"
+                    filters={searchFilters}
                     options={uniqueBuilders.sort()}
                     selected={filters.builders}
                     onChange={(newVal) => setFilters({ ...filters, builders: newVal })}
@@ -168,6 +186,8 @@ const FilterSection = ({
 
                 <MultiSelect
                     label="Models"
+                    field="models"
+                    filters={searchFilters}
                     options={uniqueModels.sort()}
                     selected={filters.models}
                     onChange={(newVal) => setFilters({ ...filters, models: newVal })}
@@ -175,6 +195,8 @@ const FilterSection = ({
 
                 <MultiSelect
                     label="Location"
+                    field="countries"
+                    filters={searchFilters}
                     options={uniqueCountries ? uniqueCountries.sort() : []}
                     selected={filters.countries}
                     onChange={(newVal) => setFilters({ ...filters, countries: newVal })}
@@ -183,6 +205,8 @@ const FilterSection = ({
                 {uniqueConditions && uniqueConditions.length > 0 ? (
                     <MultiSelect
                         label="Condition"
+                        field="conditions"
+                        filters={searchFilters}
                         options={uniqueConditions.sort()}
                         selected={filters.conditions}
                         onChange={(newVal) => setFilters({ ...filters, conditions: newVal })}
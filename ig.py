@@ -1,318 +1,620 @@
-import requests
-import random
-from PIL import Image, ImageDraw, ImageFont, ImageOps, ImageEnhance
-from io import BytesIO
-import textwrap
-import os
-import datetime
-import math
-
-# --- CONFIGURAZIONE ---
-API_TOKEN = "Bearer 4b84405e-5034-42d2-aac3-6a6275c826d1"
-BASE_URL = "https://batoo.api.digibusiness.it/Navis2WS/v2/boats"
-
-# --- FILTRI RICERCA ---
-PRICE_FROM = 600000
-PRICE_TO = 3000000
-YEAR_FROM = 2010
-YEAR_TO = 2025
-LENGTH_FROM = 5.0
-LENGTH_TO = 15.0
-
-# --- SELEZIONE ---
-SELECTION_NUMBER = 2
-PAGE_SIZE = 50
-
-# Configurazione Grafica
-W, H = 1080, 1350
-COLORE_SFONDO = "#F5F5F5" # Grigio chiarissimo per lo sfondo generale
-COLORE_CARD = "#FFFFFF"   # Bianco per l'area testo
-COLORE_TESTO_TITOLO = "#111111"
-COLORE_TESTO_ACCENT = "#1e3a8a" # Blu
-COLORE_TESTO_PREZZO = "#000000"
-COLORE_TESTO_SPECS = "#666666"
-FONT_PATH = "BricolageGrotesque.ttf"
-
-def get_best_boats(count=6):
-    """Scarica tutti i dati delle barche gestendo la paginazione."""
-    headers = {'Authorization': API_TOKEN, 'Accept': 'application/json'}
-    print(f"📡 Cercando barche (Price: {PRICE_FROM}-{PRICE_TO}, Year: {YEAR_FROM}-{YEAR_TO}, Len: {LENGTH_FROM}-{LENGTH_TO})...")
-    
-    all_boats_results = []
-    total_results = None
-    current_start = 0
-    
-    # Base params with filters
-    base_params = {
-        "priceFrom": PRICE_FROM,
-        "priceTo": PRICE_TO,
-        "yearFrom": YEAR_FROM,
-        "yearTo": YEAR_TO,
-        "lengthFrom": LENGTH_FROM,
-        "lengthTo": LENGTH_TO
-    }
-    
-    print("🚀 Inizio: Recupero conteggio totale e gestione paginazione...")
-    
-    try:
-        # 1. Chiamata iniziale
-        params = base_params.copy()
-        params.update({'start': current_start, 'limit': PAGE_SIZE})
-        
-        response = requests.get(BASE_URL, headers=headers, params=params)
-        response.raise_for_status() 
-        first_data = response.json()
-        
-        total_results = first_data.get('TotalResults')
-        results_list = first_data.get('Results')
-
-        if total_results is None or not isinstance(results_list, list):
-            print("ERRORE: La risposta API non ha i campi attesi.")
-            return []
-        
-        all_boats_results.extend(results_list)
-        print(f"TotalResults: {total_results}. Limite per richiesta: {PAGE_SIZE}")
-
-        # Calcola pagine rimanenti
-        num_remaining_pages = math.ceil(total_results / PAGE_SIZE) - 1
-        
-        # 2. Ciclo di paginazione
-        for i in range(num_remaining_pages):
-            current_start += PAGE_SIZE
-            params_next = base_params.copy()
-            params_next.update({'start': current_start, 'limit': PAGE_SIZE})
-            
-            print(f"   Recupero pagina {i + 2} di {num_remaining_pages + 1}... (Offset: {current_start})")
-            
-            response_next = requests.get(BASE_URL, headers=headers, params=params_next)
-            response_next.raise_for_status()
-            next_data = response_next.json()
-            
-            all_boats_results.extend(next_data.get('Results', []))
-            
-        print(f"✅ Download completato. Totale barche recuperate: **{len(all_boats_results)}**.")
-        
-        # Filter duplicates just in case
-        unique_boats = []
-        seen_ids = set()
-        for boat in all_boats_results:
-            bid = boat.get("BoatID")
-            if bid and bid not in seen_ids:
-                seen_ids.add(bid)
-                unique_boats.append(boat)
-        
-        print(f"✅ Barche uniche: {len(unique_boats)}")
-        
-        if len(unique_boats) < count:
-            return unique_boats
-        return random.sample(unique_boats, count)
-
-    except requests.exceptions.HTTPError as err:
-        print(f"\n❌ ERRORE HTTP: {err}")
-    except Exception as e:
-        print(f"\n❌ Errore inaspettato: {e}")
-    return []
-
-def get_boat_details(boat_id):
-    url = f"{BASE_URL}/{boat_id}"
-    headers = {'Authorization': API_TOKEN, 'Accept': 'application/json'}
-    try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        print(f"❌ Errore API Dettagli: {e}")
-        return None
-
-def get_vat_label(vat_string):
-    # Default: VAT Excluded if empty
-    if not vat_string: return "VAT Excluded"
-    vat_lower = vat_string.lower()
-    
-    # VAT Paid (Tasse Incluse)
-    if any(x in vat_lower for x in ["inclusa", "incl.", "pagata"]):
-        if "non pagata" not in vat_lower: # Exclude "non pagata"
-            return "VAT Paid"
-            
-    # VAT Excluded (Tasse Escluse)
-    if any(x in vat_lower for x in ["esclusa", "escl.", "esente", "esposta", "non pagata", "se dovuta"]):
-        return "VAT Excluded"
-        
-    return "VAT Excluded"
-
-def scarica_immagine(url):
-    try:
-        resp = requests.get(url)
-        resp.raise_for_status()
-        return Image.open(BytesIO(resp.content)).convert("RGB")
-    except Exception as e:
-        return None
-
-def crea_carosello_settimanale(lista_barche_summary):
-    if not lista_barche_summary: return
-
-    dettagli_barche = []
-    print("📡 Scaricando dettagli barche...")
-    for b in lista_barche_summary:
-        d = get_boat_details(b["BoatID"])
-        if d: dettagli_barche.append(d)
-    
-    if not dettagli_barche: return
-
-    # Setup Font
-    try:
-        font_cover_title = ImageFont.truetype(FONT_PATH, 130)
-        font_cover_sub = ImageFont.truetype(FONT_PATH, 50)
-        font_boat_name = ImageFont.truetype(FONT_PATH, 50) # Reduced from 65
-        font_boat_price = ImageFont.truetype(FONT_PATH, 55)
-        font_boat_vat = ImageFont.truetype(FONT_PATH, 30) # Font per VAT
-        font_boat_specs = ImageFont.truetype(FONT_PATH, 40)
-        font_footer = ImageFont.truetype(FONT_PATH, 25)
-    except:
-        font_cover_title = ImageFont.load_default()
-        font_cover_sub = ImageFont.load_default()
-        font_boat_name = ImageFont.load_default()
-        font_boat_price = ImageFont.load_default()
-        font_boat_vat = ImageFont.load_default()
-        font_boat_specs = ImageFont.load_default()
-        font_footer = ImageFont.load_default()
-
-    output_dir = f"carosello_selection_{SELECTION_NUMBER}"
-    os.makedirs(output_dir, exist_ok=True)
-
-    # --- SLIDE 1: COPERTINA ---
-    print("🎨 Creazione Slide 1 (Copertina)...")
-    cover_img_url = dettagli_barche[0].get("Images", [])[0].get("ImageUrl")
-    if cover_img_url: cover_img_url += ".2048.jpg"
-    cover_bg = scarica_immagine(cover_img_url)
-    
-    if cover_bg:
-        cover_bg = ImageOps.fit(cover_bg, (W, H), centering=(0.5, 0.5))
-        enhancer = ImageEnhance.Brightness(cover_bg)
-        cover_bg = enhancer.enhance(0.4)
-    else:
-        cover_bg = Image.new('RGB', (W, H), color="#111111")
-
-    canvas = cover_bg
-    draw = ImageDraw.Draw(canvas)
-    
-    border_margin = 40
-    draw.rectangle([border_margin, border_margin, W-border_margin, H-border_margin], outline="white", width=5)
-    
-    title = "BOATS\nSELECTION\nOF THE\nWEEK"
-    draw.multiline_text((W/2, H/2), title, font=font_cover_title, fill="white", anchor="mm", align="center", spacing=30)
-    
-    sub = f"SELECTION #{SELECTION_NUMBER}"
-    draw.text((W/2, H - 150), sub, font=font_cover_sub, fill="#DDDDDD", anchor="mm")
-    
-    canvas.save(f"{output_dir}/slide_1.jpg", quality=95)
-
-    # --- SLIDE 2-7: BARCHE (New Design) ---
-    for i, details in enumerate(dettagli_barche):
-        print(f"🎨 Creazione Slide {i+2} ({details.get('Model')})...")
-        
-        builder = details.get("Builder", "").upper()
-        model = details.get("Model", "").upper()
-        price = details.get("SellPriceFormatted", "Price on request")
-        vat_raw = details.get("SellPriceVAT", "")
-        vat_label = get_vat_label(vat_raw)
-        year = str(details.get("YearBuilt", "N/A"))
-        length = f"{details.get('Length', 'N/A')}m"
-        
-        # Use Country for location
-        location = details.get("Country", "Location N/A")
-        if location and len(location) > 20: location = location.split(",")[0]
-        
-        # Broker Info
-        agency_name = details.get("AgencyName", "Timone Yachts")
-        agency_phone = details.get("AgencyPhone", "")
-        
-        canvas = Image.new('RGB', (W, H), color=COLORE_SFONDO)
-        draw = ImageDraw.Draw(canvas)
-        
-        # 1. Image Area (Top 65%)
-        img_h = int(H * 0.65)
-        
-        images_data = details.get("Images", [])
-        images_to_show = images_data[:3]
-        
-        if images_to_show:
-            pil_images = []
-            for img_d in images_to_show:
-                url = img_d.get("ImageUrl")
-                if url:
-                    url += ".2048.jpg"
-                    p_img = scarica_immagine(url)
-                    if p_img: pil_images.append(p_img)
-            
-            if pil_images:
-                if len(pil_images) == 1:
-                    img_resized = ImageOps.fit(pil_images[0], (W, img_h), centering=(0.5, 0.5))
-                    canvas.paste(img_resized, (0, 0))
-                elif len(pil_images) == 2:
-                    h1 = img_h // 2
-                    h2 = img_h - h1
-                    i1 = ImageOps.fit(pil_images[0], (W, h1), centering=(0.5, 0.5))
-                    i2 = ImageOps.fit(pil_images[1], (W, h2), centering=(0.5, 0.5))
-                    canvas.paste(i1, (0, 0))
-                    canvas.paste(i2, (0, h1))
-                    draw.line([(0, h1), (W, h1)], fill="white", width=4)
-                else:
-                    h_main = int(img_h * 0.6)
-                    h_sub = img_h - h_main
-                    w_sub = W // 2
-                    i_main = ImageOps.fit(pil_images[0], (W, h_main), centering=(0.5, 0.5))
-                    canvas.paste(i_main, (0, 0))
-                    i_sub1 = ImageOps.fit(pil_images[1], (w_sub, h_sub), centering=(0.5, 0.5))
-                    canvas.paste(i_sub1, (0, h_main))
-                    i_sub2 = ImageOps.fit(pil_images[2], (W - w_sub, h_sub), centering=(0.5, 0.5))
-                    canvas.paste(i_sub2, (w_sub, h_main))
-                    draw.line([(0, h_main), (W, h_main)], fill="white", width=4)
-                    draw.line([(w_sub, h_main), (w_sub, img_h)], fill="white", width=4)
-
-        # 2. Info Area (Bottom 35%)
-        draw.rectangle([0, img_h, W, H], fill=COLORE_CARD)
-        
-        margin_x = 60
-        cursor_y = img_h + 60
-        
-        # Force 2 lines: Builder on Line 1, Model on Line 2
-        # Truncate each to ensure they fit in one line (approx 35 chars with smaller font)
-        line1 = textwrap.shorten(builder, width=35, placeholder="...")
-        line2 = textwrap.shorten(model, width=35, placeholder="...")
-        title_lines = [line1, line2]
-            
-        for line in title_lines:
-            draw.text((margin_x, cursor_y), line, font=font_boat_name, fill=COLORE_TESTO_TITOLO)
-            cursor_y += 60 # Reduced spacing for smaller font
-            
-        # Fixed position for Specs
-        specs_y = img_h + 60 + (2 * 60) + 20
-        
-        specs_text = f"{year}  •  {length}  •  {location}"
-        draw.text((margin_x, specs_y), specs_text, font=font_boat_specs, fill=COLORE_TESTO_SPECS)
-        
-        # Price and VAT Alignment (Baseline)
-        price_baseline_y = H - 120
-        draw.text((margin_x, price_baseline_y), price, font=font_boat_price, fill=COLORE_TESTO_ACCENT, anchor="ls")
-        
-        if vat_label:
-            bbox_p = draw.textbbox((0, 0), price, font=font_boat_price)
-            w_p = bbox_p[2] - bbox_p[0]
-            # Align VAT baseline with Price baseline
-            draw.text((margin_x + w_p + 20, price_baseline_y), vat_label, font=font_boat_vat, fill="#666666", anchor="ls")
-        
-        # Broker Info
-        broker_text = f"{agency_name}"
-        if agency_phone: broker_text += f" • {agency_phone}"
-        draw.text((margin_x, H - 40), broker_text, font=font_footer, fill="#999999", anchor="ls")
-        
-        draw.text((W - 200, H - 40), f"{i+1}/6 • Batoo.it", font=font_footer, fill="#999999", anchor="ls")
-        
-        canvas.save(f"{output_dir}/slide_{i+2}.jpg", quality=95)
-
-if __name__ == "__main__":
-    boats = get_best_boats(6)
-    if boats:
-        crea_carosello_settimanale(boats)
-        print("\n✨ Carosello settimanale generato!")
\ No newline at end of file
+import requests
+from PIL import Image, ImageDraw, ImageFont, ImageEnhance
+from io import BytesIO
+import textwrap
+import os
+import math
+import bisect
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import lru_cache
+
+from image_cache import ImageCache
+
+# Moduli condivisi con il backend (metriche, snapshot, indice), come in benchmarks/common.py
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+import metrics
+from normalize import normalize_boats, price_per_meter, vat_label as etichetta_iva
+from upstream import UpstreamClient, UpstreamError
+
+# --- CONFIGURAZIONE ---
+# Token e URL dell'API remota stanno in backend/upstream.py (API_TOKEN, UPSTREAM_URL)
+
+# --- FILTRI RICERCA ---
+PRICE_FROM = 600000
+PRICE_TO = 3000000
+YEAR_FROM = 2010
+YEAR_TO = 2025
+LENGTH_FROM = 5.0
+LENGTH_TO = 15.0
+
+# --- SELEZIONE ---
+SELECTION_NUMBER = 2
+PAGE_SIZE = 50
+# Salta le barche già usate nelle selezioni generate in precedenza (anche con --escludi-pubblicate)
+ESCLUDI_PUBBLICATE = False
+
+# --- DATI LOCALI ---
+# La selezione parte dal dataset già sincronizzato dal backend (API locale o
+# snapshot su disco); il crawl dell'API remota resta solo come ultima risorsa.
+BACKEND_URL = os.environ.get("IG_BACKEND_URL", "http://localhost:8000")
+SNAPSHOT_PATH = os.path.join(BACKEND_DIR, "boats_cache.snap")
+MAX_DATA_AGE = float(os.environ.get("IG_MAX_DATA_AGE_HOURS", 24)) * 3600
+BACKEND_PAGE_SIZE = 500
+
+# Configurazione Grafica
+W, H = 1080, 1350
+COLORE_SFONDO = "#F5F5F5" # Grigio chiarissimo per lo sfondo generale
+COLORE_CARD = "#FFFFFF"   # Bianco per l'area testo
+COLORE_TESTO_TITOLO = "#111111"
+COLORE_TESTO_ACCENT = "#1e3a8a" # Blu
+COLORE_TESTO_PREZZO = "#000000"
+COLORE_TESTO_SPECS = "#666666"
+FONT_PATH = "BricolageGrotesque.ttf"
+
+# --- PIPELINE ---
+DOWNLOAD_WORKERS = 8                               # download paralleli (dettagli + immagini)
+RENDER_PROCESSES = min(4, os.cpu_count() or 1)     # 0/1 = rendering nel processo principale
+USE_DRAFT = True                                   # decodifica JPEG ridotta alla dimensione del riquadro
+IMAGE_SIZE_SUFFIX = ".2048.jpg"
+
+# Sessione condivisa (keep-alive) per backend locale e immagini
+SESSION = requests.Session()
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=DOWNLOAD_WORKERS))
+
+# Client dell'API remota condiviso col backend: retry con backoff, circuit breaker
+UPSTREAM = UpstreamClient(pool_size=DOWNLOAD_WORKERS)
+
+# Cache su disco di originali e riquadri già ritagliati (vedi image_cache.py)
+IMAGE_CACHE = ImageCache()
+
+# --- METRICHE ---
+# Stesso formato di /metrics del backend; con IG_METRICS_FILE vengono scritte
+# a fine esecuzione (es. per il textfile collector di node_exporter)
+METRICS_FILE = os.environ.get("IG_METRICS_FILE")
+IG_METRICS = metrics.Registry()
+STAGE_SECONDS = metrics.Histogram("ig_stage_seconds", "Carousel pipeline time per item and stage", ["stage"], registry=IG_METRICS)
+IMAGE_LOOKUPS = metrics.Counter("ig_image_cache_lookups", "Image cache lookups by result", ["result"], registry=IG_METRICS)
+RUN_SECONDS = metrics.Gauge("ig_run_seconds", "Wall time of the last carousel run", registry=IG_METRICS)
+
+def filtri_selezione():
+    """Filtri della selezione nel formato dei filtri della dashboard."""
+    return {
+        "priceFrom": PRICE_FROM,
+        "priceTo": PRICE_TO,
+        "yearFrom": YEAR_FROM,
+        "yearTo": YEAR_TO,
+        "lengthFrom": LENGTH_FROM,
+        "lengthTo": LENGTH_TO,
+    }
+
+def barche_da_backend():
+    """Barche filtrate dall'API del backend, se è raggiungibile e aggiornata."""
+    try:
+        status = SESSION.get(f"{BACKEND_URL}/api/status", timeout=2).json()
+    except Exception:
+        return None
+    synced_at = status.get("synced_at")
+    if not synced_at or time.time() - synced_at > MAX_DATA_AGE or not status.get("boat_count"):
+        print("⚠️  Dati del backend assenti o non aggiornati")
+        return None
+
+    barche = []
+    params = {**filtri_selezione(), "limit": BACKEND_PAGE_SIZE, "facets": "false"}
+    try:
+        while True:
+            params["offset"] = len(barche)
+            page = SESSION.get(f"{BACKEND_URL}/api/boats/query", params=params, timeout=30).json()
+            barche.extend(page["results"])
+            if not page["results"] or len(barche) >= page["total"]:
+                break
+    except Exception as e:
+        print(f"⚠️  Query al backend fallita: {e}")
+        return None
+    print(f"🗄  {len(barche)} barche dal backend ({BACKEND_URL})")
+    return barche
+
+def barche_da_snapshot(path=SNAPSHOT_PATH):
+    """Barche filtrate dallo snapshot del backend, se esiste ed è aggiornato."""
+    if not os.path.exists(path) or time.time() - os.path.getmtime(path) > MAX_DATA_AGE:
+        return None
+    backend_dir = os.path.dirname(path)
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    try:
+        from snapshot import read_snapshot
+        from query import BoatIndex
+
+        boats = read_snapshot(path).boats()
+    except Exception as e:
+        print(f"⚠️  Snapshot non leggibile: {e}")
+        return None
+    # Stessa semantica dei filtri della dashboard
+    positions = BoatIndex(boats).select(filtri_selezione())
+    barche = boats if positions is None else [boats[pos] for pos in positions]
+    print(f"🗄  {len(barche)} barche dallo snapshot locale ({len(boats)} totali)")
+    return barche
+
+def boat_ids_pubblicati(output_root="."):
+    """BoatID già usati nelle selezioni generate in precedenza."""
+    ids = set()
+    for name in os.listdir(output_root):
+        if name.startswith("carosello_selection_"):
+            numero = name.rsplit("_", 1)[-1]
+            for details in ricarica_dettagli(numero, output_root) or []:
+                ids.add(details.get("BoatID"))
+    return ids
+
+def classifica_barche(barche, count=6, escludi=()):
+    """
+    Sceglie le `count` barche migliori invece di un campione casuale:
+    punteggio su anno (più recente è meglio), rapporto prezzo/metro rispetto
+    alle altre candidate (più conveniente è meglio) e presenza della foto,
+    con al massimo una barca per cantiere finché ce ne sono di diversi.
+    Le barche in `escludi` vengono scartate finché ne restano altre.
+    """
+    candidate = [b for b in barche if b.get("BoatID") not in escludi] or list(barche)
+    if not candidate: return []
+
+    # Prezzo al metro in euro, calcolato all'ingestione (normalize.py) come nella dashboard
+    prezzo_metro = price_per_meter
+    valori = sorted(v for v in map(prezzo_metro, candidate) if v is not None)
+
+    def punteggio(b):
+        year = b.get("YearBuilt") if isinstance(b.get("YearBuilt"), (int, float)) else YEAR_FROM
+        anno = min(max((year - YEAR_FROM) / max(YEAR_TO - YEAR_FROM, 1), 0), 1)
+        ppm = prezzo_metro(b)
+        # Percentile invertito: la più conveniente vale 1
+        valore = 1 - bisect.bisect_left(valori, ppm) / len(valori) if ppm is not None else 0
+        foto = 1 if b.get("ImageUrl") else 0
+        return 0.45 * anno + 0.45 * valore + 0.1 * foto
+
+    ordinate = sorted(candidate, key=punteggio, reverse=True)
+    scelte, cantieri = [], set()
+    for b in ordinate:
+        if len(scelte) == count: break
+        if b.get("Builder") not in cantieri:
+            scelte.append(b)
+            cantieri.add(b.get("Builder"))
+    for b in ordinate:
+        if len(scelte) == count: break
+        if b not in scelte:
+            scelte.append(b)
+    return scelte
+
+def get_best_boats(count=6, escludi_pubblicate=ESCLUDI_PUBBLICATE):
+    """
+    Le migliori `count` barche che rispettano i filtri: dal backend locale
+    (API o snapshot) quando i dati sono aggiornati, altrimenti dall'API remota.
+    Con `escludi_pubblicate` salta quelle già usate nelle selezioni precedenti.
+    """
+    barche = barche_da_backend()
+    if barche is None:
+        barche = barche_da_snapshot()
+    if barche is None:
+        barche = scarica_barche_remote()
+    escludi = boat_ids_pubblicati() if escludi_pubblicate else ()
+    return classifica_barche(barche, count, escludi=escludi)
+
+def scarica_barche_remote():
+    """Scarica tutti i dati delle barche gestendo la paginazione."""
+    print(f"📡 Cercando barche (Price: {PRICE_FROM}-{PRICE_TO}, Year: {YEAR_FROM}-{YEAR_TO}, Len: {LENGTH_FROM}-{LENGTH_TO})...")
+    
+    # Base params with filters
+    base_params = {
+        "priceFrom": PRICE_FROM,
+        "priceTo": PRICE_TO,
+        "yearFrom": YEAR_FROM,
+        "yearTo": YEAR_TO,
+        "lengthFrom": LENGTH_FROM,
+        "lengthTo": LENGTH_TO
+    }
+    
+    print("🚀 Inizio: Recupero conteggio totale e gestione paginazione...")
+    
+    try:
+        # 1. Chiamata iniziale (i retry sono gestiti dal client)
+        first_data = UPSTREAM.fetch_page(0, PAGE_SIZE, params=base_params)
+        total_results = first_data.get('TotalResults')
+        if total_results is None:
+            print("ERRORE: La risposta API non ha i campi attesi.")
+            return []
+        
+        pages = {0: normalize_boats(first_data['Results'])}
+        print(f"TotalResults: {total_results}. Limite per richiesta: {PAGE_SIZE}")
+
+        # 2. Ciclo di paginazione: le pagine fallite vengono riprovate alla fine
+        offsets = list(range(PAGE_SIZE, math.ceil(total_results / PAGE_SIZE) * PAGE_SIZE, PAGE_SIZE))
+        for tentativo in range(2):
+            falliti = []
+            for start in offsets:
+                print(f"   Recupero pagina {start // PAGE_SIZE + 1} di {len(offsets) + 1}... (Offset: {start})")
+                try:
+                    pages[start] = normalize_boats(UPSTREAM.fetch_page(start, PAGE_SIZE, params=base_params)['Results'])
+                except UpstreamError as e:
+                    print(f"   ⚠️ Pagina {start} non scaricata: {e}")
+                    falliti.append(start)
+            offsets = falliti
+            if not offsets:
+                break
+            print(f"🔁 Riprovo {len(offsets)} pagine fallite...")
+        
+        all_boats_results = [b for start in sorted(pages) for b in pages[start]]
+        print(f"✅ Download completato. Totale barche recuperate: **{len(all_boats_results)}**.")
+        if offsets:
+            print(f"⚠️ {len(offsets)} pagine mancanti: la selezione potrebbe essere incompleta.")
+        
+        # Filter duplicates just in case
+        unique_boats = []
+        seen_ids = set()
+        for boat in all_boats_results:
+            bid = boat.get("BoatID")
+            if bid and bid not in seen_ids:
+                seen_ids.add(bid)
+                unique_boats.append(boat)
+        
+        print(f"✅ Barche uniche: {len(unique_boats)}")
+        return unique_boats
+
+    except UpstreamError as err:
+        print(f"\n❌ ERRORE API: {err}")
+    except Exception as e:
+        print(f"\n❌ Errore inaspettato: {e}")
+    return []
+
+def get_boat_details(boat_id):
+    try:
+        return UPSTREAM.get_details(boat_id)
+    except UpstreamError as e:
+        print(f"❌ Errore API Dettagli: {e}")
+        return None
+
+def scarica_bytes(url):
+    """Scarica l'immagine grezza (JPEG) senza decodificarla."""
+    if not url: return None
+    try:
+        resp = SESSION.get(url, timeout=30)
+        resp.raise_for_status()
+        return resp.content
+    except Exception as e:
+        return None
+
+def apri_immagine(data, size=None):
+    """
+    Decodifica un JPEG. Con `size` usa draft(): il decoder salta direttamente
+    alla scala 1/2, 1/4 o 1/8 più piccola che copre ancora il riquadro.
+    """
+    if not data: return None
+    try:
+        img = Image.open(BytesIO(data))
+        if size and USE_DRAFT:
+            img.draft("RGB", size)
+        return img.convert("RGB")
+    except Exception as e:
+        return None
+
+def scarica_immagine(url, size=None):
+    return apri_immagine(scarica_bytes(url), size)
+
+def image_urls(details, limit=3):
+    urls = []
+    for img_d in details.get("Images", [])[:limit]:
+        url = img_d.get("ImageUrl")
+        if url: urls.append(url + IMAGE_SIZE_SUFFIX)
+    return urls
+
+@lru_cache(maxsize=1)
+def load_fonts():
+    # Caricati una volta per processo di rendering
+    try:
+        return {
+            "cover_title": ImageFont.truetype(FONT_PATH, 130),
+            "cover_sub": ImageFont.truetype(FONT_PATH, 50),
+            "boat_name": ImageFont.truetype(FONT_PATH, 50), # Reduced from 65
+            "boat_price": ImageFont.truetype(FONT_PATH, 55),
+            "boat_vat": ImageFont.truetype(FONT_PATH, 30), # Font per VAT
+            "boat_specs": ImageFont.truetype(FONT_PATH, 40),
+            "footer": ImageFont.truetype(FONT_PATH, 25),
+        }
+    except:
+        default = ImageFont.load_default()
+        return {name: default for name in ("cover_title", "cover_sub", "boat_name", "boat_price", "boat_vat", "boat_specs", "footer")}
+
+def image_layout(count, img_h):
+    """Riquadri (x, y, w, h) e linee divisorie per 1, 2 o 3 immagini nell'area foto."""
+    if count == 1:
+        return [(0, 0, W, img_h)], []
+    if count == 2:
+        h1 = img_h // 2
+        h2 = img_h - h1
+        return [(0, 0, W, h1), (0, h1, W, h2)], [[(0, h1), (W, h1)]]
+    h_main = int(img_h * 0.6)
+    h_sub = img_h - h_main
+    w_sub = W // 2
+    boxes = [(0, 0, W, h_main), (0, h_main, w_sub, h_sub), (w_sub, h_main, W - w_sub, h_sub)]
+    lines = [[(0, h_main), (W, h_main)], [(w_sub, h_main), (w_sub, img_h)]]
+    return boxes, lines
+
+def carica_riquadri(cache, keys, img_h, timings):
+    """
+    Riquadri già ritagliati per l'area foto. Il layout dipende da quante
+    immagini sono valide: se un originale è illeggibile si ricalcola sulle altre.
+    """
+    keys = [k for k in keys if k][:3]
+    while keys:
+        boxes, lines = image_layout(len(keys), img_h)
+        tiles = [cache.tile(key, (w, h), draft=USE_DRAFT, timings=timings) for key, (x, y, w, h) in zip(keys, boxes)]
+        if all(tiles):
+            return list(zip(tiles, boxes)), lines
+        keys = [key for key, tile in zip(keys, tiles) if tile]
+    return [], []
+
+def render_cover(cache, cover_key, selection_number, output_path):
+    """Slide 1 (copertina). Gira nel pool di rendering; restituisce i tempi per fase."""
+    timings = Counter()
+    fonts = load_fonts()
+
+    cover_bg = cache.tile(cover_key, (W, H), draft=USE_DRAFT, timings=timings) if cover_key else None
+    
+    t = time.perf_counter()
+    if cover_bg:
+        enhancer = ImageEnhance.Brightness(cover_bg)
+        cover_bg = enhancer.enhance(0.4)
+    else:
+        cover_bg = Image.new('RGB', (W, H), color="#111111")
+    canvas = cover_bg
+    draw = ImageDraw.Draw(canvas)
+    
+    border_margin = 40
+    draw.rectangle([border_margin, border_margin, W-border_margin, H-border_margin], outline="white", width=5)
+    
+    title = "BOATS\nSELECTION\nOF THE\nWEEK"
+    draw.multiline_text((W/2, H/2), title, font=fonts["cover_title"], fill="white", anchor="mm", align="center", spacing=30)
+    
+    sub = f"SELECTION #{selection_number}"
+    draw.text((W/2, H - 150), sub, font=fonts["cover_sub"], fill="#DDDDDD", anchor="mm")
+    timings["draw"] += time.perf_counter() - t
+    
+    t = time.perf_counter()
+    canvas.save(output_path, quality=95)
+    timings["save"] += time.perf_counter() - t
+    return timings
+
+def render_boat_slide(cache, details, image_keys, index, total, output_path):
+    """Slide di una barca (nuovo design). Gira nel pool di rendering; restituisce i tempi per fase."""
+    timings = Counter()
+    fonts = load_fonts()
+
+    builder = details.get("Builder", "").upper()
+    model = details.get("Model", "").upper()
+    price = details.get("SellPriceFormatted", "Price on request")
+    # Etichetta IVA con le stesse regole del campo VATClass del backend
+    vat_label = etichetta_iva(details)
+    year = str(details.get("YearBuilt", "N/A"))
+    length = f"{details.get('Length', 'N/A')}m"
+    
+    # Use Country for location
+    location = details.get("Country", "Location N/A")
+    if location and len(location) > 20: location = location.split(",")[0]
+    
+    # Broker Info
+    agency_name = details.get("AgencyName", "Timone Yachts")
+    agency_phone = details.get("AgencyPhone", "")
+    
+    canvas = Image.new('RGB', (W, H), color=COLORE_SFONDO)
+    draw = ImageDraw.Draw(canvas)
+    
+    # 1. Image Area (Top 65%)
+    img_h = int(H * 0.65)
+    
+    tiles, lines = carica_riquadri(cache, image_keys, img_h, timings)
+
+    t = time.perf_counter()
+    for tile, (x, y, w, h) in tiles:
+        canvas.paste(tile, (x, y))
+    for line in lines:
+        draw.line(line, fill="white", width=4)
+
+    # 2. Info Area (Bottom 35%)
+    draw.rectangle([0, img_h, W, H], fill=COLORE_CARD)
+    
+    margin_x = 60
+    cursor_y = img_h + 60
+    
+    # Force 2 lines: Builder on Line 1, Model on Line 2
+    # Truncate each to ensure they fit in one line (approx 35 chars with smaller font)
+    line1 = textwrap.shorten(builder, width=35, placeholder="...")
+    line2 = textwrap.shorten(model, width=35, placeholder="...")
+    title_lines = [line1, line2]
+        
+    for line in title_lines:
+        draw.text((margin_x, cursor_y), line, font=fonts["boat_name"], fill=COLORE_TESTO_TITOLO)
+        cursor_y += 60 # Reduced spacing for smaller font
+        
+    # Fixed position for Specs
+    specs_y = img_h + 60 + (2 * 60) + 20
+    
+    specs_text = f"{year}  •  {length}  •  {location}"
+    draw.text((margin_x, specs_y), specs_text, font=fonts["boat_specs"], fill=COLORE_TESTO_SPECS)
+    
+    # Price and VAT Alignment (Baseline)
+    price_baseline_y = H - 120
+    draw.text((margin_x, price_baseline_y), price, font=fonts["boat_price"], fill=COLORE_TESTO_ACCENT, anchor="ls")
+    
+    if vat_label:
+        bbox_p = draw.textbbox((0, 0), price, font=fonts["boat_price"])
+        w_p = bbox_p[2] - bbox_p[0]
+        # Align VAT baseline with Price baseline
+        draw.text((margin_x + w_p + 20, price_baseline_y), vat_label, font=fonts["boat_vat"], fill="#666666", anchor="ls")
+    
+    # Broker Info
+    broker_text = f"{agency_name}"
+    if agency_phone: broker_text += f" • {agency_phone}"
+    draw.text((margin_x, H - 40), broker_text, font=fonts["footer"], fill="#999999", anchor="ls")
+    
+    draw.text((W - 200, H - 40), f"{index+1}/{total} • Batoo.it", font=fonts["footer"], fill="#999999", anchor="ls")
+    timings["draw"] += time.perf_counter() - t
+    
+    t = time.perf_counter()
+    canvas.save(output_path, quality=95)
+    timings["save"] += time.perf_counter() - t
+    return timings
+
+class _InlineExecutor:
+    """Esecutore sincrono, usato quando RENDER_PROCESSES <= 1."""
+    def submit(self, fn, *args):
+        from concurrent.futures import Future
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+def _render_pool():
+    if RENDER_PROCESSES > 1:
+        return ProcessPoolExecutor(max_workers=RENDER_PROCESSES)
+    return _InlineExecutor()
+
+# I worker di io_pool sommano i tempi nello stesso Counter
+_TIMINGS_LOCK = threading.Lock()
+
+def _timed(timings, stage, fn, *args):
+    t = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        elapsed = time.perf_counter() - t
+        with _TIMINGS_LOCK:
+            timings[stage] += elapsed
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+
+def scrivi_metriche(path=None):
+    path = path or METRICS_FILE
+    if not path: return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(IG_METRICS.render())
+    os.replace(tmp_path, path)
+
+DETAILS_FILE = "dettagli.json"
+
+def ricarica_dettagli(numero, output_root="."):
+    """Dettagli salvati dall'ultima generazione della selezione, o None."""
+    path = os.path.join(output_root, f"carosello_selection_{numero}", DETAILS_FILE)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def crea_caroselli(selezioni, output_root=".", rigenera=False):
+    """
+    Genera più caroselli in un'unica esecuzione.
+    `selezioni` è una lista di (numero_selezione, lista_barche_summary).
+    Con `rigenera` le selezioni già generate riusano i dettagli salvati in
+    dettagli.json e le immagini in cache: nessuna chiamata di rete.
+
+    Pipeline: i dettagli di tutte le selezioni vengono scaricati in parallelo,
+    poi le immagini (solo quelle che non sono già in IMAGE_CACHE); ogni slide
+    va al pool di rendering appena le sue immagini sono pronte. Restituisce i
+    tempi per fase (secondi, sommati sui worker) più il tempo totale in "wall".
+    """
+    timings = Counter()
+    start = time.perf_counter()
+    cache = IMAGE_CACHE
+    hits_before, misses_before = cache.hits, cache.misses
+    image_jobs = {}
+
+    def immagine(url):
+        # Un solo download per URL, anche se la copertina riusa la prima foto
+        if url not in image_jobs:
+            image_jobs[url] = io_pool.submit(_timed, timings, "fetch_images", cache.fetch, url, scarica_bytes)
+        return image_jobs[url]
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as io_pool, _render_pool() as render_pool:
+        print("📡 Scaricando dettagli barche...")
+        detail_jobs = []
+        for numero, barche in selezioni:
+            salvati = ricarica_dettagli(numero, output_root) if rigenera else None
+            if salvati is not None:
+                detail_jobs.append((numero, salvati, False))
+            elif barche:
+                futures = [io_pool.submit(_timed, timings, "fetch_details", get_boat_details, b["BoatID"]) for b in barche]
+                detail_jobs.append((numero, futures, True))
+        selections = [
+            (numero, [d for d in (f.result() for f in futures) if d] if remoti else futures)
+            for numero, futures, remoti in detail_jobs
+        ]
+
+        # Tutti i download partono subito; il rendering segue nell'ordine delle slide
+        jobs = []
+        for numero, dettagli_barche in selections:
+            if not dettagli_barche: continue
+            output_dir = os.path.join(output_root, f"carosello_selection_{numero}")
+            os.makedirs(output_dir, exist_ok=True)
+            with open(os.path.join(output_dir, DETAILS_FILE), "w") as f:
+                json.dump(dettagli_barche, f)
+            cover_urls = image_urls(dettagli_barche[0], limit=1)
+            cover = immagine(cover_urls[0] if cover_urls else None)
+            slides = [(details, [immagine(url) for url in image_urls(details)]) for details in dettagli_barche]
+            jobs.append((numero, output_dir, cover, slides))
+
+        renders = []
+        for numero, output_dir, cover, slides in jobs:
+            print(f"🎨 Creazione Selezione #{numero}: copertina + {len(slides)} slide...")
+            renders.append(render_pool.submit(render_cover, cache, cover.result(), numero, f"{output_dir}/slide_1.jpg"))
+            for i, (details, image_futures) in enumerate(slides):
+                image_keys = [f.result() for f in image_futures]
+                renders.append(render_pool.submit(
+                    render_boat_slide, cache, details, image_keys, i, len(slides), f"{output_dir}/slide_{i+2}.jpg"
+                ))
+
+        for render in renders:
+            slide_timings = render.result()
+            with _TIMINGS_LOCK:
+                timings.update(slide_timings)
+            for stage, elapsed in slide_timings.items():
+                STAGE_SECONDS.observe(elapsed, stage=stage)
+
+    hits, misses = cache.hits - hits_before, cache.misses - misses_before
+    cache.evict()
+    print(f"🗂  Cache immagini: {hits} dal disco, {misses} scaricate")
+    IMAGE_LOOKUPS.inc(hits, result="hit")
+    IMAGE_LOOKUPS.inc(misses, result="miss")
+
+    timings["wall"] = time.perf_counter() - start
+    RUN_SECONDS.set(timings["wall"])
+    scrivi_metriche()
+    return dict(timings)
+
+def crea_carosello_settimanale(lista_barche_summary, selection_number=SELECTION_NUMBER):
+    if not lista_barche_summary: return
+    return crea_caroselli([(selection_number, lista_barche_summary)])
+
+if __name__ == "__main__":
+    if "--rigenera" in sys.argv:
+        # Stessa selezione (dettagli + immagini dalla cache), es. dopo una modifica al testo
+        timings = crea_caroselli([(SELECTION_NUMBER, [])], rigenera=True)
+        print(f"\n✨ Selezione #{SELECTION_NUMBER} rigenerata!")
+        print("⏱  " + ", ".join(f"{k}: {v:.2f}s" for k, v in timings.items()))
+        sys.exit(0)
+
+    boats = get_best_boats(6, escludi_pubblicate=ESCLUDI_PUBBLICATE or "--escludi-pubblicate" in sys.argv)
+    if boats:
+        timings = crea_carosello_settimanale(boats)
+        print("\n✨ Carosello settimanale generato!")
+        if timings:
+            print("⏱  " + ", ".join(f"{k}: {v:.2f}s" for k, v in timings.items()))
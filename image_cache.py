@@ -0,0 +1,209 @@
+"""
+Persistent image cache for the carousel generator (ig.py).
+
+Downloaded images are stored once under the SHA-256 of their bytes, and a
+URL index maps each image URL to that content key, so an image that shows up
+under several URLs is kept once and a re-render never goes back to the
+network. The resized and cropped tiles the slide layouts paste (full page,
+full width, half height, half width) are materialised lazily next to the
+original the first time a layout asks for that size, and reused afterwards.
+
+    cache/
+      index.json               url -> content key
+      originals/ab/abcd….jpg   downloaded bytes, content-addressed
+      tiles/ab/abcd…_1080x877.jpg
+
+Recency is the file mtime (bumped on every hit), so render processes can
+share the cache without coordinating; evict() drops the least recently used
+files until the cache fits its size budget. Writes go to a temp file and are
+renamed into place, so concurrent renders of the same tile are harmless.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+DEFAULT_ROOT = os.environ.get("IG_IMAGE_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".image_cache"))
+DEFAULT_MAX_BYTES = int(os.environ.get("IG_IMAGE_CACHE_MB", 1024)) * 1024 * 1024
+TILE_QUALITY = 95
+
+
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+class ImageCache:
+    """Picklable handle on a cache directory; every process opens its own."""
+
+    def __init__(self, root=DEFAULT_ROOT, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index = None
+        self._index_dirty = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        return {"root": self.root, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["root"], state["max_bytes"])
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, "index.json")
+
+    def original_path(self, key):
+        return os.path.join(self.root, "originals", key[:2], f"{key}.jpg")
+
+    def tile_path(self, key, size):
+        return os.path.join(self.root, "tiles", key[:2], f"{key}_{size[0]}x{size[1]}.jpg")
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path) as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def lookup(self, url):
+        """Content key cached for `url`, or None."""
+        with self._lock:
+            key = self._load_index().get(url)
+        if key and os.path.exists(self.original_path(key)):
+            return key
+        return None
+
+    def store(self, url, data):
+        """Adds downloaded bytes and returns their content key."""
+        key = hashlib.sha256(data).hexdigest()
+        path = self.original_path(key)
+        if not os.path.exists(path):
+            _atomic_write(path, data)
+        with self._lock:
+            self._load_index()[url] = key
+            self._index_dirty = True
+        return key
+
+    def fetch(self, url, download):
+        """
+        Content key for `url`, calling `download(url)` (bytes or None) only on
+        a miss. Returns None if the image is neither cached nor downloadable.
+        """
+        if not url:
+            return None
+        key = self.lookup(url)
+        if key is not None:
+            self.hits += 1
+            _touch(self.original_path(key))
+            return key
+        self.misses += 1
+        data = download(url)
+        if not data:
+            return None
+        return self.store(url, data)
+
+    def tile(self, key, size, draft=True, timings=None):
+        """
+        The original cropped and resized to exactly `size` (as ImageOps.fit
+        would), decoded from the cached tile when one exists. Returns None if
+        the original is missing or unreadable.
+        """
+        started = time.perf_counter()
+        path = self.tile_path(key, size)
+        try:
+            img = Image.open(path).convert("RGB")
+            _touch(path)
+            if timings is not None:
+                timings["decode"] += time.perf_counter() - started
+            return img
+        except OSError:
+            pass
+
+        try:
+            img = Image.open(self.original_path(key))
+            if draft:
+                # Let the JPEG decoder downscale by 1/2, 1/4 or 1/8 while still covering `size`
+                img.draft("RGB", size)
+            img = img.convert("RGB")
+        except OSError:
+            return None
+        decoded = time.perf_counter()
+        img = ImageOps.fit(img, size, centering=(0.5, 0.5))
+
+        buffer = BytesIO()
+        img.save(buffer, "JPEG", quality=TILE_QUALITY, subsampling=0)
+        _atomic_write(path, buffer.getvalue())
+        if timings is not None:
+            timings["decode"] += decoded - started
+            timings["fit"] += time.perf_counter() - decoded
+        return img
+
+    def save_index(self):
+        with self._lock:
+            if not self._index_dirty:
+                return
+            index = dict(self._index)
+            self._index_dirty = False
+        _atomic_write(self.index_path, json.dumps(index).encode())
+
+    def _files(self):
+        for sub in ("originals", "tiles"):
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, sub)):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def size(self):
+        return sum(size for _, size, _ in self._files())
+
+    def evict(self, max_bytes=None):
+        """Deletes least recently used files until the cache fits; returns bytes freed."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        freed = 0
+        for _, size, path in files:
+            if total - freed <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                freed += size
+            except OSError:
+                pass
+
+        if freed:
+            # Forget URLs whose original is gone so the next run downloads them again
+            with self._lock:
+                index = self._load_index()
+                for url, key in list(index.items()):
+                    if not os.path.exists(self.original_path(key)):
+                        del index[url]
+                        self._index_dirty = True
+        self.save_index()
+        return freed
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
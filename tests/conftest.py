@@ -0,0 +1,18 @@
+"""
+Shared setup for the tests: puts backend/ and benchmarks/ (for the stub
+API) on sys.path and points the backend's cache and history files at a
+scratch directory before any backend module is imported, as
+benchmarks/common.py does for the benchmarks.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, "benchmarks"), os.path.join(ROOT, "backend")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+SCRATCH = tempfile.mkdtemp(prefix="broker-tests-")
+os.environ.setdefault("CACHE_PATH", os.path.join(SCRATCH, "boats_cache.snap"))
+os.environ.setdefault("HISTORY_PATH", os.path.join(SCRATCH, "boats_history.sqlite"))
@@ -0,0 +1,88 @@
+"""delta_sync against the stub API: what it finds and when it may stop early."""
+import pytest
+
+import service
+from stub_server import StubServer, make_boats
+from upstream import CircuitBreaker, UpstreamClient
+
+BOATS = 1000  # 20 pages of 50
+
+
+@pytest.fixture
+def upstream():
+    """(stub API, client, current boat list from a full sync)."""
+    with StubServer(make_boats(BOATS), latency=0, max_page_size=service.PAGE_SIZE) as server:
+        client = UpstreamClient(server.base_url, pool_size=service.SYNC_WORKERS, breaker=CircuitBreaker())
+        try:
+            current, _ = service.full_sync(client)
+            yield server.api, client, current
+        finally:
+            client.close()
+
+
+def new_listing(boat_id):
+    boat = make_boats(1, seed=boat_id)[0]
+    boat["BoatID"] = boat_id
+    return boat
+
+
+def ids(boats):
+    return [b["BoatID"] for b in boats]
+
+
+def test_nothing_changed_stops_early(upstream):
+    api, client, current = upstream
+    boats, changeset, delta = service.delta_sync(client, current)
+    assert (changeset["added"], changeset["changed"], changeset["removed"]) == (0, 0, 0)
+    assert changeset["pages_fetched"] < changeset["total_pages"]
+    assert ids(boats) == ids(current)
+    assert delta == {"added": [], "removed": []}
+
+
+def test_head_addition_and_change(upstream):
+    api, client, current = upstream
+    api.boats[0]["SellPrice"] += 1000
+    api.boats.insert(0, new_listing(900001))
+    boats, changeset, delta = service.delta_sync(client, current)
+    assert (changeset["added"], changeset["changed"], changeset["removed"]) == (1, 1, 0)
+    assert changeset["pages_fetched"] < changeset["total_pages"]
+    assert ids(boats) == ids(api.boats)
+    assert boats[1]["SellPrice"] == api.boats[1]["SellPrice"]
+    assert {b["BoatID"] for b in delta["added"]} == {900001, api.boats[1]["BoatID"]}
+    assert ids(delta["removed"]) == [api.boats[1]["BoatID"]]
+
+
+@pytest.mark.parametrize("removed_at, added_at", [
+    (5, 800),    # removal in the walked head, offset by an addition deep in the list
+    (700, 0),    # removal deep in the list, offset by an addition at the head
+    (999, 600),  # removal from the last page
+])
+def test_removal_offset_by_addition_is_found(upstream, removed_at, added_at):
+    api, client, current = upstream
+    gone = api.boats.pop(removed_at)
+    api.boats.insert(added_at, new_listing(900002))
+    boats, changeset, delta = service.delta_sync(client, current)
+    # Same TotalResults as before: the counts alone cannot tell
+    assert changeset["total_results"] == BOATS
+    assert (changeset["added"], changeset["removed"]) == (1, 1)
+    assert ids(delta["removed"]) == [gone["BoatID"]]
+    assert ids(boats) == ids(api.boats)
+
+
+def test_removal_without_addition_walks_everything(upstream):
+    api, client, current = upstream
+    gone = api.boats.pop(300)
+    boats, changeset, _ = service.delta_sync(client, current)
+    assert changeset["removed"] == 1
+    assert changeset["pages_fetched"] == changeset["total_pages"]
+    assert gone["BoatID"] not in ids(boats)
+    assert ids(boats) == ids(api.boats)
+
+
+def test_missing_page_gives_up(upstream, monkeypatch):
+    api, client, current = upstream
+    api.boats.insert(0, new_listing(900003))
+    api.fail_offsets[200] = None
+    monkeypatch.setattr(service, "RECOVERY_ROUNDS", 1)
+    client.max_attempts = 1
+    assert service.delta_sync(client, current) is None
@@ -0,0 +1,90 @@
+"""HistoryStore.record: what each sync writes to the market history."""
+import copy
+
+import pytest
+
+from dataset import Dataset
+from history import DAY, HistoryStore
+from normalize import normalize_boats
+from stub_server import make_boats
+
+T0 = 1_760_000_000
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history.sqlite"))
+
+
+def dataset(boats, version=1):
+    return Dataset.build(version, normalize_boats(boats))
+
+
+def test_first_sync_lists_every_boat(store):
+    boats = dataset(make_boats(20))
+    counts = store.record([], boats, ts=T0)
+    assert counts == {"listed": 20, "relisted": 0, "delisted": 0, "price_changes": 0}
+    listing = store.boat_history(boats.boats[0]["BoatID"])
+    assert listing["first_seen"] == T0
+    assert listing["price"] == boats.boats[0]["PriceEUR"]
+    assert [event["kind"] for event in listing["events"]] == ["listed"]
+
+
+def test_changes_between_syncs(store):
+    first = dataset(make_boats(20))
+    store.record([], first, ts=T0)
+
+    boats = copy.deepcopy(first.boats)
+    delisted = boats.pop(3)
+    boats[0]["SellPrice"] -= 10_000
+    boats.append({**make_boats(1, seed=9)[0], "BoatID": 900001})
+    second = dataset(boats, version=2)
+    counts = store.record(first.boats, second, ts=T0 + DAY)
+    assert counts == {"listed": 1, "relisted": 0, "delisted": 1, "price_changes": 1}
+
+    history = store.boat_history(boats[0]["BoatID"])
+    assert history["price_changes"] == [{
+        "ts": T0 + DAY, "old_price": first.boats[0]["PriceEUR"], "new_price": boats[0]["PriceEUR"],
+    }]
+    assert store.boat_history(delisted["BoatID"])["removed_at"] == T0 + DAY
+    drops = store.price_drops(since=T0)
+    assert [drop["boat_id"] for drop in drops] == [str(boats[0]["BoatID"])]
+
+    # Back on the market
+    third = dataset(copy.deepcopy(first.boats) + [boats[-1]], version=3)
+    counts = store.record(second.boats, third, ts=T0 + 2 * DAY)
+    assert counts["relisted"] == 1
+    assert store.boat_history(delisted["BoatID"])["removed_at"] is None
+
+
+def test_history_started_on_an_existing_cache(store):
+    """Boats already listed when history starts get a row, so their later changes are kept."""
+    first = dataset(make_boats(10))
+    counts = store.record(first.boats, first, ts=T0 + DAY, previous_ts=T0)
+    assert counts == {"listed": 0, "relisted": 0, "delisted": 0, "price_changes": 0}
+    assert store.boat_history(first.boats[0]["BoatID"])["first_seen"] == T0
+
+    boats = copy.deepcopy(first.boats)
+    gone = boats.pop(0)
+    boats[0]["SellPrice"] += 5_000
+    counts = store.record(first.boats, dataset(boats, version=2), ts=T0 + 2 * DAY)
+    assert counts == {"listed": 0, "relisted": 0, "delisted": 1, "price_changes": 1}
+    assert store.boat_history(gone["BoatID"])["removed_at"] == T0 + 2 * DAY
+    assert len(store.boat_history(boats[0]["BoatID"])["price_changes"]) == 1
+
+
+def test_prices_are_recorded_in_eur(store):
+    boat = {**make_boats(1)[0], "SellPrice": 100_000, "SellPriceFormatted": "£ 100.000"}
+    boats = dataset([boat])
+    store.record([], boats, ts=T0)
+    listing = store.boat_history(boat["BoatID"])
+    assert listing["first_price"] == boats.boats[0]["PriceEUR"] != 100_000
+
+
+def test_daily_stats_feed_the_trend(store):
+    boats = dataset(make_boats(50))
+    store.record([], boats, ts=T0)
+    trend = store.price_trend(since=T0)
+    assert len(trend) == 1
+    assert trend[0]["count"] == 50
+    assert trend[0]["avg_price"] == pytest.approx(boats.aggregates.total.stats()["avg_price"])
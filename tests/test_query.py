@@ -0,0 +1,92 @@
+"""BoatIndex and ColumnarStore filtering, checked against a plain scan of the boats."""
+import numpy as np
+import pytest
+
+from columnar import ColumnarStore
+from normalize import normalize_boats
+from query import CATEGORICAL_FIELDS, NUMERIC_FIELDS, BoatIndex, _number
+from stub_server import make_boats
+
+FILTERS = [
+    {},
+    {"builders": ["Azimut", "Riva"]},
+    {"builders": ["Azimut"], "countries": ["Italy", "France"]},
+    {"yearFrom": 2010, "yearTo": 2020},
+    {"priceFrom": 500_000, "priceTo": 1_500_000, "conditions": ["Used"]},
+    {"lengthFrom": 12.5, "vatClasses": ["paid"]},
+    {"priceEurTo": 250_000, "ageFrom": 5},
+    {"builders": ["Nobody"]},
+]
+
+
+@pytest.fixture(scope="module")
+def boats():
+    boats = normalize_boats(make_boats(2000))
+    # Missing values count as 0 in range filters
+    boats[0]["YearBuilt"] = None
+    boats[1]["SellPrice"] = 0
+    return boats
+
+
+def matches(boat, filters):
+    for name, field in CATEGORICAL_FIELDS.items():
+        if filters.get(name) and boat.get(field) not in filters[name]:
+            return False
+    for name, field in NUMERIC_FIELDS.items():
+        value = _number(boat.get(field))
+        low, high = filters.get(f"{name}From"), filters.get(f"{name}To")
+        if (low is not None and value < low) or (high is not None and value > high):
+            return False
+    return True
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_query_matches_a_scan(boats, filters):
+    expected = [pos for pos, boat in enumerate(boats) if matches(boat, filters)]
+    result = BoatIndex(boats).query(filters, limit=50, facets=False)
+    assert result["total"] == len(expected)
+    assert result["results"] == [boats[pos] for pos in expected[:50]]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_columnar_mask_matches_a_scan(boats, filters):
+    expected = [pos for pos, boat in enumerate(boats) if matches(boat, filters)]
+    assert np.flatnonzero(ColumnarStore(boats).mask(filters)).tolist() == expected
+
+
+@pytest.mark.parametrize("sort", ["price", "-year", "pricePerMeter", "-age"])
+def test_sorted_pages(boats, sort):
+    filters = {"builders": ["Sanlorenzo", "Pershing"]}
+    index = BoatIndex(boats)
+    field = NUMERIC_FIELDS[sort.lstrip("-")]
+    expected = sorted((boat for boat in boats if matches(boat, filters)),
+                      key=lambda boat: _number(boat.get(field)), reverse=sort.startswith("-"))
+    page = index.query(filters, sort=sort, offset=10, limit=20, facets=False)["results"]
+    assert [_number(b.get(field)) for b in page] == [_number(b.get(field)) for b in expected[10:30]]
+    total, positions = index.scan(filters, sort)
+    assert total == len(expected)
+    assert [_number(boats[pos].get(field)) for pos in positions] == [_number(b.get(field)) for b in expected]
+
+
+def test_facets_ignore_their_own_selection(boats):
+    filters = {"builders": ["Azimut"], "conditions": ["New"]}
+    facets = BoatIndex(boats).query(filters, limit=0)["facets"]
+    new_boats = [boat for boat in boats if boat["Condition"] == "New"]
+    assert facets["builders"]["Riva"] == sum(boat["Builder"] == "Riva" for boat in new_boats)
+    assert sum(facets["conditions"].values()) == sum(boat["Builder"] == "Azimut" for boat in boats)
+
+
+def test_text_search_with_filters(boats):
+    index = BoatIndex(boats)
+    result = index.search_query("azimut", {"countries": ["Italy"]}, limit=500)
+    expected = {boat["BoatID"] for boat in boats if boat["Builder"] == "Azimut" and boat["Country"] == "Italy"}
+    assert {boat["BoatID"] for boat in result["results"]} == expected
+    # Typo-tolerant
+    assert index.search_query("azimtu", {}, ids=True)["total"] == sum(boat["Builder"] == "Azimut" for boat in boats)
+    # q inside the dashboard filters narrows a query the same way
+    assert index.query({"q": "azimut", "countries": ["Italy"]}, facets=False)["total"] == len(expected)
+
+
+def test_unknown_sort_key(boats):
+    with pytest.raises(ValueError):
+        BoatIndex(boats).query({}, sort="colour")